@@ -1,16 +1,23 @@
+import time
 import streamlit as st
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from bs4 import BeautifulSoup
-from langchain.schema import Document
-from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-import os
-import shutil
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from plc_verifier.embedding_cache import EmbeddingCache, CachedEmbeddings
+from plc_verifier.clients import ClientRegistry
+from plc_verifier.indexing import IndexRegistry
+from plc_verifier.chunking import PLCStructureSplitter
+from plc_verifier.context import DEFAULT_SNIPPET_BUDGET, pack_context
+from plc_verifier.tokens import count_tokens, usage_tokens
+from plc_verifier.answer_cache import AnswerCache, answer_scope
+from plc_verifier.checklist import DEFAULT_MAX_CONCURRENCY, DEFAULT_TOKENS_PER_MINUTE, load_checklist
+from plc_verifier.impact import store_answers, verify_changes
+from plc_verifier.pipeline import EMBEDDING_BACKENDS, VerifierPipeline
+from plc_verifier.local_embeddings import HashingEmbeddings
+from plc_verifier.mmr import DEFAULT_MMR_THRESHOLD
+from plc_verifier.vector_index import COMPRESSIONS, DEFAULT_EF_SEARCH, DEFAULT_NPROBE, INDEX_KINDS
+from plc_verifier.memory import DEFAULT_MEMORY_BUDGET, SessionMemoryStore, llm_summarizer
+from plc_verifier.prompts import LANGUAGES, static_prefix_tokens, verification_prompt
+from plc_verifier.instrumentation import Trace, TraceLog
 
 #Loading of OpenAI API key
 key = st.secrets["api_key"]
@@ -35,6 +42,52 @@ if 'page_refresh' in st.session_state:
 
 st.divider()
 
+#Embedding cache shared by all sessions of the server
+@st.cache_resource
+def get_embedding_cache():
+    return EmbeddingCache()
+
+#OpenAI embeddings through the embedding cache, shared by all sessions of the server
+#Indexes keep the wrapper they were built with for their query embeddings, so its hit/miss counters have to outlive the rerun
+@st.cache_resource
+def get_cached_embeddings(embedding_model, api_key):
+    return CachedEmbeddings(get_client_registry().embeddings(embedding_model, api_key), embedding_model, get_embedding_cache())
+
+#Indexes of the upload sets, shared by all sessions of the server
+@st.cache_resource
+def get_index_registry():
+    return IndexRegistry()
+
+#Answers already given for a corpus, shared by all sessions of the server
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache()
+
+#OpenAI clients shared by all sessions of the server, over one keep-alive connection pool
+@st.cache_resource
+def get_client_registry():
+    return ClientRegistry()
+
+#Conversation memories of the sessions, bounded by a token budget with older turns summarized
+@st.cache_resource
+def get_memory_store():
+    return SessionMemoryStore(DEFAULT_MEMORY_BUDGET, llm_summarizer(get_client_registry().chat('gpt-4o', key, temperature = 0)))
+
+#JSON-lines log of the stage timings of all sessions, aggregated with python -m plc_verifier.instrumentation
+@st.cache_resource
+def get_trace_log():
+    return TraceLog()
+
+#Traces of the session kept for the instrumentation panel
+MAX_SESSION_TRACES = 20
+
+def record_trace(trace):
+    record = get_trace_log().write(trace)
+    st.session_state['traces'] = (st.session_state.get('traces', []) + [record])[-MAX_SESSION_TRACES:]
+
+#Configuration of splitter: one chunk per network, oversized networks split along element boundaries
+text_splitter = PLCStructureSplitter(chunk_size = 4000)
+
 st.sidebar.image('coester_azul-01_-_sem fundo.png', width= 200)
 st.sidebar.title('Configuration:')
 
@@ -43,772 +96,136 @@ uploaded_files = st.sidebar.file_uploader('Load the code files (.xml) for verifi
 
 #Selection of program language
 language = st.sidebar.radio('Select the PLC Program Language:',
-                            ['Ladder', 'FBD', 'STL', 'SCL'])
+                            LANGUAGES)
 
 #Description of program subject
 subject = st.sidebar.text_input('Insert the program subject:\n\n\nExample: valve control')
 
+#Token budget of the code snippets sent with each query
+snippet_budget = st.sidebar.number_input('Token budget for code snippets per query:', min_value = 1000, max_value = 100000,
+                                         value = DEFAULT_SNIPPET_BUDGET, step = 1000)
+
+#Embedding backend: the OpenAI API, or vectors computed locally on air-gapped machines
+embedding_backend = st.sidebar.radio('Embedding backend:', EMBEDDING_BACKENDS,
+                                     format_func = {'openai': 'OpenAI API', 'local': 'Local (offline, identifier n-grams)'}.get)
+
+#Number of snippets adapted to the query: narrow questions get fewer snippets, broad ones up to 50
+adaptive_k = st.sidebar.checkbox('Adapt the number of snippets to the question', value = True)
+
+#Reuse of the answers of near-duplicate questions (compared by query embedding)
+#Local vectors only match shared identifiers, not paraphrases, so only exact questions are reused with them
+reuse_similar = st.sidebar.checkbox('Reuse answers of similar questions', value = embedding_backend == 'openai',
+                                    disabled = embedding_backend != 'openai')
+
+#FAISS index type, chosen by corpus size by default, and its recall against latency knobs
+with st.sidebar.expander('Vector index'):
+    vector_index = {
+        'kind': st.selectbox('Index type:', INDEX_KINDS, help = 'auto: exact search up to 20k chunks, HNSW up to 200k, IVF above'),
+        'compression': st.selectbox('Vector compression:', COMPRESSIONS, help = 'fp16 halves the memory of the vectors, pq stores about 1 byte per 16 dimensions'),
+        'nprobe': st.number_input('IVF lists probed (nprobe):', min_value = 1, max_value = 4096, value = DEFAULT_NPROBE),
+        'ef_search': st.number_input('HNSW search beam (efSearch):', min_value = 16, max_value = 4096, value = DEFAULT_EF_SEARCH),
+    }
+
+#Instrumentation panel, filled at the end of the run so it includes the trace of the last query
+instrumentation_panel = st.sidebar.empty()
+
 
 #Management of uploaded files
 if uploaded_files:
-        
-    temp_dir = 'temp'
-    os.makedirs(temp_dir, exist_ok = True)
 
-    for uploaded_file in uploaded_files:
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
+    #Loading of Embeddings model and LLM model, long-lived clients reused across reruns and sessions
+    clients = get_client_registry()
 
-        with open(temp_path, 'wb') as f:
-            f.write(uploaded_file.read())
+    if embedding_backend == 'local':
+        embeddings = HashingEmbeddings()
+        embedding_model = embeddings.model
+    else:
+        embedding_model = 'text-embedding-3-small'
+        embeddings = get_cached_embeddings(embedding_model, key)
 
-    xml_files = [file for file in os.listdir(temp_dir)]
+    model = clients.chat('gpt-4o', key, temperature = 0, stream_usage = True)
 
-    all_codes = []
+    #Ingestion, indexing and retrieval shared with the command-line entry point
+    pipeline = VerifierPipeline(embeddings, model, embedding_model, text_splitter = text_splitter, registry = get_index_registry(),
+                                snippet_budget = snippet_budget, embedding_backend = embedding_backend, vector_index = vector_index,
+                                mmr_threshold = DEFAULT_MMR_THRESHOLD if adaptive_k else None)
 
-    for idx, (xml_file) in enumerate(xml_files, start=1):  # Começa a contagem do page em 1
-        xml_path = os.path.join(temp_dir, xml_file)
-        
-        with open(xml_path, 'rb') as file:
-            code = BeautifulSoup(file, 'xml').prettify()
+    #Generation of vectorstore of codes, only when the upload set was not indexed yet
+    #The previous upload set of the session is the base, so only new or changed files are embedded
+    #New or changed files are parsed and chunked by a process pool, with their progress shown as they complete
+    parse_progress = st.empty()
 
-        # Criando o objeto Document com o page iterado
-        doc = Document(
-            metadata={'source': xml_path, 'page': idx, 'page_label': str(idx)},
-            page_content=code
-        )
+    def show_parse_progress(done, total):
+        parse_progress.progress(done / total, text = f'Parsed {done} of {total} files')
 
-        all_codes.append(doc)        
-            
-    shutil.rmtree(temp_dir)
+    index_trace = Trace('index', session = get_script_run_ctx().session_id, files = len(uploaded_files))
+    #Unreadable files are kept as text by the parser; an upload without any code is reported instead of indexed
+    try:
+        upload_fingerprint, program_index = pipeline.index(uploaded_files, base_fingerprint = st.session_state.get('index_fingerprint'),
+                                                           progress = show_parse_progress, trace = index_trace)
+    except ValueError as error:
+        parse_progress.empty()
+        st.sidebar.error(str(error))
+        st.stop()
 
-    if all_codes:
-        st.sidebar.success('Files uploaded successfully.')
-    
-    #Loading of Embeddings model and LLM model
-    embeddings = OpenAIEmbeddings(model = 'text-embedding-3-small', openai_api_key = key)
-    model = ChatOpenAI(model_name = 'gpt-4o', api_key = key, temperature = 0)
-
-    #Configuration of splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,  # Tamanho das partes
-    chunk_overlap=100,  # Sobreposição entre partes
-    separators=["\n\n", "\n"]
-    )
-    
-    splits = text_splitter.split_documents(all_codes)
-    
-    #Generation of vectorstore of codes
-    vectorstore = FAISS.from_documents(splits, embeddings)    
+    parse_progress.empty()
 
-    #Configuration of retriever
-    retriever = vectorstore.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 50, 'fetch_k': 100, 'lambda_mult': 0.25}
-    )
+    #Only a new upload set of the session is traced, not the reruns of every widget interaction
+    if upload_fingerprint != st.session_state.get('index_fingerprint'):
+        record_trace(index_trace)
 
-    #Prompts of each program language
-    prompt_ladder = f""" 
-    You are an expert to verify PLC programs in Ladder.
-
-    Your primary objective is to ensure the safety, reliability, and proper functionality of software used to an Automated People Mover, to be certified SIL 4 as per CENELEC standards.
-
-    Your responses must be:
-    - Clear, precise, and technically detailed.
-    - Aligned with automated people mover standards and including EN 50128 as references.
-            
-    **Guidelines for Analysis**:
-    - **Safety Priority**: Under no circumstances should you suggest modifications or enhancements that violate established safety principles, even if a requirement is found to be unmet.
-    - **Thoroughness**: Analyze the program step-by-step to ensure a comprehensive understanding of its logic, structure, and functionality. Consider all the names of inputs, outputs, auxiliares, InOut, Temp, Return, Static, Network Names, Constants and comments to enhance your interpretation.
-    - **Clarity**: If any part of the code or requirements is unclear or incomplete, specify what additional information is needed.
-
-    The xml files are related to the control of {subject}. Receive the files and wait for the queries.
-
-    For the complementary questions, after check of requirement, only reply directly about the additional question.
-
-    Example of code interpretation:
-    <FlgNet xmlns="http://www.siemens.com/automation/Openness/SW/NetworkSource/FlgNet/v4">
-    <!-- Variable Declarations -->
-    <Variables>
-        <!-- Inputs -->
-        <Variable Name="Safety_Inp" Datatype="Bool" Scope="Global" />
-        <Variable Name="Simulation" Datatype="Bool" Scope="Global" />
-        <Variable Name="PB_VD" Datatype="Bool" Scope="Global" />
-        
-        <!-- Outputs -->
-        <Variable Name="Safety_OK" Datatype="Bool" Scope="Global" />
-        <Variable Name="CMD_Enable" Datatype="Bool" Scope="Global" />
-
-        <!-- Auxiliary Variables -->
-        <Variable Name="Aux_SR_Fault" Datatype="Bool" Scope="Local" />
-        <Variable Name="Aux_SR_Open" Datatype="Bool" Scope="Local" />
-        <Variable Name="Aux_SR_Close" Datatype="Bool" Scope="Local" />
-        
-        <!-- Temporary Variables -->
-        <Variable Name="Temp_Safety_OK" Datatype="Bool" Scope="Local" />
-        <Variable Name="Temp_CMD_Enable" Datatype="Bool" Scope="Local" />
-        <Variable Name="Temp_Fault" Datatype="Bool" Scope="Local" />
-    </Variables>
-
-    <!-- Logic Implementation -->
-    <Parts>
-        <!-- Normally Open Contact: Safety Input -->
-        <Part Name="Contact" UId="10">
-        <Symbol>
-            <Component Name="Safety_Inp" />
-        </Symbol>
-        </Part>
-
-        <!-- Normally Open Contact: Simulation -->
-        <Part Name="Contact" UId="20">
-        <Symbol>
-            <Component Name="Simulation" />
-        </Symbol>
-        </Part>
-
-        <!-- OR Gate -->
-        <Part Name="O" UId="30">
-        <TemplateValue Name="Card" Type="Cardinality">2</TemplateValue>
-        </Part>
-
-        <!-- Output Coil: Safety_OK -->
-        <Part Name="Coil" UId="40">
-        <Symbol>
-            <Component Name="Safety_OK" />
-        </Symbol>
-        </Part>
-
-        <!-- Auxiliary SR Fault -->
-        <Part Name="SR" UId="50">
-        <Symbol>
-            <Component Name="Aux_SR_Fault" />
-        </Symbol>
-        </Part>
-
-        <!-- Temporary CMD Enable -->
-        <Part Name="Coil" UId="60">
-        <Symbol>
-            <Component Name="Temp_CMD_Enable" />
-        </Symbol>
-        </Part>
-    </Parts>
-
-    <!-- Wiring Connections -->
-    <Wires>
-        <Wire UId="70">
-        <Powerrail />
-        <NameCon UId="10" Name="in" />
-        <NameCon UId="20" Name="in" />
-        </Wire>
-        <Wire UId="80">
-        <IdentCon UId="10" />
-        <NameCon UId="30" Name="in1" />
-        </Wire>
-        <Wire UId="90">
-        <IdentCon UId="20" />
-        <NameCon UId="30" Name="in2" />
-        </Wire>
-        <Wire UId="100">
-        <NameCon UId="30" Name="out" />
-        <NameCon UId="40" Name="in" />
-        </Wire>
-        <Wire UId="110">
-        <IdentCon UId="50" />
-        <NameCon UId="60" Name="in" />
-        </Wire>
-    </Wires>
-    </FlgNet>
-
-    What Happens in the PLC?
-    Safety Logic - Ensuring System Safety
-    Inputs:
-
-    Safety_Inp: Indicates if the safety system is active (TRUE = Safe).
-    Simulation: Allows test mode activation (TRUE = System is simulated).
-    Processing:
-
-    The PLC checks if either Safety_Inp OR Simulation is TRUE.
-    An OR Gate (UId=30) outputs TRUE if at least one condition is met.
-    This activates a coil (Coil UId=40) that sets Safety_OK = TRUE.
-    Outcome:
-
-    If Safety_OK = TRUE, the system is operational. 
-    If Safety_OK = FALSE, a safety fault is detected, and operations are blocked. 
-    2Command Execution - Enabling Controls
-    Inputs:
-
-    PB_VD: A push button for door control.
-    CMD_Enable: General command permission.
-    Processing:
-
-    The system enables CMD_Enable if all required safety conditions are met.
-    This ensures that only a safe system can execute commands.
-    Outcome:
-
-    If CMD_Enable = TRUE, machine commands can execute. 
-    If CMD_Enable = FALSE, commands remain disabled. 
-    Fault Detection & Memory (SR Latch)
-    Fault Conditions Tracked:
-
-    Aux_SR_Fault: Stores fault conditions until reset.
-    Temp_Fault: Temporary fault status used for intermediate logic.
-    SR Latch Functionality (SR UId=50):
-
-    Once a fault occurs, it stays active (memory function).
-    A separate reset condition is required to clear it.
-    Ensures faults don’t reset automatically, requiring manual intervention.
-    Outcome:
-
-    If a fault occurs, Aux_SR_Fault stays ON until manually reset. 
-    The system won’t allow operation while a fault is stored.
-    Temporary Control Variables - Internal Processing
-    Variables Used:
-
-    Temp_CMD_Enable: Temporary command enable (local use).
-    Temp_Fault: Stores temporary fault detection for logic processing.
-    Temp_Safety_OK: Safety status for internal checks.
-
-    Functionality:
-    Temporary variables control logic flows inside the PLC.
-    They act as intermediate states between safety, faults, and command execution.
-    Outcome:
-    If a fault is detected, it triggers Temp_Fault, which can block operations.
-    If safety conditions are met, Temp_Safety_OK helps propagate the "Safe" state.
-
-
-    xml files: {{snippets}}
-
-    Query: {{query}}
-
-    Memory: {{memory}}
-    """
-
-    prompt_stl = f""" 
-    You are an expert to verify PLC programs in STL.
-
-    Your primary objective is to ensure the safety, reliability, and proper functionality of software used to an Automated People Mover, to be certified SIL 4 as per CENELEC standards.
-
-    Your responses must be:
-    - Clear, precise, and technically detailed.
-    - Aligned with automated people mover standards and including EN 50128 as references.
-            
-    **Guidelines for Analysis**:
-    - **Safety Priority**: Under no circumstances should you suggest modifications or enhancements that violate established safety principles, even if a requirement is found to be unmet.
-    - **Thoroughness**: Analyze the program step-by-step to ensure a comprehensive understanding of its logic, structure, and functionality. Consider all the names of inputs, outputs, auxiliares, InOut, Temp, Return, Static, Network Names, Constants and comments to enhance your interpretation.
-    - **Clarity**: If any part of the code or requirements is unclear or incomplete, specify what additional information is needed.
-
-    The xml files are related to the control of {subject}. Receive the files and wait for the queries.
-
-    For the complementary questions, after check of requirement, only reply directly about the additional question.
-
-    Example of code interpretation:
-    <SW.Blocks.CompileUnit xmlns="http://www.siemens.com/automation/Openness/SW/CompileUnit/v1">
-    <SW.Blocks.CompileUnit.ID>1</SW.Blocks.CompileUnit.ID>
-    <SW.Blocks.STL>
-        <Parts>
-        <Network>
-            <Comment>Ensure Safety Logic</Comment>
-            <Statement>
-            <Contact Variable="Safety_Inp" />
-            <OR />
-            <Contact Variable="Simulation" />
-            <Assign Variable="Safety_OK" />
-            </Statement>
-        </Network>
-        
-        <Network>
-            <Comment>Verify Safety Condition</Comment>
-            <Statement>
-            <Contact Variable="Safety_OK" />
-            <Assign Variable="Temp_Safety_OK" />
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Enable Command Execution</Comment>
-            <Statement>
-            <Contact Variable="PB_VD" />
-            <AND />
-            <Contact Variable="Temp_Safety_OK" />
-            <Assign Variable="CMD_Enable" />
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Temporary Command Enable</Comment>
-            <Statement>
-            <Contact Variable="CMD_Enable" />
-            <Assign Variable="Temp_CMD_Enable" />
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Fault Detection Latch</Comment>
-            <Statement>
-            <Contact Variable="Temp_Fault" />
-            <Set Variable="Aux_SR_Fault" />
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Store Fault Condition</Comment>
-            <Statement>
-            <Contact Variable="Aux_SR_Fault" />
-            <Assign Variable="Temp_Fault" />
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Temporary Variable Processing</Comment>
-            <Statement>
-            <Contact Variable="Temp_CMD_Enable" />
-            <Assign Variable="Aux_SR_Close" />
-            </Statement>
-        </Network>
-        </Parts>
-    </SW.Blocks.STL>
-    </SW.Blocks.CompileUnit>
-
-    What Happens in the PLC?
-
-    1. Safety Logic - Ensuring System Safety
-    Inputs:
-
-    "Safety_Inp" - Indicates whether the safety system is active (TRUE = Safe).
-    "Simulation" - Allows test mode activation (TRUE = Simulation active).
-    Processing:
-
-    The PLC checks if either "Safety_Inp" OR "Simulation" is TRUE.
-    The result is stored in "Safety_OK", meaning the system is operational if at least one of the conditions is met.
-    Outcome:
-
-    If "Safety_OK" = TRUE, the system operates normally.
-    If "Safety_OK" = FALSE, a safety issue exists, and operations are blocked.
-
-    2. Command Execution - Enabling Controls
-    Inputs:
-
-    "PB_VD" - A push button to control the door.
-    "CMD_Enable" - General command permission.
-    Processing:
-
-    "PB_VD" is pressed, and only if "Safety_OK" is TRUE, the "CMD_Enable" output is set.
-    "CMD_Enable" is stored in "Temp_CMD_Enable" for intermediate processing.
-    Outcome:
-
-    If "CMD_Enable" = TRUE, machine commands are allowed.
-    If "CMD_Enable" = FALSE, commands remain disabled.
-
-    3. Fault Detection & Memory (SR Latch)
-    Tracked Faults:
-
-    "Aux_SR_Fault" - Stores faults until reset.
-    "Temp_Fault" - Temporary fault status.
-    SR Latch Functionality:
-
-    "Temp_Fault" sets "Aux_SR_Fault" to TRUE and keeps it latched.
-    "Aux_SR_Fault" remains active until manually reset, preventing automatic fault clearing.
-    Outcome:
-
-    If a fault occurs, "Aux_SR_Fault" stays TRUE until manually cleared.
-    The system cannot operate while a fault is active.
-
-    4. Temporary Control Variables - Internal Processing
-    Variables Used:
-
-    "Temp_CMD_Enable" - Stores intermediate command enable status.
-    "Temp_Fault" - Stores fault detection.
-    "Temp_Safety_OK" - Used for internal safety checks.
-    Processing:
-
-    "Temp_Safety_OK" ensures that "Safety_OK" propagates correctly.
-    "Temp_Fault" prevents operations if an issue exists.
-    "Temp_CMD_Enable" manages command permissions internally.
-    Outcome:
-
-    If a fault is detected, "Temp_Fault" is set, preventing unsafe operations.
-    If safety conditions are met, "Temp_Safety_OK" ensures the system can proceed.
-
-    Functionality:
-    Safety conditions are checked before allowing operations.
-    Commands can only execute if the safety system is enabled.
-    Faults are latched and require manual reset.
-    Temporary variables handle intermediate logic states to prevent unsafe actions.
-
-    xml files: {{snippets}}
-
-    Query: {{query}}
-
-    Memory: {{memory}}
-    """
-
-    prompt_scl = f""" 
-    You are an expert to verify PLC programs in SCL.
-
-    Your primary objective is to ensure the safety, reliability, and proper functionality of software used to an Automated People Mover, to be certified SIL 4 as per CENELEC standards.
-
-    Your responses must be:
-    - Clear, precise, and technically detailed.
-    - Aligned with automated people mover standards and including EN 50128 as references.
-            
-    **Guidelines for Analysis**:
-    - **Safety Priority**: Under no circumstances should you suggest modifications or enhancements that violate established safety principles, even if a requirement is found to be unmet.
-    - **Thoroughness**: Analyze the program step-by-step to ensure a comprehensive understanding of its logic, structure, and functionality. Consider all the names of inputs, outputs, auxiliares, InOut, Temp, Return, Static, Network Names, Constants and comments to enhance your interpretation.
-    - **Clarity**: If any part of the code or requirements is unclear or incomplete, specify what additional information is needed.
-
-    The xml files are related to the control of {subject}. Receive the files and wait for the queries.
-
-    For the complementary questions, after check of requirement, only reply directly about the additional question.
-
-    Example of code interpretation:
-    <SW.Blocks.CompileUnit xmlns="http://www.siemens.com/automation/Openness/SW/CompileUnit/v1">
-    <SW.Blocks.CompileUnit.ID>1</SW.Blocks.CompileUnit.ID>
-    <SW.Blocks.SCL>
-        <Parts>
-        <Network>
-            <Comment>Ensure Safety Logic</Comment>
-            <Statement>
-            <Assign Variable="Safety_OK"> Safety_Inp OR Simulation </Assign>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Store Safety Status Temporarily</Comment>
-            <Statement>
-            <Assign Variable="Temp_Safety_OK"> Safety_OK </Assign>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Enable Command Execution</Comment>
-            <Statement>
-            <Assign Variable="CMD_Enable"> PB_VD AND Temp_Safety_OK </Assign>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Temporary Command Enable</Comment>
-            <Statement>
-            <Assign Variable="Temp_CMD_Enable"> CMD_Enable </Assign>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Fault Detection Latch</Comment>
-            <Statement>
-            <If>
-                <Condition> Temp_Fault </Condition>
-                <Then>
-                <Assign Variable="Aux_SR_Fault"> TRUE </Assign>
-                </Then>
-            </If>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Store Fault Condition</Comment>
-            <Statement>
-            <Assign Variable="Temp_Fault"> Aux_SR_Fault </Assign>
-            </Statement>
-        </Network>
-
-        <Network>
-            <Comment>Auxiliary Processing</Comment>
-            <Statement>
-            <Assign Variable="Aux_SR_Close"> Temp_CMD_Enable </Assign>
-            </Statement>
-        </Network>
-
-        </Parts>
-    </SW.Blocks.SCL>
-    </SW.Blocks.CompileUnit>
-
-    What Happens in the PLC?
-
-    1. Safety Logic - Ensuring System Safety
-    Inputs:
-
-    "Safety_Inp" - Indicates if the safety system is active (TRUE = Safe).
-    "Simulation" - Allows test mode activation (TRUE = Simulated mode).
-    Processing:
-
-    If either "Safety_Inp" or "Simulation" is TRUE, "Safety_OK" is activated.
-    "Temp_Safety_OK" stores this status for internal processing.
-    Outcome:
-
-    If "Safety_OK" = TRUE, the system is safe.
-    If "Safety_OK" = FALSE, operations are blocked due to safety risks.
-
-    2. Command Execution - Enabling Controls
-    Inputs:
-
-    "PB_VD" - Push button for door control.
-    "CMD_Enable" - General command permission.
-    Processing:
-
-    "CMD_Enable" is set TRUE only if "PB_VD" is pressed AND the safety conditions ("Temp_Safety_OK") are met.
-    "Temp_CMD_Enable" stores the temporary state of command permission.
-    Outcome:
-
-    If "CMD_Enable" = TRUE, machine commands are allowed.
-    If "CMD_Enable" = FALSE, commands are blocked.
-
-    3. Fault Detection & Memory (SR Latch)
-    Faults Tracked:
-
-    "Aux_SR_Fault" - Stores fault conditions until reset.
-    "Temp_Fault" - Temporary fault variable.
-    SR Latch Functionality:
-
-    If "Temp_Fault" is TRUE, "Aux_SR_Fault" is latched (TRUE).
-    "Aux_SR_Fault" stays TRUE until manually reset.
-    Outcome:
-
-    If a fault occurs, "Aux_SR_Fault" remains TRUE and requires manual reset before operations resume.
-    The system prevents execution when "Aux_SR_Fault" is active.
-
-    4. Temporary Control Variables - Internal Processing
-    Variables Used:
-
-    "Temp_CMD_Enable" - Stores intermediate command enable status.
-    "Temp_Fault" - Stores temporary fault detection.
-    "Temp_Safety_OK" - Used for internal safety checks.
-    Processing:
-
-    "Temp_Safety_OK" ensures "Safety_OK" is properly propagated.
-    "Temp_Fault" prevents unsafe operations if a fault occurs.
-    "Temp_CMD_Enable" manages command permissions internally.
-    Outcome:
-
-    If a fault occurs, "Temp_Fault" is triggered, blocking unsafe operations.
-    If safety conditions are met, "Temp_Safety_OK" ensures safe system execution.
-
-    Functionality:
-    Safety checks ensure operations only run when the system is safe.
-    Commands are only enabled if safety conditions are met.
-    Faults are latched using "Aux_SR_Fault" and require manual reset.
-    Temporary variables handle intermediate safety logic.
-
-
-    xml files: {{snippets}}
-
-    Query: {{query}}
-
-    Memory: {{memory}}
-    """
-
-    prompt_fbd = f""" 
-    You are an expert to verify PLC programs in FBD.
-
-    Your primary objective is to ensure the safety, reliability, and proper functionality of software used to an Automated People Mover, to be certified SIL 4 as per CENELEC standards.
-
-    Your responses must be:
-    - Clear, precise, and technically detailed.
-    - Aligned with automated people mover standards and including EN 50128 as references.
-            
-    **Guidelines for Analysis**:
-    - **Safety Priority**: Under no circumstances should you suggest modifications or enhancements that violate established safety principles, even if a requirement is found to be unmet.
-    - **Thoroughness**: Analyze the program step-by-step to ensure a comprehensive understanding of its logic, structure, and functionality. Consider all the names of inputs, outputs, auxiliares, InOut, Temp, Return, Static, Network Names, Constants and comments to enhance your interpretation.
-    - **Clarity**: If any part of the code or requirements is unclear or incomplete, specify what additional information is needed.
-
-    The xml files are related to the control of {subject}. Receive the files and wait for the queries.
-
-    For the complementary questions, after check of requirement, only reply directly about the additional question.
-
-    Example of code interpretation:
-    <SW.Blocks.CompileUnit xmlns="http://www.siemens.com/automation/Openness/SW/CompileUnit/v1">
-    <SW.Blocks.CompileUnit.ID>1</SW.Blocks.CompileUnit.ID>
-    <SW.Blocks.FBD>
-        <Parts>
-
-        <!-- Safety Logic -->
-        <Network>
-            <Comment>Ensure Safety Logic</Comment>
-            <Part Name="OR" UId="10">
-            <TemplateValue Name="Card" Type="Cardinality">2</TemplateValue>
-            </Part>
-            <Wire UId="20">
-            <NameCon UId="10" Name="in1">
-                <Component Name="Safety_Inp"/>
-            </NameCon>
-            <NameCon UId="10" Name="in2">
-                <Component Name="Simulation"/>
-            </NameCon>
-            </Wire>
-            <Wire UId="30">
-            <NameCon UId="10" Name="out">
-                <Component Name="Safety_OK"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Store Safety Status Temporarily -->
-        <Network>
-            <Comment>Store Safety Status Temporarily</Comment>
-            <Wire UId="40">
-            <NameCon UId="10" Name="out">
-                <Component Name="Temp_Safety_OK"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Enable Command Execution -->
-        <Network>
-            <Comment>Enable Command Execution</Comment>
-            <Part Name="AND" UId="50">
-            <TemplateValue Name="Card" Type="Cardinality">2</TemplateValue>
-            </Part>
-            <Wire UId="60">
-            <NameCon UId="50" Name="in1">
-                <Component Name="PB_VD"/>
-            </NameCon>
-            <NameCon UId="50" Name="in2">
-                <Component Name="Temp_Safety_OK"/>
-            </NameCon>
-            </Wire>
-            <Wire UId="70">
-            <NameCon UId="50" Name="out">
-                <Component Name="CMD_Enable"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Temporary Command Enable -->
-        <Network>
-            <Comment>Temporary Command Enable</Comment>
-            <Wire UId="80">
-            <NameCon UId="70" Name="out">
-                <Component Name="Temp_CMD_Enable"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Fault Detection Latch (SR) -->
-        <Network>
-            <Comment>Fault Detection Latch</Comment>
-            <Part Name="SR" UId="90">
-            <Symbol>
-                <Component Name="Aux_SR_Fault"/>
-            </Symbol>
-            </Part>
-            <Wire UId="100">
-            <NameCon UId="90" Name="S">
-                <Component Name="Temp_Fault"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Store Fault Condition -->
-        <Network>
-            <Comment>Store Fault Condition</Comment>
-            <Wire UId="110">
-            <NameCon UId="90" Name="Q">
-                <Component Name="Temp_Fault"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        <!-- Auxiliary Processing -->
-        <Network>
-            <Comment>Auxiliary Processing</Comment>
-            <Wire UId="120">
-            <NameCon UId="80" Name="out">
-                <Component Name="Aux_SR_Close"/>
-            </NameCon>
-            </Wire>
-        </Network>
-
-        </Parts>
-    </SW.Blocks.FBD>
-    </SW.Blocks.CompileUnit>
-
-    What Happens in the PLC?
-
-    1. Safety Logic - Ensuring System Safety
-    Inputs:
-
-    "Safety_Inp" - Indicates if the safety system is active (TRUE = Safe).
-    "Simulation" - Allows test mode activation (TRUE = Simulated mode).
-    Processing:
-
-    The OR Gate (UId=10) checks if either "Safety_Inp" or "Simulation" is TRUE.
-    "Safety_OK" is set to TRUE if at least one of these conditions is met.
-    Outcome:
-
-    If "Safety_OK" = TRUE, the system operates normally.
-    If "Safety_OK" = FALSE, operations are blocked due to a safety risk.
-
-    2. Command Execution - Enabling Controls
-    Inputs:
-
-    "PB_VD" - A push button for door control.
-    "CMD_Enable" - General command permission.
-    Processing:
-
-    The AND Gate (UId=50) ensures that "CMD_Enable" is activated only if "PB_VD" is pressed AND "Safety_OK" is TRUE.
-    "CMD_Enable" is stored temporarily in "Temp_CMD_Enable".
-    Outcome:
-
-    If "CMD_Enable" = TRUE, machine commands are allowed.
-    If "CMD_Enable" = FALSE, machine operations are blocked.
-
-    3. Fault Detection & Memory (SR Latch)
-    Faults Tracked:
-
-    "Aux_SR_Fault" - Stores fault conditions until reset.
-    "Temp_Fault" - Temporary fault variable.
-    SR Latch Functionality:
-
-    The SR Latch (UId=90) ensures that once a fault ("Temp_Fault") occurs, "Aux_SR_Fault" is latched (TRUE) and remains active until manually reset.
-    Outcome:
-
-    If "Temp_Fault" = TRUE, "Aux_SR_Fault" stays latched (TRUE).
-    Operations cannot continue while a fault is active.
-
-    4. Temporary Control Variables - Internal Processing
-    Variables Used:
-
-    "Temp_CMD_Enable" - Stores intermediate command enable status.
-    "Temp_Fault" - Stores temporary fault detection.
-    "Temp_Safety_OK" - Used for internal safety checks.
-    Processing:
-
-    "Temp_Safety_OK" ensures "Safety_OK" propagates correctly.
-    "Temp_Fault" prevents operations if an issue exists.
-    "Temp_CMD_Enable" manages command permissions internally.
-    Outcome:
-
-    If a fault is detected, "Temp_Fault" is triggered, preventing unsafe operations.
-    If safety conditions are met, "Temp_Safety_OK" ensures safe system execution.
-
-    Functionality:
-    Safety conditions must be met before operations can proceed.
-    Commands are only enabled if "PB_VD" is pressed and "Safety_OK" is TRUE.
-    Faults are latched and must be manually reset.
-    Temporary variables handle intermediate logic to control safety and execution.
-
-
-    xml files: {{snippets}}
-
-    Query: {{query}}
-
-    Memory: {{memory}}
-    """
-
-    #Prompt selection condition
-    if language == 'Ladder':
-        prompt_str = prompt_ladder
-    elif language == 'STL':
-        prompt_str = prompt_stl
-    elif language == 'CSL':
-        prompt_str = prompt_scl
-    else:
-        prompt_str = prompt_fbd
-    
-    #Prompt definition
-    prompt = ChatPromptTemplate.from_template(prompt_str)
+    st.session_state['index_fingerprint'] = upload_fingerprint
+    vectorstore = program_index.vectorstore
 
-    #Original chain
-    chain = prompt | model | StrOutputParser()
+    st.sidebar.success('Files uploaded successfully.')
+    st.sidebar.caption(f"Index built with {program_index.embedding.get('model', embedding_model)} "
+                       f"({program_index.embedding.get('dimensions', '?')} dimensions), "
+                       f"FAISS {program_index.vector_index.get('factory', 'Flat')}")
+
+    cache_stats = embeddings.stats() if isinstance(embeddings, CachedEmbeddings) else {}
+    if cache_stats:
+        st.sidebar.caption(f"Embedding cache (all sessions): {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} vectors stored), "
+                           f"queries {cache_stats['query_hits']} hits / {cache_stats['query_misses']} misses")
+
+    if cache_stats.get('last_run'):
+        last_run = cache_stats['last_run']
+        st.sidebar.caption(f"Embedding: {last_run['chunks']} chunks in {last_run['batches']} batches, {last_run['chunks_per_second']:.0f} chunks/s, "
+                           f"{last_run['tokens_per_second']:.0f} tokens/s, {last_run['retries']} retries")
+
+    token_totals = program_index.token_totals()
+    if token_totals['raw']:
+        st.sidebar.caption(f"Compact code: {token_totals['compact']} tokens instead of {token_totals['raw']} as raw xml "
+                           f"({100 - 100 * token_totals['compact'] // token_totals['raw']}% fewer)")
+
+    if program_index.update_stats:
+        update_stats = program_index.update_stats
+        st.sidebar.caption(f"Index update: {update_stats['files_parsed']} files parsed, {update_stats['chunks_added']} chunks added, "
+                           f"{update_stats['chunks_removed']} removed, {update_stats['chunks_kept']} kept")
+
+    #Cross-reference of tags: where each tag is read and written, answered without any LLM call
+    xref = program_index.cross_reference()
+
+    with st.sidebar.expander('Tag cross-reference'):
+        xref_tag = st.selectbox('Tag:', sorted(xref.tags, key = str.lower), index = None, placeholder = 'Select a tag')
+
+        if xref_tag:
+            usage = xref.describe(xref_tag)
+
+            for kind in ('written', 'read'):
+                st.markdown(f"**{kind.capitalize()} in {len(usage[kind])} network(s):**")
+                for entry in usage[kind]:
+                    st.markdown(f"- {entry['network']}")
+                    for statement in entry['statements']:
+                        st.code(statement, language = None)
+
+    #Configuration of retriever: FAISS MMR fused with the lexical index of tags, blocks and comments
+    retriever = pipeline.retriever(program_index)
+
+    #Prompt definition: static instructions of the language first, then subject, memory, snippets and query
+    prompt = verification_prompt(language, subject)
+
+    #Original chain, returning the answer message with its token usage
+    chain = prompt | model
 
     #Function to retrieve code snippets from query
     def retrieve_docs(query):
@@ -816,60 +233,276 @@ if uploaded_files:
 
         return snippets
     
-    #Function for chat memory
-    store = {}
-
+    #Function for chat memory: one bounded, summarizing history per browser session, kept across reruns
     def get_session_id(session_id):
-        if session_id not in store:
-            store[session_id] = InMemoryChatMessageHistory()
-        return store[session_id]
-    
+        return get_memory_store().get(session_id)
+
     #Memory chain
     memory_chain = RunnableWithMessageHistory(
     chain,
     get_session_id,
     input_messages_key = 'query',
     history_messages_key = 'memory',
-    ) | StrOutputParser()
+    )
 
-    #Configuration of session_id and user
-    config = {'configurable': {'session_id': 'user_a'}}
+    #Configuration of session_id: the Streamlit session of the user
+    session_id = get_script_run_ctx().session_id
+    config = {'configurable': {'session_id': session_id}}
+
+    #Checklist mode: every requirement of a CSV/YAML checklist verified concurrently against the indexed program
+    with st.sidebar.expander('Checklist verification'):
+        checklist_file = st.file_uploader('Load the requirement checklist (.csv, .yaml):', type = ['csv', 'yaml', 'yml'])
+        max_concurrency = st.number_input('Requests in flight:', min_value = 1, max_value = 64, value = DEFAULT_MAX_CONCURRENCY)
+        tokens_per_minute = st.number_input('Tokens per minute limit:', min_value = 1000, max_value = 10000000,
+                                            value = DEFAULT_TOKENS_PER_MINUTE, step = 1000)
+        run_checklist = st.button('Verify checklist', disabled = not (checklist_file and subject))
+
+    #Change impact: the uploaded files are a revision of a baseline whose checklist answers are stored, only the
+    #requirements touching changed networks (or the readers of the tags they write) are verified again
+    with st.sidebar.expander('Change impact'):
+        baseline_files = st.file_uploader('Load the baseline code files (.xml):', type = ['xml'], accept_multiple_files = True)
+        run_impact = st.button('Re-verify changes', disabled = not (baseline_files and checklist_file and subject))
+
+    if run_checklist or run_impact:
+        requirements = load_checklist(checklist_file.name, checklist_file.getvalue())
+        #Retries are handled by the runner, with backoff shared across the requests in flight
+        checklist_model = clients.chat('gpt-4o', key, temperature = 0, max_retries = 0)
+        progress = st.progress(0.0, text = f'Verifying {len(requirements)} requirements...')
+        done = []
+
+        def show_progress(result):
+            done.append(result)
+            progress.progress(len(done) / len(requirements), text = f"Verified {len(done)} of {len(requirements)} requirements")
+
+        start = time.perf_counter()
+
+        if run_impact:
+            #The baseline is indexed on its own, so it does not become the base of the incremental index of the session
+            try:
+                baseline = pipeline.index(baseline_files)
+            except ValueError as error:
+                progress.empty()
+                st.sidebar.error(f'Baseline: {error}')
+                st.stop()
+
+            impact = verify_changes(pipeline, baseline, (upload_fingerprint, program_index), requirements, language,
+                                    subject, get_answer_cache(), model = checklist_model, on_result = show_progress,
+                                    max_concurrency = max_concurrency, tokens_per_minute = tokens_per_minute)
+            results = impact.pop('results')
+            st.session_state['impact'] = impact
+        else:
+            runner = pipeline.checklist_runner(program_index, language, subject, model = checklist_model,
+                                               max_concurrency = max_concurrency, tokens_per_minute = tokens_per_minute)
+            results = runner.run(requirements, on_result = show_progress)
+            st.session_state.pop('impact', None)
+
+            #Stored so a later revision of these files can reuse the answers of the requirements it does not impact
+            store_answers(get_answer_cache(), answer_scope(upload_fingerprint, language, subject), requirements, results)
+
+        progress.empty()
+        st.session_state['checklist'] = {'results': results, 'seconds': time.perf_counter() - start}
+
+    if 'impact' in st.session_state:
+        impact = st.session_state['impact']
+        changes = impact['changes']
+
+        with st.expander(f"Change impact ({len(impact['reverified'])} re-verified, {len(impact['reused'])} reused)", expanded = True):
+            st.caption(f"{len(changes['changed'])} networks changed, {len(changes['added'])} added, {len(changes['removed'])} removed, "
+                       f"{changes['unchanged']} unchanged; {impact['tokens']['spent']} tokens spent, about {impact['tokens']['saved']} saved")
+
+            for kind in ('changed', 'added', 'removed'):
+                for label in changes[kind]:
+                    st.markdown(f"- {kind.capitalize()}: {label}")
+
+            st.markdown(f"**Impacted networks:** {', '.join(impact['impacted']) or 'none'}")
+            st.dataframe([{'ID': entry['id'], 'Reason': entry['reason']} for entry in impact['reverified']], use_container_width = True, hide_index = True)
+
+    if 'checklist' in st.session_state:
+        checklist = st.session_state['checklist']
+        results = checklist['results']
+
+        with st.expander(f"Checklist verdicts ({len(results)} requirements)", expanded = True):
+            slowest = max((result['seconds'] for result in results), default = 0.0)
+            st.caption(f"Wall time {checklist['seconds']:.1f} s, slowest request {slowest:.1f} s, "
+                       f"sum of requests {sum(result['seconds'] for result in results):.1f} s")
+            st.dataframe([{'ID': result['id'], 'Requirement': result['requirement'], 'Verdict': result['verdict'],
+                           'Seconds': round(result['seconds'], 1), 'Attempts': result['attempts'], 'Prompt tokens': result['tokens'],
+                           'Reused': result.get('reused', False)}
+                          for result in results], use_container_width = True, hide_index = True)
+
+            for result in results:
+                st.markdown(f"**{result['id']}** ({result['verdict']}): {result['answer'] or result['error']}")
+
+    #Rendering of one message of the chat history
+    def show_message(msg):
+        with st.container(border = True):
+            if msg['role'] == 'user':
+                st.info(f"User: {msg['content']}")
+                return
+
+            st.markdown(f"**AI Verifier:** {msg['content']}")
+            show_message_details(msg)
+
+    def show_message_details(msg):
+        if 'cached' in msg:
+            cached = msg['cached']
+            st.caption('Served from cache' + (f" (similar question, similarity {cached['similarity']:.2f})" if cached['match'] == 'similar' else ''))
+
+        if 'latency' in msg:
+            latency = msg['latency']
+            st.caption(f"Latency: retrieval {latency['retrieval']:.1f} s, first token {latency['first_token']:.1f} s, "
+                       f"total {latency['total']:.1f} s")
+
+        if 'tokens' in msg:
+            tokens = msg['tokens']
+            report = tokens['context']
+            st.caption(f"Prompt tokens: instructions {tokens['instructions']}, snippets {tokens['snippets']}/{report['budget']} "
+                       f"({report['snippets']} networks from {report['chunks']} chunks, {report['duplicates']} duplicates, "
+                       f"{report['dropped']} over budget), memory {tokens['memory']}, query {tokens['query']}")
+
+            retrieval = tokens['retrieval']
+            st.caption(f"Retrieval: {retrieval.get('k', report['chunks'])} snippets from {retrieval['dense']} dense, "
+                       f"{retrieval['lexical']} lexical and {retrieval['xref']} cross-reference hits"
+                       + (f", dense search skipped for exact tags {', '.join(retrieval['tags'])}" if retrieval['dense_skipped'] else ''))
+
+        if msg.get('usage', {}).get('input'):
+            usage = msg['usage']
+            st.caption(f"Provider prompt cache: {usage['cached']} of {usage['input']} input tokens cached "
+                       f"(static prefix {msg['tokens']['instructions']} tokens), {usage['output']} output tokens")
+
+    #Response management: retrieval as a separate step, then the answer rendered as its tokens arrive
+    def get_responses():
+        start = time.perf_counter()
+        trace = Trace('query', session = session_id, language = language, query_tokens = count_tokens(query))
+
+        #A new or cleared chat starts with an empty memory
+        if 'chat_history' not in st.session_state:
+            st.session_state.chat_history = []
+            get_session_id(session_id).clear()
+
+        st.write('Chat history:')
+
+        for msg in st.session_state.chat_history:
+            show_message(msg)
+
+        if not subject:
+            return
+
+        user_msg = {'role': 'user', 'content': query}
+        st.session_state.chat_history.append(user_msg)
+        show_message(user_msg)
+
+        #Answers are reused for the same corpus, language, subject and (normalized or similar) query
+        #A follow-up depends on the conversation before it, so only the first question of a conversation is cached
+        answer_cache = get_answer_cache()
+        scope = answer_scope(upload_fingerprint, language, subject)
+        history = get_session_id(session_id)
+        use_cache = not history.messages
+        query_embedding = None
+        cached = None
+
+        with trace.stage('answer_cache', used = use_cache) as stage:
+            if use_cache:
+                cached = answer_cache.get(scope, query)
+
+                if cached is None and reuse_similar:
+                    query_embedding = embeddings.embed_query(query)
+                    cached = answer_cache.get(scope, query, query_embedding)
+
+            stage['match'] = cached['match'] if cached is not None else None
+
+        if cached is not None:
+            trace.update(cached = True)
+            record_trace(trace)
+
+            history.add_user_message(query)
+            history.add_ai_message(cached['answer'])
+
+            agent_msg = {'role': 'agent', 'content': cached['answer'], 'cached': cached, **cached['details']}
+            st.session_state.chat_history.append(agent_msg)
+            show_message(agent_msg)
+            return
+
+        with st.container(border = True):
+            with st.status('Retrieving code snippets...') as status:
+                with trace.stage('retrieval') as stage:
+                    snippets = retrieve_docs(query)
+                    stage.update(chunks = len(snippets), dense = retriever.last_report['dense'], lexical = retriever.last_report['lexical'],
+                                 xref = retriever.last_report['xref'])
+
+                with trace.stage('pack') as stage:
+                    context, context_report = pack_context(snippets, snippet_budget)
+                    stage.update(snippets = context_report['snippets'], tokens = context_report['tokens'], dropped = context_report['dropped'])
+
+                retrieval_time = time.perf_counter() - start
+                status.update(label = f"Retrieved {context_report['snippets']} networks in {retrieval_time:.1f} s", state = 'complete')
+
+            final_input = {'query': query, 'snippets': context}
+
+            #Tokens of each section of the prompt
+            token_report = {
+                'instructions': static_prefix_tokens(language),
+                'snippets': context_report['tokens'],
+                'memory': get_session_id(session_id).tokens(),
+                'query': count_tokens(query),
+                'context': context_report,
+                'retrieval': retriever.last_report,
+            }
+
+            response = []
+            usage = usage_tokens(None)
+            first_token = None
+            text_placeholder = st.empty()
+
+            llm_start = time.perf_counter()
+
+            with st.spinner('AI Verifier working...'), trace.stage('llm') as stage:
+                for chunk in memory_chain.stream(final_input, config = config):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        stage['time_to_first_token'] = time.perf_counter() - llm_start
 
-    #Response management
-    with st.spinner('AI Verifier working...'):
-        def get_responses():
+                    if chunk.usage_metadata:
+                        usage = usage_tokens(chunk.usage_metadata)
 
-            if 'chat_history' not in st.session_state:
-                    st.session_state.chat_history = []
+                    response.append(chunk.content)
+                    text_placeholder.markdown(f"**AI Verifier:** {''.join(response)}")
 
-            if subject:
-                st.session_state.chat_history.append({'role': 'user', 'content': query})
+                stage.update(prompt_tokens = usage['input'], completion_tokens = usage['output'], cached_tokens = usage['cached'])
 
-                snippets = retrieve_docs(query)
-                final_input = {'query': query, 'snippets': snippets}
+            latency = {'retrieval': retrieval_time, 'first_token': first_token or 0.0, 'total': time.perf_counter() - start}
+            agent_msg = {'role': 'agent', 'content': ''.join(response), 'tokens': token_report, 'latency': latency, 'usage': usage}
+            show_message_details(agent_msg)
 
-                response = []
+        st.session_state.chat_history.append(agent_msg)
+        if use_cache:
+            answer_cache.put(scope, query, ''.join(response), query_embedding, {'tokens': token_report})
 
-                #text_placeholder = st.empty()
+        trace.update(cached = False, time_to_first_token = latency['first_token'])
+        record_trace(trace)
 
-                for chunk in memory_chain.stream(final_input, config = config):
-                    response.append(chunk)
-
-                    #text_placeholder.write(''.join(response))
-
-                st.session_state.chat_history.append({'role': 'agent', 'content': ''.join(response)})
-            
-            st.write('Chat history:')
-
-            for msg in st.session_state.chat_history:
-                with st.container(border = True):
-                    if msg['role'] == 'user':
-                        text_part = st.info(f'User: {msg['content']}')
-                    else:
-                        text_part = st.markdown(f'**AI Verifier:** {msg['content']}')
-        
-            return text_part    
-        
-        if query := st.chat_input('Ask the Coester AI PLC Program Verifier:'):
-
-            get_responses()
\ No newline at end of file
+    if query := st.chat_input('Ask the Coester AI PLC Program Verifier:'):
+
+        get_responses()
+
+#Per-stage durations and counters of the last indexing runs and queries of the session, and reuse of the API connections
+client_stats = get_client_registry().stats()
+
+if st.session_state.get('traces') or client_stats['requests']:
+    with instrumentation_panel.container():
+        with st.expander('Instrumentation'):
+            st.caption(f"API connections: {client_stats['requests']} requests over {client_stats['connections']} connections "
+                       f"({client_stats['reuse_rate']:.0%} reused)")
+
+            for endpoint, latency in client_stats['latency'].items():
+                st.caption(f"{endpoint}: {latency['count']} requests, latency p50 {latency['p50']:.2f} s, p95 {latency['p95']:.2f} s")
+
+            #The connection stats are process-wide, a session may have no traces of its own yet
+            for record in reversed(st.session_state.get('traces', [])):
+                label = 'Index' if record['kind'] == 'index' else 'Query' + (' (cached)' if record.get('cached') else '')
+                st.markdown(f"**{label}** {record['timestamp'][11:19]} UTC, total {record['seconds']:.2f} s")
+                st.dataframe([{'Stage': entry['stage'], 'Seconds': round(entry['seconds'], 3),
+                               **{name: value for name, value in entry.items() if name not in ('stage', 'seconds')}}
+                              for entry in record['stages']], use_container_width = True, hide_index = True)
+
+            st.caption(f"Logged to {get_trace_log().path()}")
@@ -0,0 +1 @@
+#Benchmarks of the Coester AI PLC Program Verifier pipeline
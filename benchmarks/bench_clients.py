@@ -0,0 +1,63 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+
+from plc_verifier.clients import ClientMetrics, ClientRegistry
+from plc_verifier.fake_openai import FakeOpenAIServer
+
+
+#One embedding query per request with a client built for it, as each rerun of the app used to do
+def fresh_clients(base_url, metrics):
+    def embed(text):
+        http_client = httpx.Client(event_hooks = {'request': [metrics.on_request], 'response': [metrics.on_response]})
+        try:
+            client = openai.OpenAI(api_key = 'offline', base_url = base_url, max_retries = 0, http_client = http_client)
+            return client.embeddings.create(input = [text], model = 'text-embedding-3-small').data[0].embedding
+        finally:
+            http_client.close()
+
+    return embed
+
+
+#One embedding query per request through the shared clients of the registry
+def shared_clients(base_url, registry):
+    return registry.embeddings('text-embedding-3-small', 'offline', base_url = base_url).embed_query
+
+
+def measure(embed, requests, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = threads) as pool:
+        list(pool.map(embed, [f'query {i}' for i in range(requests)]))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Connections opened and request latency with fresh versus shared OpenAI clients, against the fake API.')
+    parser.add_argument('--requests', type = int, default = 500)
+    parser.add_argument('--threads', type = int, default = 16)
+    parser.add_argument('--latency', type = float, default = 0.02, help = 'seconds the fake API takes per request')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency = args.latency).start()
+
+    fresh_metrics = ClientMetrics()
+    registry = ClientRegistry()
+
+    for name, embed, stats in (('fresh', fresh_clients(server.base_url, fresh_metrics), fresh_metrics.snapshot),
+                               ('shared', shared_clients(server.base_url, registry), registry.stats)):
+        seconds = measure(embed, args.requests, args.threads)
+        values = stats()
+        latency = values['latency']['embeddings']
+        print(f"{name:>6}: {args.requests} requests in {seconds:.2f} s ({args.requests / seconds:.0f}/s), "
+              f"{values['connections']} connections opened ({values['reuse_rate']:.0%} reused), "
+              f"latency mean {latency['mean'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms")
+
+    registry.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
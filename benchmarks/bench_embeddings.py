@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import time
+
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.synthetic_export import LANGUAGES, generate_export
+from plc_verifier.batch_embeddings import BatchedOpenAIEmbeddings
+from plc_verifier.chunking import PLCStructureSplitter
+from plc_verifier.fake_openai import FakeOpenAIServer
+from plc_verifier.local_embeddings import HashingEmbeddings
+from plc_verifier.pipeline import parse_file
+
+#Backends compared; openai needs OPENAI_API_KEY and network access
+BACKENDS = ['local', 'fake-api', 'openai']
+
+#Ranks at which the recall of the relevant chunks is measured
+RECALL_AT = (5, 10)
+
+
+#Queries with the ids of the chunks that answer them, from the metadata of the chunks:
+#writers of a tag, readers of a tag and one network of a block
+def labeled_queries(docs, count, seed = 0):
+    rng = random.Random(seed)
+    writers, readers, networks = {}, {}, {}
+
+    for position, doc in enumerate(docs):
+        for tag in doc.metadata.get('writes', []):
+            writers.setdefault(tag, set()).add(position)
+        for tag in doc.metadata.get('reads', []):
+            readers.setdefault(tag, set()).add(position)
+        if 'network' in doc.metadata:
+            networks.setdefault((doc.metadata['block'], doc.metadata['network']), set()).add(position)
+
+    queries = []
+    for template, relevant in (('Which networks write {}?', writers), ('Where is {} read?', readers),
+                               ('What does network {1} of block {0} do?', networks)):
+        for key in rng.sample(sorted(relevant), min(count, len(relevant))):
+            query = template.format(*key) if isinstance(key, tuple) else template.format(key)
+            queries.append((query, relevant[key]))
+
+    return queries
+
+
+def build_backend(name, server):
+    if name == 'local':
+        return HashingEmbeddings()
+    if name == 'fake-api':
+        return BatchedOpenAIEmbeddings('text-embedding-3-small', 'offline', base_url = server.base_url)
+    return BatchedOpenAIEmbeddings('text-embedding-3-small', os.environ['OPENAI_API_KEY'])
+
+
+#Indexing throughput, query latency, recall@k and mean reciprocal rank of one backend
+def evaluate(embeddings, docs, queries, k = max(RECALL_AT)):
+    texts = [doc.page_content for doc in docs]
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    vectorstore = FAISS.from_embeddings(zip(texts, vectors), embeddings, metadatas = [{'position': i} for i in range(len(docs))])
+    index_seconds = time.perf_counter() - start
+
+    recall = {at: 0.0 for at in RECALL_AT}
+    reciprocal_rank = 0.0
+    query_seconds = 0.0
+
+    for query, relevant in queries:
+        start = time.perf_counter()
+        hits = [doc.metadata['position'] for doc in vectorstore.similarity_search(query, k = k)]
+        query_seconds += time.perf_counter() - start
+
+        for at in RECALL_AT:
+            recall[at] += len(relevant & set(hits[:at])) / min(len(relevant), at)
+        reciprocal_rank += next((1 / rank for rank, hit in enumerate(hits, start = 1) if hit in relevant), 0.0)
+
+    return {'chunks_per_second': len(texts) / index_seconds, 'index_seconds': index_seconds,
+            'query_ms': 1000 * query_seconds / len(queries),
+            **{f'recall@{at}': value / len(queries) for at, value in recall.items()}, 'mrr': reciprocal_rank / len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Indexing throughput and retrieval quality of the embedding backends on a labeled query set.')
+    parser.add_argument('--blocks', type = int, default = 50)
+    parser.add_argument('--networks', type = int, default = 10)
+    parser.add_argument('--tags', type = int, default = 300)
+    parser.add_argument('--languages', nargs = '+', default = LANGUAGES, choices = LANGUAGES)
+    parser.add_argument('--queries', type = int, default = 50, help = 'queries of each kind')
+    parser.add_argument('--backends', nargs = '+', default = ['local', 'fake-api'], choices = BACKENDS)
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds the fake API takes per request')
+    args = parser.parse_args()
+
+    data = generate_export(args.blocks, args.networks, args.tags, languages = args.languages)
+    docs = parse_file('export.xml', data, 1, PLCStructureSplitter(chunk_size = 4000))
+    queries = labeled_queries(docs, args.queries)
+    print(f'{len(docs)} chunks, {len(queries)} labeled queries')
+
+    server = FakeOpenAIServer(latency = args.latency).start()
+
+    for name in args.backends:
+        result = evaluate(build_backend(name, server), docs, queries)
+        print(f"{name:>8}: {result['chunks_per_second']:8.0f} chunks/s, query {result['query_ms']:6.1f} ms, "
+              + ', '.join(f"recall@{at} {result[f'recall@{at}']:.2f}" for at in RECALL_AT) + f", MRR {result['mrr']:.2f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
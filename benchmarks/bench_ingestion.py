@@ -0,0 +1,98 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic_export import generate_export
+
+#Sizes of the synthetic exports, as (blocks, networks per block)
+DEFAULT_SIZES = [(10, 10), (50, 20), (200, 25)]
+
+
+#Current resident set size in kB
+def current_rss_kb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() // 1024
+
+
+#Previous ingestion: whole soup tree and prettified string per file
+def ingest_soup(name, data):
+    from bs4 import BeautifulSoup
+    from io import BytesIO
+    from langchain_core.documents import Document
+
+    return [Document(metadata = {'source': name, 'page': 1, 'page_label': '1'},
+                     page_content = BeautifulSoup(BytesIO(data), 'xml').prettify())]
+
+
+#Current ingestion: streaming iterparse, one document per interface and network
+def ingest_iterparse(name, data):
+    from plc_verifier.ingestion import iter_documents
+
+    return list(iter_documents(name, data, 1))
+
+
+#Runs one ingestion path in a fresh process so the peak RSS belongs to that path only
+def run_child(path, file_name, queue):
+    ingest = {'soup': ingest_soup, 'iterparse': ingest_iterparse}[path]
+
+    with open(file_name, 'rb') as f:
+        data = f.read()
+
+    rss_before = current_rss_kb()
+    start = time.perf_counter()
+    docs = ingest(file_name, data)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put({'seconds': elapsed, 'peak_rss_delta_mb': max(peak - rss_before, 0) / 1024,
+               'documents': len(docs), 'characters': sum(len(doc.page_content) for doc in docs)})
+
+
+def measure(path, file_name):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target = run_child, args = (path, file_name, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare BeautifulSoup prettify and lxml iterparse ingestion.')
+    parser.add_argument('--sizes', nargs = '*', default = [f'{b}x{n}' for b, n in DEFAULT_SIZES],
+                        help = 'export sizes as BLOCKSxNETWORKS')
+    parser.add_argument('--output', help = 'optional JSON file for the results')
+    args = parser.parse_args()
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            blocks, networks = (int(value) for value in size.split('x'))
+            file_name = os.path.join(temp_dir, f'export_{size}.xml')
+
+            with open(file_name, 'wb') as f:
+                f.write(generate_export(blocks, networks))
+
+            file_mb = os.path.getsize(file_name) / 1024 / 1024
+
+            for path in ['soup', 'iterparse']:
+                result = {'size': size, 'file_mb': round(file_mb, 2), 'path': path, **measure(path, file_name)}
+                results.append(result)
+                print(f"{size:>10} {file_mb:8.1f} MB {path:>10}: {result['seconds']:8.2f} s, "
+                      f"peak +{result['peak_rss_delta_mb']:8.1f} MB, {result['documents']} documents")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
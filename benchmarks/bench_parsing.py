@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+import time
+
+from benchmarks.synthetic_export import generate_export
+
+
+#Parsing and chunking time of an upload of synthetic block files, serial and with process pools of growing size
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare serial and process-pool parsing of a multi-file upload.')
+    parser.add_argument('--files', type = int, default = 200, help = 'number of block files in the upload')
+    parser.add_argument('--networks', type = int, default = 25, help = 'networks per block file')
+    parser.add_argument('--workers', nargs = '*', type = int, default = sorted({1, 2, 4, 8, os.cpu_count() or 1}))
+    parser.add_argument('--output', help = 'optional JSON file for the results')
+    args = parser.parse_args()
+
+    from plc_verifier.chunking import PLCStructureSplitter
+    from plc_verifier.pipeline import ExportFile, get_parse_pool, parse_file, parse_files
+
+    files = [ExportFile(f'block_{index:04d}.xml', generate_export(1, args.networks, seed = index)) for index in range(args.files)]
+    upload_mb = sum(len(f.data) for f in files) / 1024 / 1024
+    text_splitter = PLCStructureSplitter(chunk_size = 4000)
+    results = []
+    baseline = None
+
+    for workers in args.workers:
+        #Pool start-up and worker imports are paid once per server, so they are not part of the measured time
+        if workers > 1:
+            pool = get_parse_pool(workers)
+            list(pool.map(parse_file, [f.name for f in files[:workers]], [f.data for f in files[:workers]],
+                          range(workers), [text_splitter] * workers))
+
+        start = time.perf_counter()
+        chunks = parse_files(files, text_splitter, workers)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = elapsed
+
+        result = {'files': len(files), 'upload_mb': round(upload_mb, 2), 'workers': workers, 'seconds': elapsed,
+                  'speedup': baseline / elapsed, 'chunks': len(chunks)}
+        results.append(result)
+        print(f"{workers:>3} workers: {elapsed:8.2f} s, speedup {result['speedup']:5.2f}x, {len(chunks)} chunks ({upload_mb:.1f} MB)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
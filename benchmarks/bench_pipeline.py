@@ -0,0 +1,228 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_export import LANGUAGES, generate_export
+
+#Sizes of the synthetic exports, as BLOCKSxNETWORKS
+DEFAULT_SIZES = ['20x10', '100x20']
+
+#Queries of the retrieval stage
+QUERIES = ['Is the safety output latched until a manual reset?', 'Which networks write Valve_0010?',
+           'Are the door commands interlocked with the motor?', 'How is a sensor fault handled?']
+
+#Dimensions of text-embedding-3-small, used by the fake embedder
+EMBEDDING_SIZE = 1536
+
+#Default tolerance of a comparison with a baseline: 25% slower or larger is a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+#Peak resident set size of the process in MB since the last reset
+def peak_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def current_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+#Resets the peak RSS to the current RSS, so each stage reports its own peak
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+#Original pipeline: whole-file BeautifulSoup prettify and 500-character recursive splits
+def original_stages(name, data):
+    from io import BytesIO
+
+    from bs4 import BeautifulSoup
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    def parse():
+        return [Document(metadata = {'source': name, 'page': 1, 'page_label': '1'},
+                         page_content = BeautifulSoup(BytesIO(data), 'xml').prettify())]
+
+    def split(docs):
+        return RecursiveCharacterTextSplitter(chunk_size = 500, chunk_overlap = 100).split_documents(docs)
+
+    return parse, split
+
+
+#Current pipeline: streaming iterparse with canonical notation and one chunk per network
+def current_stages(name, data):
+    from plc_verifier.canonical import canonicalize_documents
+    from plc_verifier.chunking import PLCStructureSplitter
+    from plc_verifier.ingestion import iter_documents
+
+    def parse():
+        return canonicalize_documents(iter_documents(name, data, 1))
+
+    def split(docs):
+        return PLCStructureSplitter(chunk_size = 4000).split_documents(docs)
+
+    return parse, split
+
+
+PIPELINES = {'original': original_stages, 'current': current_stages}
+
+
+#Runs the stages of one pipeline in this process; returns {stage: {'seconds', 'peak_rss_mb', 'rss_delta_mb', 'items'}}
+def run_stages(pipeline, file_name):
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    with open(file_name, 'rb') as f:
+        data = f.read()
+
+    embeddings = DeterministicFakeEmbedding(size = EMBEDDING_SIZE)
+    parse, split = PIPELINES[pipeline](os.path.basename(file_name), data)
+    results = {}
+    state = {}
+
+    def stage(name, function):
+        reset_peak_rss()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        output, items = function()
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb()
+        results[name] = {'seconds': elapsed, 'peak_rss_mb': peak, 'rss_delta_mb': max(peak - rss_before, 0.0), 'items': items}
+        return output
+
+    def embed():
+        vectors = embeddings.embed_documents([doc.page_content for doc in state['splits']])
+        return vectors, len(vectors)
+
+    def build():
+        pairs = zip([doc.page_content for doc in state['splits']], state['vectors'])
+        vectorstore = FAISS.from_embeddings(pairs, embeddings, metadatas = [doc.metadata for doc in state['splits']])
+        return vectorstore, vectorstore.index.ntotal
+
+    def retrieve():
+        hits = [state['vectorstore'].max_marginal_relevance_search(query, k = 50, fetch_k = 100, lambda_mult = 0.25) for query in QUERIES]
+        return hits, len(QUERIES)
+
+    def parse_stage():
+        docs = parse()
+        return docs, len(docs)
+
+    def split_stage():
+        splits = split(state['docs'])
+        return splits, len(splits)
+
+    state['docs'] = stage('parse', parse_stage)
+    state['splits'] = stage('split', split_stage)
+    state['vectors'] = stage('embed', embed)
+    state['vectorstore'] = stage('faiss', build)
+    stage('mmr', retrieve)
+
+    return results
+
+
+def run_child(pipeline, file_name, queue):
+    queue.put(run_stages(pipeline, file_name))
+
+
+#Runs one pipeline in a fresh process so memory of earlier runs does not leak into its figures
+def measure(pipeline, file_name):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target = run_child, args = (pipeline, file_name, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+#Regressions of results against a baseline: stages slower or with higher peak RSS than the tolerance allows
+def compare(results, baseline, tolerance = DEFAULT_TOLERANCE):
+    previous = {(run['size'], run['pipeline']): run['stages'] for run in baseline['runs']}
+    regressions = []
+
+    for run in results['runs']:
+        stages = previous.get((run['size'], run['pipeline']))
+        if stages is None:
+            continue
+
+        for stage, values in run['stages'].items():
+            if stage not in stages:
+                continue
+            for metric in ('seconds', 'peak_rss_mb'):
+                old, new = stages[stage][metric], values[metric]
+                if old > 0 and new > old * (1 + tolerance):
+                    regressions.append({'size': run['size'], 'pipeline': run['pipeline'], 'stage': stage, 'metric': metric,
+                                        'baseline': old, 'current': new, 'change': new / old - 1})
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Time and measure peak RSS of each stage of the verifier pipeline on synthetic exports.')
+    parser.add_argument('--sizes', nargs = '*', default = DEFAULT_SIZES, help = 'export sizes as BLOCKSxNETWORKS')
+    parser.add_argument('--tags', type = int, default = 500)
+    parser.add_argument('--languages', nargs = '+', default = LANGUAGES, choices = LANGUAGES)
+    parser.add_argument('--pipelines', nargs = '+', default = list(PIPELINES), choices = list(PIPELINES))
+    parser.add_argument('--output', help = 'JSON file for the results, e.g. a new baseline')
+    parser.add_argument('--baseline', help = 'JSON results to compare with; exit status 1 on regression')
+    parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+               'tags': args.tags, 'languages': args.languages, 'runs': []}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            blocks, networks = (int(value) for value in size.split('x'))
+            file_name = os.path.join(temp_dir, f'export_{size}.xml')
+
+            with open(file_name, 'wb') as f:
+                f.write(generate_export(blocks, networks, args.tags, languages = args.languages))
+
+            file_mb = os.path.getsize(file_name) / 1024 / 1024
+
+            for pipeline in args.pipelines:
+                stages = measure(pipeline, file_name)
+                results['runs'].append({'size': size, 'file_mb': round(file_mb, 2), 'pipeline': pipeline, 'stages': stages})
+
+                for stage, values in stages.items():
+                    print(f"{size:>10} {file_mb:6.1f} MB {pipeline:>9} {stage:>6}: {values['seconds']:8.2f} s, "
+                          f"peak {values['peak_rss_mb']:8.1f} MB (+{values['rss_delta_mb']:.1f}), {values['items']} items")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print(f"REGRESSION {regression['size']} {regression['pipeline']} {regression['stage']} {regression['metric']}: "
+                  f"{regression['baseline']:.2f} -> {regression['current']:.2f} ({regression['change']:+.0%})")
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from plc_verifier.vector_index import DEFAULT_EF_SEARCH, DEFAULT_NPROBE, build_faiss_index, index_bytes, tune_index
+
+#Index types and compressions compared, with the query knob values swept for each
+CONFIGURATIONS = [('flat', 'none'), ('flat', 'fp16'), ('flat', 'pq'), ('hnsw', 'none'), ('hnsw', 'fp16'), ('ivf', 'none'), ('ivf', 'fp16'),
+                  ('ivf', 'pq')]
+NPROBES = [4, DEFAULT_NPROBE, 64]
+EF_SEARCHES = [DEFAULT_EF_SEARCH, 256]
+
+
+#Unit vectors drawn around cluster centers, like embeddings of networks sharing tags and blocks, and queries near them
+def synthetic_vectors(count, dimensions, queries, clusters = 200, seed = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions), dtype = np.float32)
+    vectors = centers[rng.integers(clusters, size = count)] + 0.8 * rng.standard_normal((count, dimensions), dtype = np.float32)
+    faiss.normalize_L2(vectors)
+
+    noise = rng.standard_normal((queries, dimensions), dtype = np.float32) * np.float32(0.3 / np.sqrt(dimensions))
+    picks = vectors[rng.integers(count, size = queries)] + noise
+    faiss.normalize_L2(picks)
+
+    return vectors, picks
+
+
+#Latencies of queries sent one at a time, as the retriever does, and the ids found
+def search(index, queries, k):
+    latencies, found = [], []
+
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+
+    return np.asarray(latencies), found
+
+
+def recall(found, truth, k):
+    return float(np.mean([len(set(ids[:k]) & set(exact[:k])) / k for ids, exact in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Memory, build time, query latency and recall@k of the FAISS index types against the exact flat index.')
+    parser.add_argument('--count', type = int, default = 50000, help = 'indexed vectors')
+    parser.add_argument('--dimensions', type = int, default = 1536)
+    parser.add_argument('--queries', type = int, default = 200)
+    parser.add_argument('--k', type = int, default = 100, help = 'neighbors compared, the fetch_k of the MMR search')
+    parser.add_argument('--threads', type = int, default = 1, help = 'FAISS threads, 1 as for a query of one session')
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    vectors, queries = synthetic_vectors(args.count, args.dimensions, args.queries)
+    truth = None
+
+    print(f"{args.count} vectors of {args.dimensions} dimensions ({vectors.nbytes / 2 ** 20:.0f} MB as float32), {args.queries} queries, k = {args.k}")
+
+    for kind, compression in CONFIGURATIONS:
+        start = time.perf_counter()
+        index, spec = build_faiss_index(vectors, {'kind': kind, 'compression': compression})
+        build_seconds = time.perf_counter() - start
+        memory_mb = index_bytes(index) / 2 ** 20
+
+        knobs = [('nprobe', value) for value in NPROBES] if kind == 'ivf' else [('efSearch', value) for value in EF_SEARCHES] if kind == 'hnsw' else [('', None)]
+
+        for knob, value in knobs:
+            tune_index(index, nprobe = value if knob == 'nprobe' else None, ef_search = value if knob == 'efSearch' else None)
+            latencies, found = search(index, queries, args.k)
+
+            #The uncompressed flat index is the exact baseline
+            if truth is None:
+                truth = found
+
+            label = f"{spec['factory']}" + (f" {knob}={value}" if knob else '')
+            print(f"{label:>28}: {memory_mb:8.1f} MB, build {build_seconds:7.2f} s, query p50 {np.percentile(latencies, 50) * 1000:7.2f} ms, "
+                  f"p95 {np.percentile(latencies, 95) * 1000:7.2f} ms, recall@{args.k} {recall(found, truth, args.k):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+#Namespaces used by TIA Portal Openness exports
+INTERFACE_NS = 'http://www.siemens.com/automation/Openness/SW/Interface/v5'
+FLGNET_NS = 'http://www.siemens.com/automation/Openness/SW/NetworkSource/FlgNet/v4'
+STL_NS = 'http://www.siemens.com/automation/Openness/SW/NetworkSource/StatementList/v4'
+SCL_NS = 'http://www.siemens.com/automation/Openness/SW/NetworkSource/StructuredText/v3'
+
+#Programming languages of the generated blocks
+LANGUAGES = ['LAD', 'FBD', 'STL', 'SCL']
+
+
+#Tag names shared by the generated blocks, so networks read what others write
+def make_tags(count):
+    prefixes = ['Safety', 'CMD', 'Valve', 'Door', 'Motor', 'Aux_SR', 'Temp', 'PB', 'Fault', 'Sensor']
+    return [f'{prefixes[i % len(prefixes)]}_{i:04d}' for i in range(count)]
+
+
+#Ladder network: contacts in series with one OR branch driving a coil
+def ladder_network(rng, tags, uid):
+    contacts = rng.sample(tags, 3)
+    output = rng.choice(tags)
+    coil = rng.choice(['Coil', 'Coil', 'SCoil', 'RCoil'])
+    negated = rng.random() < 0.3
+    lines = [f'<FlgNet xmlns="{FLGNET_NS}">', '<Parts>']
+
+    for offset, tag in enumerate(contacts + [output]):
+        lines.append(f'<Access Scope="GlobalVariable" UId="{uid + offset}"><Symbol><Component Name="{tag}" /></Symbol></Access>')
+
+    lines.append(f'<Part Name="Contact" UId="{uid + 4}" />')
+    lines.append(f'<Part Name="Contact" UId="{uid + 5}"><Negated Name="operand" /></Part>' if negated else f'<Part Name="Contact" UId="{uid + 5}" />')
+    lines.append(f'<Part Name="Contact" UId="{uid + 6}" />')
+    lines.append(f'<Part Name="O" UId="{uid + 7}"><TemplateValue Name="Card" Type="Cardinality">2</TemplateValue></Part>')
+    lines.append(f'<Part Name="{coil}" UId="{uid + 8}" />')
+    lines.append('</Parts>')
+    lines.append('<Wires>')
+
+    wires = [
+        ('<Powerrail />', f'<NameCon UId="{uid + 4}" Name="in" />'),
+        (f'<IdentCon UId="{uid}" />', f'<NameCon UId="{uid + 4}" Name="operand" />'),
+        (f'<IdentCon UId="{uid + 1}" />', f'<NameCon UId="{uid + 5}" Name="operand" />'),
+        (f'<IdentCon UId="{uid + 2}" />', f'<NameCon UId="{uid + 6}" Name="operand" />'),
+        (f'<NameCon UId="{uid + 4}" Name="out" />', f'<NameCon UId="{uid + 5}" Name="in" /><NameCon UId="{uid + 6}" Name="in" />'),
+        (f'<NameCon UId="{uid + 5}" Name="out" />', f'<NameCon UId="{uid + 7}" Name="in1" />'),
+        (f'<NameCon UId="{uid + 6}" Name="out" />', f'<NameCon UId="{uid + 7}" Name="in2" />'),
+        (f'<NameCon UId="{uid + 7}" Name="out" />', f'<NameCon UId="{uid + 8}" Name="in" />'),
+        (f'<IdentCon UId="{uid + 3}" />', f'<NameCon UId="{uid + 8}" Name="operand" />'),
+    ]
+
+    for offset, (source, target) in enumerate(wires, start = 9):
+        lines.append(f'<Wire UId="{uid + offset}">{source}{target}</Wire>')
+
+    lines.append('</Wires>')
+    lines.append('</FlgNet>')
+
+    return lines
+
+
+def access(uid, tag, scope = 'GlobalVariable'):
+    return f'<Access Scope="{scope}" UId="{uid}"><Symbol><Component Name="{tag}" /></Symbol></Access>'
+
+
+#FBD network: AND box with a negated input, OR box, on-delay timer instance and assignment
+def fbd_network(rng, tags, uid):
+    inputs = rng.sample(tags, 3)
+    output, timer_output = rng.sample(tags, 2)
+    lines = [f'<FlgNet xmlns="{FLGNET_NS}">', '<Parts>']
+
+    for offset, tag in enumerate(inputs + [output, timer_output]):
+        lines.append(access(uid + offset, tag))
+    lines.append(f'<Access Scope="LiteralConstant" UId="{uid + 5}"><Constant><ConstantType>Time</ConstantType>'
+                 f'<ConstantValue>T#{rng.choice([100, 500, 2000])}MS</ConstantValue></Constant></Access>')
+
+    lines.append(f'<Part Name="A" UId="{uid + 6}"><TemplateValue Name="Card" Type="Cardinality">2</TemplateValue>'
+                 f'<Negated Name="in2" /></Part>')
+    lines.append(f'<Part Name="O" UId="{uid + 7}"><TemplateValue Name="Card" Type="Cardinality">2</TemplateValue></Part>')
+    lines.append(f'<Part Name="TON" Version="1.0" UId="{uid + 8}"><Instance Scope="LocalVariable" UId="{uid + 9}">'
+                 f'<Component Name="IEC_Timer_{uid}_{rng.randrange(1000)}" /></Instance></Part>')
+    lines.append(f'<Part Name="Coil" UId="{uid + 10}" />')
+    lines.append('</Parts>')
+    lines.append('<Wires>')
+
+    wires = [
+        (f'<IdentCon UId="{uid}" />', f'<NameCon UId="{uid + 6}" Name="in1" />'),
+        (f'<IdentCon UId="{uid + 1}" />', f'<NameCon UId="{uid + 6}" Name="in2" />'),
+        (f'<NameCon UId="{uid + 6}" Name="out" />', f'<NameCon UId="{uid + 7}" Name="in1" />'),
+        (f'<IdentCon UId="{uid + 2}" />', f'<NameCon UId="{uid + 7}" Name="in2" />'),
+        (f'<NameCon UId="{uid + 7}" Name="out" />', f'<NameCon UId="{uid + 8}" Name="IN" /><NameCon UId="{uid + 10}" Name="in" />'),
+        (f'<IdentCon UId="{uid + 5}" />', f'<NameCon UId="{uid + 8}" Name="PT" />'),
+        (f'<NameCon UId="{uid + 8}" Name="Q" />', f'<IdentCon UId="{uid + 4}" />'),
+        (f'<IdentCon UId="{uid + 3}" />', f'<NameCon UId="{uid + 10}" Name="operand" />'),
+    ]
+
+    for offset, (source, target) in enumerate(wires, start = 11):
+        lines.append(f'<Wire UId="{uid + offset}">{source}{target}</Wire>')
+
+    lines.append('</Wires>')
+    lines.append('</FlgNet>')
+
+    return lines
+
+
+#STL network: A/AN/O chain ending in an assignment, set or reset
+def stl_network(rng, tags, uid):
+    inputs = rng.sample(tags, 3)
+    output = rng.choice(tags)
+    instructions = ['A', rng.choice(['A', 'AN']), rng.choice(['O', 'A']), rng.choice(['=', '=', 'S', 'R'])]
+    lines = [f'<StatementList xmlns="{STL_NS}">']
+
+    for offset, (instruction, tag) in enumerate(zip(instructions, inputs + [output])):
+        lines.append(f'<StlStatement UId="{uid + 2 * offset}"><StlToken Text="{escape(instruction)}" UId="{uid + 2 * offset + 1}" />'
+                     f'{access(uid + 20 + offset, tag)}</StlStatement>')
+
+    lines.append('</StatementList>')
+
+    return lines
+
+
+#SCL network: IF statement writing one output from three inputs
+def scl_network(rng, tags, uid):
+    first, second, third, output = rng.sample(tags, 4)
+    operator = rng.choice(['AND', 'OR'])
+    tokens = [('token', 'IF'), ('blank',), ('access', first), ('blank',), ('token', operator), ('blank',), ('token', 'NOT'),
+              ('blank',), ('access', second), ('blank',), ('token', 'THEN'), ('newline',),
+              ('blank',), ('access', output), ('blank',), ('token', ':='), ('blank',), ('access', third), ('token', ';'), ('newline',),
+              ('token', 'ELSE'), ('newline',),
+              ('blank',), ('access', output), ('blank',), ('token', ':='), ('blank',), ('token', 'FALSE'), ('token', ';'), ('newline',),
+              ('token', 'END_IF'), ('token', ';')]
+    lines = [f'<StructuredText xmlns="{SCL_NS}">']
+
+    for offset, token in enumerate(tokens):
+        if token[0] == 'token':
+            lines.append(f'<Token Text="{escape(token[1])}" UId="{uid + offset}" />')
+        elif token[0] == 'access':
+            lines.append(access(uid + offset, token[1]))
+        elif token[0] == 'blank':
+            lines.append(f'<Blank UId="{uid + offset}" />')
+        else:
+            lines.append(f'<NewLine UId="{uid + offset}" />')
+
+    lines.append('</StructuredText>')
+
+    return lines
+
+
+NETWORKS = {'LAD': ladder_network, 'FBD': fbd_network, 'STL': stl_network, 'SCL': scl_network}
+
+
+#Interface section of a block
+def block_interface(rng, tags):
+    lines = ['<Interface>', f'<Sections xmlns="{INTERFACE_NS}">']
+
+    for section in ['Input', 'Output', 'InOut', 'Temp']:
+        lines.append(f'<Section Name="{section}">')
+        for tag in rng.sample(tags, 3):
+            lines.append(f'<Member Name="{section}_{tag}" Datatype="Bool" />')
+        lines.append('</Section>')
+
+    lines.append('</Sections>')
+    lines.append('</Interface>')
+
+    return lines
+
+
+#Comment or title of a block or network
+def multilingual_text(ident, composition, text):
+    return [
+        f'<MultilingualText ID="{ident:X}" CompositionName="{composition}">',
+        '<ObjectList>',
+        f'<MultilingualTextItem ID="{ident + 1:X}" CompositionName="Items">',
+        f'<AttributeList><Culture>en-US</Culture><Text>{escape(text)}</Text></AttributeList>',
+        '</MultilingualTextItem>',
+        '</ObjectList>',
+        '</MultilingualText>',
+    ]
+
+
+#Generates a TIA Portal Openness export with the given number of blocks and networks
+#Blocks take the languages in turn (Ladder only by default)
+def generate_export(blocks = 10, networks_per_block = 10, tags = 200, seed = 0, languages = ('LAD',)):
+    rng = random.Random(seed)
+    tag_names = make_tags(tags)
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<Document>', '<Engineering version="V17" />']
+
+    for block in range(blocks):
+        ident = 0
+        language = languages[block % len(languages)]
+        lines.append(f'<SW.Blocks.FC ID="{ident}">')
+        lines.append('<AttributeList>')
+        lines.extend(block_interface(rng, tag_names))
+        lines.append(f'<Name>FC_Control_{block:04d}</Name>')
+        lines.append(f'<Number>{block + 1}</Number>')
+        lines.append(f'<ProgrammingLanguage>{language}</ProgrammingLanguage>')
+        lines.append('</AttributeList>')
+        lines.append('<ObjectList>')
+
+        for network in range(networks_per_block):
+            ident += 10
+            lines.append(f'<SW.Blocks.CompileUnit ID="{ident:X}" CompositionName="CompileUnits">')
+            lines.append('<AttributeList>')
+            lines.append('<NetworkSource>')
+            lines.extend(NETWORKS[language](rng, tag_names, 21))
+            lines.append('</NetworkSource>')
+            lines.append(f'<ProgrammingLanguage>{language}</ProgrammingLanguage>')
+            lines.append('</AttributeList>')
+            lines.append('<ObjectList>')
+            lines.extend(multilingual_text(ident + 2, 'Comment', f'Interlock {network} of block {block}'))
+            lines.extend(multilingual_text(ident + 4, 'Title', f'Network {network + 1}'))
+            lines.append('</ObjectList>')
+            lines.append('</SW.Blocks.CompileUnit>')
+
+        lines.append('</ObjectList>')
+        lines.append('</SW.Blocks.FC>')
+
+    lines.append('</Document>')
+
+    return '\n'.join(lines).encode('utf-8')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate a synthetic TIA Portal Openness export.')
+    parser.add_argument('output')
+    parser.add_argument('--blocks', type = int, default = 10)
+    parser.add_argument('--networks', type = int, default = 10)
+    parser.add_argument('--tags', type = int, default = 200)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--languages', nargs = '+', default = ['LAD'], choices = LANGUAGES)
+    args = parser.parse_args()
+
+    with open(args.output, 'wb') as f:
+        f.write(generate_export(args.blocks, args.networks, args.tags, args.seed, args.languages))
@@ -0,0 +1 @@
+#Support modules of the Coester AI PLC Program Verifier
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from plc_verifier.embedding_cache import DEFAULT_CACHE_DIR
+from plc_verifier.lexical import query_identifiers
+
+#Default lifetime and size of the answer cache
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_SIMILARITY = 0.95
+
+
+#Query normalized for exact matching: case, whitespace and final punctuation ignored
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', query).strip().lower().rstrip('?.!; ')
+
+
+#Scope of an answer: the indexed corpus and the language and subject it was asked for
+def answer_scope(corpus_fingerprint, language, subject):
+    key = json.dumps([corpus_fingerprint, language, subject.strip().lower()])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+#Disk-backed cache of verifier answers with TTL and LRU eviction
+#Answers are found by normalized query, or by query embedding above a cosine similarity threshold among the queries
+#naming the same identifiers
+class AnswerCache:
+
+    def __init__(self, path = None, ttl = DEFAULT_TTL, max_entries = DEFAULT_MAX_ENTRIES):
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok = True)
+            path = os.path.join(DEFAULT_CACHE_DIR, 'answers.sqlite')
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS answers ('
+            'key TEXT PRIMARY KEY, scope TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB, '
+            'answer TEXT NOT NULL, details TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)')
+        self._conn.commit()
+
+    @staticmethod
+    def _key(scope, query):
+        return hashlib.sha256(f'{scope}\0{normalize_query(query)}'.encode('utf-8')).hexdigest()
+
+    #Returns {'answer', 'details', 'match', 'similarity'} or None
+    def get(self, scope, query, embedding = None, threshold = DEFAULT_SIMILARITY):
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute('DELETE FROM answers WHERE created < ?', (now - self.ttl,))
+
+            row = self._conn.execute('SELECT key, answer, details FROM answers WHERE key = ?', (self._key(scope, query),)).fetchone()
+            match, similarity = 'exact', 1.0
+
+            if row is None and embedding is not None:
+                #Similar queries naming other tags (Pump_1, Pump_2) embed close together, so only queries naming the same ones match
+                identifiers = set(query_identifiers(query))
+                rows = [stored for stored in self._conn.execute(
+                    'SELECT key, answer, details, embedding, query FROM answers WHERE scope = ? AND embedding IS NOT NULL', (scope,))
+                    if set(query_identifiers(stored[4])) == identifiers]
+                row, match, similarity = None, 'similar', 0.0
+
+                if rows:
+                    matrix = np.stack([np.frombuffer(stored[3], dtype = np.float32) for stored in rows])
+                    vector = np.asarray(embedding, dtype = np.float32)
+                    sims = matrix @ vector / (np.linalg.norm(matrix, axis = 1) * np.linalg.norm(vector) + 1e-12)
+                    best = int(np.argmax(sims))
+
+                    if sims[best] >= threshold:
+                        row, similarity = rows[best][:3], float(sims[best])
+
+            if row is not None:
+                self._conn.execute('UPDATE answers SET last_access = ? WHERE key = ?', (now, row[0]))
+
+            self._conn.commit()
+
+        if row is None:
+            return None
+
+        return {'answer': row[1], 'details': json.loads(row[2]), 'match': match, 'similarity': similarity}
+
+    def put(self, scope, query, answer, embedding = None, details = None):
+        now = time.time()
+        blob = np.asarray(embedding, dtype = np.float32).tobytes() if embedding is not None else None
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO answers (key, scope, query, embedding, answer, details, created, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self._key(scope, query), scope, query, blob, answer, json.dumps(details or {}), now, now),
+            )
+            self._conn.execute(
+                'DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+            self._conn.commit()
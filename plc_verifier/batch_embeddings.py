@@ -0,0 +1,199 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from plc_verifier.retries import DEFAULT_RETRIES, RETRYABLE_ERRORS
+from plc_verifier.tokens import EMBEDDING_ENCODING, count_tokens
+
+#Default size of the embedding requests and number of requests in flight
+DEFAULT_BATCH_TOKENS = 50000
+DEFAULT_BATCH_ITEMS = 2048
+DEFAULT_PARALLELISM = 4
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+
+
+#Seconds of a rate-limit reset header: '1s', '6m0s', '20ms', or plain seconds
+def parse_duration(value):
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+
+    return sum(float(number) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit] for number, unit in parts)
+
+
+#Batches of text positions with at most max_tokens tokens and max_items texts each
+#A text longer than max_tokens makes a batch of its own
+def token_batches(token_counts, max_tokens = DEFAULT_BATCH_TOKENS, max_items = DEFAULT_BATCH_ITEMS):
+    batches = []
+    batch = []
+    batch_tokens = 0
+
+    for position, tokens in enumerate(token_counts):
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+
+        batch.append(position)
+        batch_tokens += tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+#OpenAI embeddings sent in token-sized batches by parallel requests
+#Rate-limit headers are honored: a 429 pauses every request until the reset it announces (or an exponential backoff),
+#and a batch larger than the remaining token quota waits for its reset
+#embed_batches yields each batch as it completes, so callers can store it before the next ones arrive
+class BatchedOpenAIEmbeddings(Embeddings):
+
+    def __init__(self, model, api_key, base_url = None, batch_tokens = DEFAULT_BATCH_TOKENS, batch_items = DEFAULT_BATCH_ITEMS,
+                 parallelism = DEFAULT_PARALLELISM, retries = DEFAULT_RETRIES, client = None):
+        self.model = model
+        self.client = client or openai.OpenAI(api_key = api_key, base_url = base_url, max_retries = 0)
+        self.batch_tokens = batch_tokens
+        self.batch_items = batch_items
+        self.parallelism = parallelism
+        self.retries = retries
+        self.last_report = {}
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self._remaining_tokens = None
+        self._reset_at = 0.0
+
+    #Waits for a pause set by a rate limit, and for the token quota when the batch does not fit in what remains
+    def _wait_for_quota(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait_until = self._pause_until
+
+                if self._remaining_tokens is not None and tokens > self._remaining_tokens and self._reset_at > now:
+                    wait_until = max(wait_until, self._reset_at)
+                else:
+                    if self._remaining_tokens is not None:
+                        self._remaining_tokens -= tokens
+
+            if wait_until <= now:
+                return
+
+            time.sleep(wait_until - now)
+
+    def _update_quota(self, headers):
+        remaining = headers.get('x-ratelimit-remaining-tokens')
+        reset = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+
+        with self._lock:
+            if remaining is not None:
+                self._remaining_tokens = int(remaining)
+            if reset is not None:
+                self._reset_at = time.monotonic() + reset
+
+    def _backoff(self, error, attempt):
+        response = getattr(error, 'response', None)
+        headers = response.headers if response is not None else {}
+        delay = parse_duration(headers.get('retry-after')) or parse_duration(headers.get('x-ratelimit-reset-tokens'))
+
+        if delay is None:
+            delay = 2 ** attempt * (0.5 + random.random())
+
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+
+    #Vectors of one batch of texts, with retries
+    def _embed_batch(self, texts, tokens, stats):
+        for attempt in range(self.retries + 1):
+            self._wait_for_quota(tokens)
+
+            try:
+                raw = self.client.embeddings.with_raw_response.create(input = texts, model = self.model)
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    stats['retries'] += 1
+                self._backoff(error, attempt)
+                continue
+
+            self._update_quota(raw.headers)
+            data = sorted(raw.parse().data, key = lambda item: item.index)
+
+            return [item.embedding for item in data]
+
+    #Yields (positions, vectors) of the batches of texts as they complete
+    #After a failed batch no new batch is sent; the batches in flight are still yielded, then the error is raised
+    def embed_batches(self, texts):
+        start = time.perf_counter()
+        token_counts = [count_tokens(text, EMBEDDING_ENCODING) for text in texts]
+        batches = token_batches(token_counts, self.batch_tokens, self.batch_items)
+        stats = {'chunks': 0, 'tokens': 0, 'batches': 0, 'retries': 0}
+        error = None
+
+        with ThreadPoolExecutor(max_workers = self.parallelism) as pool:
+            pending = {}
+            queue = iter(batches)
+
+            def submit():
+                for batch in queue:
+                    tokens = sum(token_counts[position] for position in batch)
+                    future = pool.submit(self._embed_batch, [texts[position] for position in batch], tokens, stats)
+                    pending[future] = (batch, tokens)
+                    return
+
+            for _ in range(self.parallelism):
+                submit()
+
+            while pending:
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+
+                for future in done:
+                    batch, tokens = pending.pop(future)
+
+                    try:
+                        vectors = future.result()
+                    except Exception as batch_error:
+                        error = error or batch_error
+                        continue
+
+                    stats['chunks'] += len(batch)
+                    stats['tokens'] += tokens
+                    stats['batches'] += 1
+
+                    if error is None:
+                        submit()
+
+                    yield batch, vectors
+
+        seconds = time.perf_counter() - start
+        self.last_report = {**stats, 'seconds': seconds, 'chunks_per_second': stats['chunks'] / seconds if seconds else 0.0,
+                            'tokens_per_second': stats['tokens'] / seconds if seconds else 0.0}
+
+        if error is not None:
+            raise error
+
+    def embed_documents(self, texts):
+        vectors = [None] * len(texts)
+
+        for batch, batch_vectors in self.embed_batches(texts):
+            for position, vector in zip(batch, batch_vectors):
+                vectors[position] = vector
+
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text], count_tokens(text, EMBEDDING_ENCODING), {'retries': 0})[0]
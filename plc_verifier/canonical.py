@@ -0,0 +1,472 @@
+import re
+
+from langchain_core.documents import Document
+from lxml import etree
+
+from plc_verifier.ingestion import local_name
+from plc_verifier.tokens import count_tokens
+
+#Boolean parts folded into the expression of the part they feed
+LOGIC_PARTS = {'Contact': 'AND', 'A': 'AND', 'O': 'OR', 'X': 'XOR'}
+
+#Edge contacts, rendered with the operand they watch
+EDGE_PARTS = {'PContact': 'P', 'NContact': 'N', 'PBox': 'P', 'NBox': 'N'}
+
+#Parts that write their operand, with the prefix of the statement
+COIL_PARTS = {'Coil': 'Coil', 'SCoil': 'S', 'RCoil': 'R', 'Assignment': 'Coil', 'Assign': 'Coil', 'Set': 'S', 'Reset': 'R',
+              'SR': 'SR', 'RS': 'RS', 'SetCoil': 'S', 'ResetCoil': 'R'}
+
+#STL instructions that write their operand
+STL_WRITES = {'=', 'S', 'R', 'T', 'SET', 'CLR'}
+
+
+def children(elem, name):
+    return [child for child in elem if isinstance(child.tag, str) and local_name(child) == name]
+
+
+def descendants(elem, name):
+    return elem.xpath(f".//*[local-name()='{name}']")
+
+
+#Text of a MultilingualText (Title or Comment) of a network, first culture found
+def multilingual_text(elem, composition):
+    for text in elem.xpath(f".//*[local-name()='MultilingualText'][@CompositionName='{composition}']//*[local-name()='Text']"):
+        if text.text and text.text.strip():
+            return ' '.join(text.text.split())
+    return ''
+
+
+#Operand of an Access (or of a Part with an embedded Symbol): variable path or constant value
+def operand_name(elem):
+    symbol = children(elem, 'Symbol') or ([elem] if children(elem, 'Component') else [])
+
+    if symbol:
+        parts = []
+        for component in children(symbol[0], 'Component'):
+            name = component.get('Name', '')
+            indexes = [operand_name(access) for access in children(component, 'Access')]
+            parts.append(f"{name}[{', '.join(indexes)}]" if indexes else name)
+        return '.'.join(parts)
+
+    for tag in ['ConstantValue', 'Constant', 'Label']:
+        values = descendants(elem, tag)
+        if values:
+            value = values[0].get('Name') or ''.join(values[0].itertext()).strip()
+            if value:
+                return value
+
+    return elem.get('Name', '?')
+
+
+#Accesses to constants are neither read nor written tags
+def is_constant(access):
+    return access.get('Scope', '') in ('LiteralConstant', 'TypedConstant', 'GlobalConstant', 'LocalConstant')
+
+
+#Network of a Ladder/FBD FlgNet as a graph of parts, accesses and wires
+class FlgNetGraph:
+
+    def __init__(self, flgnet):
+        self.accesses = {}
+        self.parts = {}
+        self.sources = {}
+        self.access_targets = {}
+        self.constants = set()
+
+        for parts in children(flgnet, 'Parts'):
+            for elem in parts:
+                if not isinstance(elem.tag, str):
+                    continue
+                tag = local_name(elem)
+                uid = elem.get('UId')
+
+                if tag == 'Access':
+                    self.accesses[uid] = operand_name(elem)
+                    if is_constant(elem):
+                        self.constants.add(uid)
+                elif tag in ('Part', 'Call'):
+                    name = elem.get('Name') or self._call_name(elem)
+                    instance = descendants(elem, 'Instance')
+                    self.parts[uid] = {
+                        'name': name,
+                        'negated': {negated.get('Name') for negated in children(elem, 'Negated')},
+                        'operand': operand_name(elem) if children(elem, 'Symbol') else None,
+                        'instance': operand_name(instance[0]) if instance else '',
+                    }
+
+        #The first connection of a wire is its source, the others are its targets
+        for wires in children(flgnet, 'Wires'):
+            for wire in children(wires, 'Wire'):
+                connections = [con for con in wire if isinstance(con.tag, str)]
+                if len(connections) < 2:
+                    continue
+
+                source = self._endpoint(connections[0])
+
+                for target in connections[1:]:
+                    endpoint = self._endpoint(target)
+                    if endpoint[0] == 'pin':
+                        self.sources.setdefault((endpoint[1], endpoint[2]), []).append(source)
+                    elif endpoint[0] == 'access':
+                        self.access_targets.setdefault(source, []).append(endpoint[1])
+
+    @staticmethod
+    def _call_name(elem):
+        info = descendants(elem, 'CallInfo')
+        return info[0].get('Name', 'Call') if info else 'Call'
+
+    @staticmethod
+    def _endpoint(con):
+        tag = local_name(con)
+
+        if tag == 'Powerrail':
+            return ('powerrail',)
+        if tag == 'IdentCon':
+            return ('access', con.get('UId'))
+        if tag == 'NameCon':
+            return ('pin', con.get('UId'), con.get('Name'))
+        return ('open',)
+
+    #Pins of a part that receive a signal, in document order of the wires
+    def input_pins(self, uid):
+        return [pin for (part, pin) in self.sources if part == uid]
+
+
+#Translation of a FlgNet into terse statements, e.g. Coil(Safety_OK) <- OR(Safety_Inp, Simulation)
+#Returns (statements, uid lists aligned with the statements, tags read, tags written)
+def canonical_flgnet(flgnet):
+    graph = FlgNetGraph(flgnet)
+    reads = set()
+    writes = set()
+    box_names = {}
+    statements = []
+
+    def box_label(uid):
+        part = graph.parts[uid]
+        if uid not in box_names:
+            box_names[uid] = part['instance'] or f"{part['name']}_{len(box_names) + 1}"
+        return box_names[uid]
+
+    def operand(uid, pin, used):
+        sources = graph.sources.get((uid, pin), [])
+        names = [source_expr(source, used) for source in sources]
+        return names[0] if len(names) == 1 else f"OR({', '.join(names)})" if names else '?'
+
+    def source_expr(source, used):
+        if source[0] == 'powerrail':
+            return 'TRUE'
+        if source[0] == 'access' and source[1] in graph.parts:
+            #Parts with an embedded Symbol are wired by IdentCon like accesses
+            return part_expr(source[1], 'out', used)
+        if source[0] == 'access':
+            used.append(source[1])
+            if source[1] not in graph.constants:
+                reads.add(graph.accesses.get(source[1], '?'))
+            return graph.accesses.get(source[1], '?')
+        if source[0] == 'pin':
+            return part_expr(source[1], source[2], used)
+        return '?'
+
+    #Value of an output pin of a part
+    def part_expr(uid, pin, used):
+        part = graph.parts.get(uid)
+        if part is None:
+            return '?'
+
+        used.append(uid)
+        name = part['name']
+
+        if name in LOGIC_PARTS or name in EDGE_PARTS:
+            terms = []
+
+            for input_pin in graph.input_pins(uid):
+                if input_pin == 'operand' or input_pin.startswith('bit'):
+                    continue
+                term = operand(uid, input_pin, used)
+                if input_pin in part['negated']:
+                    term = f'NOT({term})'
+                if term != 'TRUE':
+                    terms.append(term)
+
+            if name in EDGE_PARTS or name == 'Contact':
+                value = part['operand'] or operand(uid, 'operand', used)
+                if part['operand']:
+                    reads.add(part['operand'])
+                if name in EDGE_PARTS:
+                    value = f'{EDGE_PARTS[name]}({value})'
+                if 'operand' in part['negated']:
+                    value = f'NOT({value})'
+                terms.append(value)
+
+            op = 'AND' if name in EDGE_PARTS else LOGIC_PARTS[name]
+            flat = []
+            for term in terms:
+                if is_call(term, op):
+                    flat.extend(split_args(term[len(op) + 1:-1]))
+                else:
+                    flat.append(term)
+
+            if not flat:
+                return 'TRUE'
+            return flat[0] if len(flat) == 1 else f"{op}({', '.join(flat)})"
+
+        if name in ('SR', 'RS'):
+            return coil_target(uid, used)
+        if name in COIL_PARTS:
+            return operand(uid, 'in', used)
+
+        return f'{box_label(uid)}.{pin}'
+
+    #Variable written by a coil-like part
+    def coil_target(uid, used):
+        accesses = [source[1] for source in graph.sources.get((uid, 'operand'), []) if source[0] == 'access']
+        used += accesses
+        return graph.parts[uid]['operand'] or ', '.join(graph.accesses.get(access, '?') for access in accesses) or '?'
+
+    #Statements: one per coil, one per box with side effects
+    for uid, part in graph.parts.items():
+        name = part['name']
+
+        if name in LOGIC_PARTS or name in EDGE_PARTS:
+            continue
+
+        used = [uid]
+
+        if name in COIL_PARTS:
+            target = coil_target(uid, used)
+            writes.add(target)
+
+            if name in ('SR', 'RS'):
+                pins = [pin for pin in graph.input_pins(uid) if pin != 'operand']
+                args = ', '.join(f'{pin.upper()}: {operand(uid, pin, used)}' for pin in pins) or '?'
+                statements.append((f'{COIL_PARTS[name]}({target}) <- {args}', used))
+            else:
+                statements.append((f'{COIL_PARTS[name]}({target}) <- {operand(uid, "in", used)}', used))
+            continue
+
+        args = []
+        for pin in graph.input_pins(uid):
+            value = operand(uid, pin, used)
+            if not (pin == 'en' and value == 'TRUE'):
+                args.append(f'{pin}={value}')
+        outputs = []
+
+        for (source, targets) in graph.access_targets.items():
+            if source[0] == 'pin' and source[1] == uid:
+                names = []
+                for access in targets:
+                    used.append(access)
+                    writes.add(graph.accesses.get(access, '?'))
+                    names.append(graph.accesses.get(access, '?'))
+                outputs.append(f"{source[2]}: {', '.join(names)}")
+
+        head = f"{box_label(uid)}: {name}({', '.join(args)})"
+        statements.append((f"{head} -> {'; '.join(outputs)}" if outputs else head, used))
+
+    #Values that feed an access directly, e.g. an FBD assignment without a coil part
+    for source, targets in graph.access_targets.items():
+        if source[0] == 'pin' and source[1] in graph.parts and graph.parts[source[1]]['name'] in LOGIC_PARTS:
+            used = []
+            value = part_expr(source[1], source[2], used)
+            for access in targets:
+                used.append(access)
+                writes.add(graph.accesses.get(access, '?'))
+                statements.append((f"{graph.accesses.get(access, '?')} <- {value}", used))
+
+    uid_lists = [sorted(set(used), key = lambda value: int(value) if value.isdigit() else 0) for _, used in statements]
+
+    return [text for text, _ in statements], uid_lists, reads - {'?', 'TRUE'}, writes - {'?'}
+
+
+#True when the whole term is a call of op, e.g. AND(A, OR(B, C)) for AND
+def is_call(term, op):
+    if not (term.startswith(f'{op}(') and term.endswith(')')):
+        return False
+
+    depth = 0
+    for position, char in enumerate(term[len(op):]):
+        depth += char == '('
+        depth -= char == ')'
+        if depth == 0:
+            return position == len(term) - len(op) - 1
+
+    return False
+
+
+#Splits the top-level arguments of an expression
+def split_args(text):
+    args = []
+    depth = 0
+    current = ''
+
+    for char in text:
+        if char == ',' and depth == 0:
+            args.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+
+    if current.strip():
+        args.append(current.strip())
+
+    return args
+
+
+#Translation of an STL StatementList: one instruction per line
+def canonical_stl(statement_list):
+    statements, uid_lists, reads, writes = [], [], set(), set()
+
+    for statement in children(statement_list, 'StlStatement'):
+        words, used = [], [statement.get('UId', '')]
+        instruction = ''
+
+        for elem in statement:
+            if not isinstance(elem.tag, str):
+                continue
+            tag = local_name(elem)
+
+            if tag == 'StlToken':
+                instruction = elem.get('Text', '')
+                words.append(instruction)
+            elif tag == 'Access':
+                name = operand_name(elem)
+                used.append(elem.get('UId', ''))
+                words.append(name)
+                if not is_constant(elem):
+                    (writes if instruction.upper() in STL_WRITES else reads).add(name)
+            elif tag == 'LineComment':
+                words.append('//' + ' '.join(''.join(elem.itertext()).split()))
+
+        if words:
+            statements.append(' '.join(words))
+            uid_lists.append([uid for uid in used if uid])
+
+    return statements, uid_lists, reads, writes
+
+
+#Translation of an SCL StructuredText back into source lines
+def canonical_scl(structured_text):
+    lines, uid_lists, reads, writes = [''], [[]], set(), set()
+    pending = None
+
+    for elem in structured_text:
+        if not isinstance(elem.tag, str):
+            continue
+        tag = local_name(elem)
+
+        if tag == 'NewLine':
+            lines.append('')
+            uid_lists.append([])
+            continue
+        if tag == 'Blank':
+            lines[-1] += ' '
+            continue
+
+        if tag == 'Access':
+            if pending is not None:
+                reads.add(pending)
+            name = operand_name(elem)
+            pending = None if is_constant(elem) else name
+            lines[-1] += name
+            uid_lists[-1].append(elem.get('UId', ''))
+            continue
+
+        text = elem.get('Text') if tag == 'Token' else ''.join(elem.itertext())
+        if tag == 'LineComment':
+            text = '//' + text
+        if pending is not None:
+            (writes if text == ':=' else reads).add(pending)
+            pending = None
+        lines[-1] += text or ''
+
+    if pending is not None:
+        reads.add(pending)
+
+    statements = [(' '.join(line.split()), uids) for line, uids in zip(lines, uid_lists) if line.strip()]
+
+    return [text for text, _ in statements], [uids for _, uids in statements], reads, writes
+
+
+#Translation of an Interface into one line per section
+def canonical_interface(interface):
+    statements = []
+
+    for section in descendants(interface, 'Section'):
+        members = [f"{member.get('Name')}:{member.get('Datatype', '')}" for member in children(section, 'Member')]
+        if members:
+            statements.append(f"{section.get('Name')}: {', '.join(members)}")
+
+    return statements
+
+
+#Compact canonical form of one document produced by ingestion
+#Returns (text, metadata additions); metadata keeps the UIds of each statement so it maps back to the source
+def canonicalize(doc):
+    metadata = doc.metadata
+    root = etree.fromstring(doc.page_content.encode('utf-8'), parser = etree.XMLParser(huge_tree = True, remove_comments = True))
+
+    header = ' '.join(str(value) for value in [metadata.get('block') or metadata.get('source', ''),
+                                               f"NW{metadata['network']}" if 'network' in metadata else ''] if value)
+    statements, uid_lists, reads, writes = [], [], set(), set()
+
+    if metadata.get('section') == 'interface':
+        header += ' Interface'
+        statements = canonical_interface(root)
+        uid_lists = [[] for _ in statements]
+    else:
+        title = metadata.get('title') or multilingual_text(root, 'Title')
+        comment = multilingual_text(root, 'Comment')
+        header += f' "{title}"' if title else ''
+        header += f' // {comment}' if comment else ''
+
+        sources = [root] if local_name(root) in ('FlgNet', 'StatementList', 'StructuredText') else []
+        sources += descendants(root, 'FlgNet') + descendants(root, 'StatementList') + descendants(root, 'StructuredText')
+
+        for source in sources:
+            translate = {'FlgNet': canonical_flgnet, 'StatementList': canonical_stl, 'StructuredText': canonical_scl}[local_name(source)]
+            source_statements, source_uids, source_reads, source_writes = translate(source)
+            statements += source_statements
+            uid_lists += source_uids
+            reads |= source_reads
+            writes |= source_writes
+
+    if not statements:
+        #Unknown content (tag tables, data types): kept as xml under a comment header line, so the splitter still cuts
+        #it between elements, with whitespace between elements and default namespaces removed
+        text = re.sub(r'\s+xmlns="[^"]*"', '', etree.tostring(root, encoding = 'unicode'))
+        return f"<!-- {header.replace('--', '- -')} -->\n" + re.sub(r'>\s+<', '><', text).strip(), {}
+
+    uid_map = {}
+    for statement, uids in zip(statements, uid_lists):
+        uid_map.setdefault(statement, [])
+        uid_map[statement] += [uid for uid in uids if uid not in uid_map[statement]]
+
+    return header + '\n' + '\n'.join(statements), {'uid_map': uid_map, 'reads': sorted(reads), 'writes': sorted(writes)}
+
+
+#Canonical documents for the splitter, with raw and compact token counts in the metadata
+def canonicalize_documents(documents):
+    canonical = []
+
+    for doc in documents:
+        try:
+            text, extra = canonicalize(doc)
+        except etree.XMLSyntaxError:
+            text, extra = doc.page_content, {}
+
+        metadata = {**doc.metadata, **extra, 'raw_tokens': count_tokens(doc.page_content), 'tokens': count_tokens(text)}
+        canonical.append(Document(metadata = metadata, page_content = text))
+
+    return canonical
+
+
+#UIds of the source elements behind the statements of a canonical chunk
+def source_uids(doc, statement = None):
+    uid_map = doc.metadata.get('uid_map', {})
+
+    if statement is not None:
+        return uid_map.get(statement.strip(), [])
+
+    return {line: uid_map[line] for line in doc.page_content.splitlines() if line in uid_map}
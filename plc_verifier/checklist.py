@@ -0,0 +1,222 @@
+import asyncio
+import csv
+import io
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import yaml
+
+from plc_verifier.context import pack_context
+from plc_verifier.retries import DEFAULT_RETRIES, RETRYABLE_ERRORS
+from plc_verifier.tokens import count_tokens, usage_tokens
+
+#Default concurrency and rate limits of a checklist run
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TOKENS_PER_MINUTE = 30000
+DEFAULT_OUTPUT_TOKENS = 1000
+
+#Instruction appended to each requirement so the verdict can be read back from the answer
+VERDICT_INSTRUCTION = ("Check this requirement against the code snippets. Start the answer with one line "
+                       "'Verdict: Met', 'Verdict: Not met' or 'Verdict: Unclear', then justify it.")
+
+VERDICT = re.compile(r'verdict\W*(not met|partially met|met|unclear)', re.IGNORECASE)
+
+
+#Requirements of a checklist file as [{'id', 'text'}]
+#CSV: columns id and requirement (or text), otherwise the first two columns
+#YAML: list of {id, requirement/text}, {id: text} mapping, or either under a 'requirements' key
+#Text: one requirement per line
+def load_checklist(name, data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8-sig')
+
+    if name.lower().endswith('.txt'):
+        rows = [{'text': line} for line in data.splitlines()]
+    elif name.lower().endswith(('.yaml', '.yml')):
+        content = yaml.safe_load(data) or []
+        if isinstance(content, dict) and 'requirements' in content:
+            content = content['requirements']
+        if isinstance(content, dict):
+            content = [{'id': id_, 'text': text} for id_, text in content.items()]
+        rows = [item if isinstance(item, dict) else {'text': item} for item in content]
+    else:
+        rows = list(csv.reader(io.StringIO(data)))
+        header = [column.strip().lower() for column in rows[0]] if rows else []
+
+        if 'id' in header and ('requirement' in header or 'text' in header):
+            text_column = 'requirement' if 'requirement' in header else 'text'
+            rows = [dict(zip(header, row)) for row in rows[1:]]
+            rows = [{'id': row.get('id'), 'text': row.get(text_column)} for row in rows]
+        else:
+            rows = [{'id': row[0], 'text': row[1]} if len(row) > 1 else {'text': row[0]} for row in rows if row]
+
+    requirements = []
+
+    for position, row in enumerate(rows, start = 1):
+        text = str(row.get('text') or row.get('requirement') or '').strip()
+        if text:
+            requirements.append({'id': str(row.get('id') or f'R{position}').strip(), 'text': text})
+
+    return requirements
+
+
+#Verdict stated in an answer: Met, Not met, Partially met or Unclear
+def parse_verdict(answer):
+    match = VERDICT.search(answer)
+    return match.group(1).capitalize() if match else 'Unclear'
+
+
+#Sliding one-minute window of the tokens sent, so the requests of a run stay below the tokens-per-minute limit
+class TokenRateLimiter:
+
+    def __init__(self, tokens_per_minute = DEFAULT_TOKENS_PER_MINUTE):
+        self.tokens_per_minute = tokens_per_minute
+        self._window = deque()
+        self._used = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._window and now - self._window[0][0] >= 60:
+                    self._used -= self._window.popleft()[1]
+
+                if self._used + tokens <= self.tokens_per_minute:
+                    self._window.append((now, tokens))
+                    self._used += tokens
+                    return
+
+                await asyncio.sleep(60 - (now - self._window[0][0]))
+
+
+#Query sent for a requirement, also the key of its stored answer
+def requirement_query(requirement):
+    return f"Requirement {requirement['id']}: {requirement['text']}\n\n{VERDICT_INSTRUCTION}"
+
+
+#Event loop of the checklist runs, running in a background thread for the life of the process
+#The async HTTP clients of the chat models stay bound to the loop that opened their connections, so a new loop per run
+#(asyncio.run) fails every request of the second run with 'Event loop is closed'
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    global _event_loop
+
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target = _event_loop.run_forever, daemon = True).start()
+
+        return _event_loop
+
+
+#Seconds to wait before a retry: the Retry-After header when the server sends one, otherwise exponential backoff with jitter
+def retry_delay(error, attempt, base_delay = 1.0):
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return base_delay * 2 ** attempt * (1 + random.random())
+
+
+#Verification of the requirements of a checklist against the indexed program
+#Requests run concurrently up to max_concurrency in flight, below tokens_per_minute, and are retried with backoff
+#chain takes {'query', 'snippets'} and returns the answer message (or text); each requirement is checked without chat memory
+class ChecklistRunner:
+
+    def __init__(self, chain, retriever, snippet_budget, instruction_tokens = 0, max_concurrency = DEFAULT_MAX_CONCURRENCY,
+                 tokens_per_minute = DEFAULT_TOKENS_PER_MINUTE, retries = DEFAULT_RETRIES, output_tokens = DEFAULT_OUTPUT_TOKENS):
+        self.chain = chain
+        self.retriever = retriever
+        self.snippet_budget = snippet_budget
+        self.instruction_tokens = instruction_tokens
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.retries = retries
+        self.output_tokens = output_tokens
+
+    #Returns one result per requirement, in checklist order; on_result is called as each one completes, on the calling thread
+    #(Streamlit widgets can only be updated from the script thread)
+    def run(self, requirements, on_result = None):
+        completed = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self.arun(requirements, completed.put), get_event_loop())
+
+        while not (future.done() and completed.empty()):
+            try:
+                result = completed.get(timeout = 0.1)
+            except queue.Empty:
+                continue
+            if on_result is not None:
+                on_result(result)
+
+        return future.result()
+
+    async def arun(self, requirements, on_result = None):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = TokenRateLimiter(self.tokens_per_minute)
+
+        async def verify(requirement):
+            async with semaphore:
+                result = await self.verify(requirement, limiter)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(verify(requirement) for requirement in requirements))
+
+    async def verify(self, requirement, limiter):
+        start = time.perf_counter()
+        query = requirement_query(requirement)
+
+        result = {'id': requirement['id'], 'requirement': requirement['text'], 'verdict': 'Error', 'answer': '',
+                  'tokens': 0, 'usage': usage_tokens(None), 'attempts': 0, 'seconds': 0.0, 'error': None, 'retrieval': None,
+                  'networks': []}
+
+        #Retrieval embeds the query through a blocking client, so it runs in a worker thread
+        #A failed query embedding (after the retries of the embedding client) only fails this requirement
+        try:
+            docs, retrieval = await asyncio.to_thread(self.retriever.search, query)
+        except Exception as error:
+            result.update({'error': f'{type(error).__name__}: {error}', 'seconds': time.perf_counter() - start})
+            return result
+
+        context, context_report = pack_context(docs, self.snippet_budget)
+        tokens = self.instruction_tokens + context_report['tokens'] + count_tokens(query)
+        result.update({'tokens': tokens, 'retrieval': retrieval, 'networks': context_report['networks']})
+
+        for attempt in range(self.retries + 1):
+            result['attempts'] = attempt + 1
+            await limiter.acquire(tokens + self.output_tokens)
+
+            try:
+                answer = await self.chain.ainvoke({'query': query, 'snippets': context})
+            except RETRYABLE_ERRORS as error:
+                result['error'] = f'{type(error).__name__}: {error}'
+                if attempt < self.retries:
+                    await asyncio.sleep(retry_delay(error, attempt))
+                continue
+            except Exception as error:
+                result['error'] = f'{type(error).__name__}: {error}'
+                break
+
+            if hasattr(answer, 'content'):
+                result['usage'] = usage_tokens(answer.usage_metadata)
+                answer = answer.content
+
+            result.update({'verdict': parse_verdict(answer), 'answer': answer, 'error': None})
+            break
+
+        result['seconds'] = time.perf_counter() - start
+
+        return result
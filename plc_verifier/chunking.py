@@ -0,0 +1,125 @@
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from lxml import etree
+
+from plc_verifier.ingestion import local_name
+
+#Namespace declarations repeated on every element serialized outside of its parent
+NAMESPACE_DECLARATION = re.compile(r'\s+xmlns(:\w+)?="[^"]*"')
+
+
+#Room kept in each chunk for the label naming the elements it holds
+LABEL_SIZE = 40
+
+
+#Splits a parsed element into serialized units no larger than limit, descending only into oversized elements
+#Each unit comes with the name of the element containing it (Parts, Wires, StatementList, ...)
+def element_units(elem, limit, parent = ''):
+    text = NAMESPACE_DECLARATION.sub('', etree.tostring(elem, encoding = 'unicode', with_tail = False))
+
+    if len(text) <= limit or len(elem) == 0:
+        return [(parent, text)]
+
+    units = []
+    for child in elem:
+        units.extend(element_units(child, limit, local_name(elem)))
+
+    return units
+
+
+#Splitter that understands Siemens Openness documents (block interfaces and networks)
+#Each network or interface is kept whole when it fits in chunk_size characters; larger ones are
+#sub-split along element boundaries (Parts, Wires, statements), never inside an element
+class PLCStructureSplitter:
+
+    def __init__(self, chunk_size = 4000):
+        self.chunk_size = chunk_size
+        self._fallback = RecursiveCharacterTextSplitter(chunk_size = chunk_size, chunk_overlap = 0, separators = ['\n\n', '\n', ' '])
+
+    #Settings that change the produced chunks, used in the index fingerprint
+    def settings(self):
+        return {'type': 'plc-structure', 'chunk_size': self.chunk_size}
+
+    def split_documents(self, documents):
+        splits = []
+
+        for doc in documents:
+            parts = self.split_text(doc)
+
+            for idx, text in enumerate(parts, start = 1):
+                splits.append(Document(metadata = {**doc.metadata, 'chunk': idx, 'chunks': len(parts)}, page_content = text))
+
+        return splits
+
+    def split_text(self, doc):
+        text = doc.page_content
+
+        if len(text) <= self.chunk_size:
+            return [text]
+
+        try:
+            root = etree.fromstring(text.encode('utf-8'), parser = etree.XMLParser(huge_tree = True))
+        except etree.XMLSyntaxError:
+            return self.split_lines(text)
+
+        header = self._header(doc.metadata)
+        limit = self.chunk_size - len(header) - LABEL_SIZE
+        units = []
+
+        for parent, unit in element_units(root, limit):
+            if len(unit) > limit:
+                units.extend((parent, piece) for piece in self._fallback.split_text(unit))
+            else:
+                units.append((parent, unit))
+
+        #Greedy packing of consecutive units, each chunk labelled with its block, network and parent elements
+        chunks = []
+        current = []
+        size = 0
+
+        for parent, unit in units:
+            if current and size + len(unit) + 1 > limit:
+                chunks.append(current)
+                current = []
+                size = 0
+            current.append((parent, unit))
+            size += len(unit) + 1
+
+        if current:
+            chunks.append(current)
+
+        return [self._header(doc.metadata, dict.fromkeys(parent for parent, _ in chunk if parent)) + '\n'.join(unit for _, unit in chunk)
+                for chunk in chunks]
+
+    #Splitting of canonical (non-xml) text on statement lines, repeating its first line as header
+    def split_lines(self, text):
+        header, _, body = text.partition('\n')
+        limit = self.chunk_size - len(header) - 1
+        chunks = []
+        current = []
+        size = 0
+
+        for line in body.splitlines():
+            for piece in (self._fallback.split_text(line) if len(line) > limit else [line]):
+                if current and size + len(piece) + 1 > limit:
+                    chunks.append(current)
+                    current = []
+                    size = 0
+                current.append(piece)
+                size += len(piece) + 1
+
+        if current:
+            chunks.append(current)
+
+        return [header + '\n' + '\n'.join(chunk) for chunk in chunks] or [text]
+
+    @staticmethod
+    def _header(metadata, parents = ()):
+        label = [metadata.get('block') or metadata.get('source', '')]
+        if 'network' in metadata:
+            label.append(f"network {metadata['network']}")
+        label.extend(parents)
+
+        return f"<!-- {' '.join(label)} -->\n"
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from plc_verifier.answer_cache import AnswerCache, answer_scope
+from plc_verifier.batch_embeddings import DEFAULT_BATCH_TOKENS, DEFAULT_PARALLELISM
+from plc_verifier.checklist import DEFAULT_MAX_CONCURRENCY, DEFAULT_TOKENS_PER_MINUTE, load_checklist
+from plc_verifier.clients import ClientRegistry
+from plc_verifier.context import DEFAULT_SNIPPET_BUDGET
+from plc_verifier.embedding_cache import CachedEmbeddings, EmbeddingCache
+from plc_verifier.impact import DEFAULT_IMPACT_DEPTH, store_answers, verify_changes
+from plc_verifier.indexing import DEFAULT_INDEX_DIR, IndexRegistry
+from plc_verifier.instrumentation import Trace
+from plc_verifier.local_embeddings import HashingEmbeddings
+from plc_verifier.mmr import DEFAULT_MIN_K, DEFAULT_MMR_THRESHOLD
+from plc_verifier.pipeline import EMBEDDING_BACKENDS, VerifierPipeline, find_exports, read_exports
+from plc_verifier.prompts import LANGUAGES, static_prefix_tokens
+from plc_verifier.retries import DEFAULT_RETRIES
+from plc_verifier.vector_index import COMPRESSIONS, DEFAULT_EF_SEARCH, DEFAULT_NPROBE, INDEX_KINDS
+
+#Verdicts a run can end with
+VERDICTS = ['Met', 'Not met', 'Partially met', 'Unclear', 'Error']
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m plc_verifier.cli',
+                                     description = 'Verify PLC export files (.xml) against a list of questions or requirements, without the web interface.')
+    parser.add_argument('paths', nargs = '+', help = 'export directories, files or glob patterns')
+    parser.add_argument('--language', required = True, choices = LANGUAGES)
+    parser.add_argument('--subject', required = True, help = 'program subject, e.g. "valve control"')
+    parser.add_argument('--questions', action = 'append', default = [], help = 'question list (.txt one per line, .csv or .yaml checklist)')
+    parser.add_argument('--question', action = 'append', default = [], help = 'single question, may be repeated')
+    parser.add_argument('--baseline', nargs = '+', help = 'exports of the previous version: only the questions impacted by the changes are verified again')
+    parser.add_argument('--impact-depth', type = int, default = DEFAULT_IMPACT_DEPTH, help = 'hops from a changed network to the readers of its tags')
+    parser.add_argument('--output', default = '-', help = 'JSON report file (default: standard output)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count() or 1, help = 'processes parsing the files (threads reading them)')
+    parser.add_argument('--concurrency', type = int, default = DEFAULT_MAX_CONCURRENCY, help = 'LLM requests in flight')
+    parser.add_argument('--tokens-per-minute', type = int, default = DEFAULT_TOKENS_PER_MINUTE)
+    parser.add_argument('--retries', type = int, default = DEFAULT_RETRIES)
+    parser.add_argument('--snippet-budget', type = int, default = DEFAULT_SNIPPET_BUDGET)
+    parser.add_argument('--chat-model', default = 'gpt-4o')
+    parser.add_argument('--embedding-backend', default = 'openai', choices = EMBEDDING_BACKENDS, help = 'local computes the vectors offline on the CPU')
+    parser.add_argument('--embedding-model', default = 'text-embedding-3-small', help = 'model of the openai backend')
+    parser.add_argument('--vector-index', default = 'auto', choices = INDEX_KINDS, help = 'FAISS index type (auto: by number of chunks)')
+    parser.add_argument('--compression', default = 'none', choices = COMPRESSIONS, help = 'compression of the indexed vectors')
+    parser.add_argument('--nprobe', type = int, default = DEFAULT_NPROBE, help = 'IVF lists probed per query')
+    parser.add_argument('--ef-search', type = int, default = DEFAULT_EF_SEARCH, help = 'HNSW search beam')
+    parser.add_argument('--min-k', type = int, default = DEFAULT_MIN_K, help = 'snippets always retrieved per question')
+    parser.add_argument('--mmr-threshold', type = float, default = DEFAULT_MMR_THRESHOLD, help = 'fraction of the best relevance a snippet needs to be added beyond --min-k')
+    parser.add_argument('--fixed-k', action = 'store_true', help = 'always retrieve 50 snippets')
+    parser.add_argument('--embedding-batch-tokens', type = int, default = DEFAULT_BATCH_TOKENS, help = 'tokens per embedding request')
+    parser.add_argument('--embedding-parallelism', type = int, default = DEFAULT_PARALLELISM, help = 'embedding requests in flight')
+    parser.add_argument('--base-url', default = os.environ.get('OPENAI_BASE_URL'), help = 'OpenAI-compatible endpoint, e.g. the fake server')
+    parser.add_argument('--api-key', default = os.environ.get('OPENAI_API_KEY'))
+    parser.add_argument('--index-dir', default = DEFAULT_INDEX_DIR)
+    parser.add_argument('--fail-on', nargs = '*', default = ['Error'], choices = VERDICTS,
+                        help = 'verdicts that make the exit status 1 (default: Error)')
+
+    args = parser.parse_args(argv)
+
+    if not args.questions and not args.question:
+        parser.error('give at least one --questions file or --question')
+    if not args.api_key and not args.base_url:
+        parser.error('set OPENAI_API_KEY (or --api-key), or give --base-url of a local endpoint')
+
+    return args
+
+
+#Questions of the question files and of the command line, in that order
+def load_questions(args):
+    questions = []
+
+    for path in args.questions:
+        with open(path, 'rb') as f:
+            questions.extend(load_checklist(path, f.read()))
+
+    for text in args.question:
+        questions.append({'id': f'Q{len(questions) + 1}', 'text': text})
+
+    return questions
+
+
+def build_pipeline(args, clients):
+    api_key = args.api_key or 'offline'
+
+    if args.embedding_backend == 'local':
+        embeddings = HashingEmbeddings()
+        embedding_model = embeddings.model
+    else:
+        #Chunks are embedded in token-sized batches sent in parallel; each batch is cached as it completes
+        batched = clients.embeddings(args.embedding_model, api_key, base_url = args.base_url, batch_tokens = args.embedding_batch_tokens,
+                                     parallelism = args.embedding_parallelism)
+        embeddings = CachedEmbeddings(batched, args.embedding_model, EmbeddingCache())
+        embedding_model = args.embedding_model
+
+    #Retries are handled by the checklist runner, with backoff shared across the requests in flight
+    model = clients.chat(args.chat_model, api_key, base_url = args.base_url, temperature = 0, max_retries = 0)
+
+    return VerifierPipeline(embeddings, model, embedding_model, registry = IndexRegistry(args.index_dir),
+                            snippet_budget = args.snippet_budget, workers = args.workers, embedding_backend = args.embedding_backend,
+                            vector_index = {'kind': args.vector_index, 'compression': args.compression, 'nprobe': args.nprobe,
+                                            'ef_search': args.ef_search},
+                            min_k = args.min_k, mmr_threshold = None if args.fixed_k else args.mmr_threshold)
+
+
+#Index of the exports; a set without any PLC code ends the run with the reason
+def index_exports(pipeline, files, **options):
+    try:
+        return pipeline.index(files, **options)
+    except ValueError as error:
+        raise SystemExit(str(error))
+
+
+def run(args):
+    start = time.perf_counter()
+    paths = find_exports(args.paths)
+
+    if not paths:
+        raise SystemExit(f"No .xml files found in {', '.join(args.paths)}")
+
+    questions = load_questions(args)
+    files = read_exports(paths, args.workers)
+    read_time = time.perf_counter()
+
+    clients = ClientRegistry()
+    pipeline = build_pipeline(args, clients)
+    answer_cache = AnswerCache()
+    index_trace = Trace('index', files = len(files))
+    options = {'max_concurrency': args.concurrency, 'tokens_per_minute': args.tokens_per_minute, 'retries': args.retries}
+    show_result = lambda result: print(f"{result['id']}: {result['verdict']}" + (' (reused)' if result.get('reused') else ''), file = sys.stderr)
+
+    if args.baseline:
+        baseline_paths = find_exports(args.baseline)
+        if not baseline_paths:
+            raise SystemExit(f"No .xml files found in {', '.join(args.baseline)}")
+
+        baseline = index_exports(pipeline, read_exports(baseline_paths, args.workers))
+        fingerprint, program_index = index_exports(pipeline, files, base_fingerprint = baseline[0], trace = index_trace)
+        index_time = time.perf_counter()
+
+        impact = verify_changes(pipeline, baseline, (fingerprint, program_index), questions, args.language, args.subject, answer_cache,
+                                depth = args.impact_depth, on_result = show_result, **options)
+        results = impact.pop('results')
+    else:
+        fingerprint, program_index = index_exports(pipeline, files, trace = index_trace)
+        index_time = time.perf_counter()
+
+        runner = pipeline.checklist_runner(program_index, args.language, args.subject, **options)
+        results = runner.run(questions, on_result = show_result)
+        impact = None
+
+        #Stored so a later run with this version as --baseline can reuse the answers
+        store_answers(answer_cache, answer_scope(fingerprint, args.language, args.subject), questions, results)
+
+    end = time.perf_counter()
+
+    summary = {verdict: 0 for verdict in VERDICTS}
+    for result in results:
+        summary[result['verdict']] = summary.get(result['verdict'], 0) + 1
+
+    usage = {key: sum(result['usage'][key] for result in results) for key in ('input', 'output', 'cached')}
+
+    return {
+        'language': args.language,
+        'subject': args.subject,
+        'files': [{'name': f.name, 'bytes': len(f.data)} for f in files],
+        'index': {'fingerprint': fingerprint, 'chunks': sum(len(entry['ids']) for entry in program_index.manifest.values()),
+                  'embedding': program_index.embedding, 'vector_index': program_index.vector_index, 'tokens': program_index.token_totals(), 'update_stats': program_index.update_stats, 'stages': index_trace.stages},
+        'embedding_cache': pipeline.embeddings.stats() if isinstance(pipeline.embeddings, CachedEmbeddings) else None,
+        'connections': clients.stats(),
+        'impact': impact,
+        'summary': summary,
+        'usage': {**usage, 'static_prefix': static_prefix_tokens(args.language)},
+        'results': results,
+        'seconds': {'read': read_time - start, 'index': index_time - read_time, 'verify': end - index_time, 'total': end - start},
+    }
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, indent = 2, ensure_ascii = False)
+
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding = 'utf-8') as f:
+            f.write(text + '\n')
+
+    failed = sum(report['summary'].get(verdict, 0) for verdict in args.fail_on)
+    print(f"{len(report['results'])} questions verified in {report['seconds']['total']:.1f} s: "
+          + ', '.join(f'{count} {verdict}' for verdict, count in report['summary'].items() if count), file = sys.stderr)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import deque
+
+import httpx
+import numpy as np
+import openai
+from langchain_openai import ChatOpenAI
+
+from plc_verifier.batch_embeddings import BatchedOpenAIEmbeddings
+
+#Connections kept open to the API and their idle lifetime; OpenAI closes idle connections after about 90 s
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_KEEPALIVE_CONNECTIONS = 32
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect = 10.0)
+
+#Latencies kept per endpoint for the percentiles
+LATENCY_SAMPLES = 1000
+
+
+#Per-request record of the connection events reported by httpcore
+class RequestTrace:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.connected = False
+
+    def __call__(self, event, info):
+        if event == 'connection.connect_tcp.complete':
+            self.connected = True
+
+
+#Requests, new connections and time to response headers of the requests sent through the shared HTTP client
+class ClientMetrics:
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, request):
+        request.extensions['trace'] = RequestTrace()
+
+    def on_response(self, response):
+        trace = response.request.extensions.get('trace')
+        if not isinstance(trace, RequestTrace):
+            return
+
+        endpoint = response.request.url.path.rsplit('/v1/', 1)[-1]
+
+        with self._lock:
+            self.requests += 1
+            self.connections += trace.connected
+            self.latencies.setdefault(endpoint, deque(maxlen = LATENCY_SAMPLES)).append(time.perf_counter() - trace.start)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = {endpoint: np.asarray(values) for endpoint, values in self.latencies.items()}
+            requests, connections = self.requests, self.connections
+
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reused': requests - connections,
+            'reuse_rate': (requests - connections) / requests if requests else 0.0,
+            'latency': {endpoint: {'count': len(values), 'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+                                   'p95': float(np.percentile(values, 95))} for endpoint, values in latencies.items()},
+        }
+
+
+#Long-lived OpenAI clients of the process, shared by all sessions and threads
+#Every client sends its requests through one keep-alive HTTP connection pool, so TLS connections to the API are reused
+#instead of being opened again for every rerun and query; async calls keep the pool of the chat model, as a pool
+#cannot outlive the event loop of a checklist run
+class ClientRegistry:
+
+    def __init__(self, max_connections = DEFAULT_MAX_CONNECTIONS, keepalive_connections = DEFAULT_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry = DEFAULT_KEEPALIVE_EXPIRY, timeout = DEFAULT_TIMEOUT):
+        self.metrics = ClientMetrics()
+        self.http_client = httpx.Client(limits = httpx.Limits(max_connections = max_connections,
+                                                              max_keepalive_connections = keepalive_connections,
+                                                              keepalive_expiry = keepalive_expiry),
+                                        timeout = timeout, follow_redirects = True,
+                                        event_hooks = {'request': [self.metrics.on_request], 'response': [self.metrics.on_response]})
+        self._clients = {}
+        #Reentrant: the embeddings are built with the OpenAI client of their key
+        self._lock = threading.RLock()
+
+    def _get(self, key, build):
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = build()
+            return self._clients[key]
+
+    #OpenAI client of an API key and endpoint; retries are left to the callers
+    def openai(self, api_key, base_url = None):
+        return self._get(('openai', api_key, base_url),
+                         lambda: openai.OpenAI(api_key = api_key, base_url = base_url, max_retries = 0, http_client = self.http_client))
+
+    #Batched embeddings of a model; one instance per key, so the rate-limit state of the key is shared too
+    def embeddings(self, model, api_key, base_url = None, **options):
+        return self._get(('embeddings', model, api_key, base_url, tuple(sorted(options.items()))),
+                         lambda: BatchedOpenAIEmbeddings(model, api_key, base_url = base_url, client = self.openai(api_key, base_url), **options))
+
+    #Chat model of a model name and its options (temperature, stream_usage, max_retries, ...)
+    def chat(self, model, api_key, base_url = None, **options):
+        return self._get(('chat', model, api_key, base_url, tuple(sorted(options.items()))),
+                         lambda: ChatOpenAI(model = model, api_key = api_key, base_url = base_url, http_client = self.http_client, **options))
+
+    def stats(self):
+        return self.metrics.snapshot()
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+        self.http_client.close()
@@ -0,0 +1,79 @@
+from plc_verifier.tokens import count_tokens
+
+#Default number of tokens given to the code snippets of one query
+DEFAULT_SNIPPET_BUDGET = 8000
+
+
+#Identity of the network (or interface/file) a chunk belongs to
+def snippet_group(metadata):
+    return (metadata.get('source', ''), metadata.get('block', ''), metadata.get('section', ''), metadata.get('network', 0))
+
+
+#Identity of a network across versions of an export: file, block, section and number
+#The file is part of it because block names repeat across exports (the Main OB of each CPU of a project)
+def network_key(metadata):
+    if not metadata.get('block'):
+        return metadata.get('source', '')
+    return f"{metadata.get('source', '')}:{metadata['block']}/{metadata.get('section', '')}/{metadata.get('network', 0)}"
+
+
+#Joins two consecutive chunks of the same network, without their repeated header or overlapping text
+def merge_texts(first, second):
+    first_header = first.split('\n', 1)[0]
+    header, _, body = second.partition('\n')
+
+    if header == first_header:
+        second = body
+
+    for size in range(min(len(first), len(second), 2000), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+
+    return first + '\n' + second
+
+
+#Assembly of the retrieved chunks (in relevance order) into the snippets of the prompt
+#Duplicates are dropped, chunks of the same network are merged back into contiguous text and
+#networks are added in relevance order while they fit in budget tokens
+#Returns (snippets text, report of the tokens used and of the networks sent)
+def pack_context(docs, budget = DEFAULT_SNIPPET_BUDGET):
+    groups = {}
+    seen = set()
+
+    for doc in docs:
+        if doc.page_content in seen:
+            continue
+        seen.add(doc.page_content)
+        groups.setdefault(snippet_group(doc.metadata), []).append(doc)
+
+    snippets = []
+    networks = []
+    used = 0
+    dropped = 0
+
+    #Groups keep the relevance order of their best ranked chunk
+    for key, group in groups.items():
+        group.sort(key = lambda doc: doc.metadata.get('chunk', 1))
+        text = group[0].page_content
+
+        for previous, doc in zip(group, group[1:]):
+            if doc.metadata.get('chunk', 1) == previous.metadata.get('chunk', 1) + 1:
+                text = merge_texts(text, doc.page_content)
+            else:
+                text += '\n...\n' + doc.page_content.partition('\n')[2]
+
+        snippet = f'[{key[0]}] {text}'
+        tokens = count_tokens(snippet) + 1
+
+        if used + tokens > budget:
+            dropped += 1
+            continue
+
+        snippets.append(snippet)
+        networks.append(network_key(group[0].metadata))
+        used += tokens
+
+    report = {'tokens': used, 'budget': budget, 'chunks': len(docs), 'duplicates': len(docs) - len(seen),
+              'snippets': len(snippets), 'dropped': dropped, 'networks': networks}
+
+    return '\n\n'.join(snippets), report
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+#Default location and size of the embedding cache
+DEFAULT_CACHE_DIR = os.environ.get('PLC_VERIFIER_CACHE_DIR', '.cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+#Hash used as content address of a chunk text
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+#Disk-backed store of embedding vectors keyed by (model name, hash of text)
+class EmbeddingCache:
+
+    def __init__(self, path = None, max_bytes = DEFAULT_MAX_BYTES):
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok = True)
+            path = os.path.join(DEFAULT_CACHE_DIR, 'embeddings.sqlite')
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL, '
+            'PRIMARY KEY (model, text_hash))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)')
+        self._conn.commit()
+
+    #Returns {text_hash: vector} for the hashes found in the cache
+    def get_many(self, model, hashes):
+        found = {}
+        hashes = list(hashes)
+
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                marks = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})',
+                    [model, *batch],
+                ).fetchall()
+
+                for hash_, blob in rows:
+                    found[hash_] = np.frombuffer(blob, dtype = np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?',
+                    [(now, model, hash_) for hash_ in found],
+                )
+                self._conn.commit()
+
+        return found
+
+    #Stores {text_hash: vector} and evicts the least recently used entries above max_bytes
+    def put_many(self, model, vectors):
+        now = time.time()
+        rows = []
+
+        for hash_, vector in vectors.items():
+            blob = np.asarray(vector, dtype = np.float32).tobytes()
+            rows.append((model, hash_, blob, len(blob), now))
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM embeddings').fetchone()[0]
+
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        cursor = self._conn.execute('SELECT rowid, size FROM embeddings ORDER BY last_access')
+        victims = []
+
+        for rowid, size in cursor:
+            victims.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        self._conn.executemany('DELETE FROM embeddings WHERE rowid = ?', victims)
+
+    #Number of entries and bytes currently held
+    def size(self):
+        with self._lock:
+            count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings').fetchone()
+        return {'entries': count, 'bytes': total}
+
+
+#Embeddings wrapper that only sends chunks missing from the cache to the endpoint
+#One wrapper can be shared by sessions and checklist threads; its counters are updated under a lock
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, embeddings, model_name, cache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, set(hashes))
+
+        #Unique texts not yet embedded, in first-seen order
+        missing = {}
+        for hash_, text in zip(hashes, texts):
+            if hash_ not in vectors and hash_ not in missing:
+                missing[hash_] = text
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing and hasattr(self.embeddings, 'embed_batches'):
+            #Each batch is stored as it completes, so a failed run resumes without re-sending the finished batches
+            missing_hashes = list(missing)
+
+            for batch, batch_vectors in self.embeddings.embed_batches(list(missing.values())):
+                new_vectors = {missing_hashes[position]: vector for position, vector in zip(batch, batch_vectors)}
+                self.cache.put_many(self.model_name, new_vectors)
+                vectors.update(new_vectors)
+        elif missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(self.model_name, new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[hash_] for hash_ in hashes]
+
+    #Query embeddings are cached too, so repeated retrievals skip the embedding endpoint
+    def embed_query(self, text):
+        hash_ = text_hash(text)
+        found = self.cache.get_many(self.model_name, [hash_])
+
+        with self._lock:
+            if hash_ in found:
+                self.query_hits += 1
+            else:
+                self.query_misses += 1
+
+        if hash_ in found:
+            return found[hash_]
+
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model_name, {hash_: vector})
+
+        return vector
+
+    #Hit/miss counters since the wrapper was created, and the throughput of the last batched embedding run
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'query_hits': self.query_hits, 'query_misses': self.query_misses,
+                **self.cache.size(), 'last_run': getattr(self.embeddings, 'last_report', {})}
@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+#Size of the vectors returned by the stand-in embeddings endpoint
+DEFAULT_DIMENSIONS = 256
+
+#Characters of a block of the prompt cache
+PREFIX_BLOCK = 4096
+
+
+#Deterministic unit vector of a text: hashed words, so texts sharing tags get similar vectors
+def fake_embedding(text, dimensions = DEFAULT_DIMENSIONS):
+    vector = np.zeros(dimensions, dtype = np.float32)
+
+    for word in re.findall(r'\w+', text.lower()) or [text]:
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size = 8).digest()
+        value = int.from_bytes(digest, 'little')
+        vector[value % dimensions] += 1.0 if value >> 63 else -1.0
+
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+#Deterministic answer to a prompt: a verdict line and the first tags of the snippets it was given
+def fake_answer(prompt):
+    query = prompt.split('Query:')[-1].split('Memory:')[0].strip().splitlines()
+    tags = list(dict.fromkeys(re.findall(r'\b[A-Za-z]+_[A-Za-z0-9_]+\b', prompt.split('xml files:')[-1])))[:5]
+
+    return (f"Verdict: Met\n\nOffline answer to: {query[0] if query else ''}\n"
+            f"Checked against: {', '.join(tags) if tags else 'no code snippets'}.")
+
+
+#Handler of the OpenAI endpoints used by the verifier: /v1/embeddings and /v1/chat/completions (plain and streamed)
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.server.latency)
+
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            return self.rate_limited(1.0)
+
+        if self.path.rstrip('/').endswith('/embeddings'):
+            return self.embeddings(body)
+        if self.path.rstrip('/').endswith('/chat/completions'):
+            return self.chat_completions(body)
+
+        self.send_json({'error': {'message': f'Unknown endpoint {self.path}', 'type': 'invalid_request_error'}}, status = 404)
+
+    def send_json(self, payload, status = 200, headers = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    #429 with the headers of the OpenAI API: Retry-After and the reset of the token quota
+    def rate_limited(self, reset):
+        self.send_json({'error': {'message': 'Rate limit reached', 'type': 'rate_limit_exceeded', 'code': 'rate_limit_exceeded'}},
+                       status = 429, headers = {'retry-after': f'{reset:.3f}', 'x-ratelimit-reset-tokens': f'{reset * 1000:.0f}ms',
+                                                'x-ratelimit-remaining-tokens': '0'})
+
+    def embeddings(self, body):
+        inputs = body.get('input', [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        #Token arrays are hashed as their ids, text as its words
+        texts = [item if isinstance(item, str) else ' '.join(str(token) for token in item) for item in inputs]
+        data = [{'object': 'embedding', 'index': index, 'embedding': fake_embedding(text, self.server.dimensions)}
+                for index, text in enumerate(texts)]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        quota = self.server.take_tokens(tokens)
+
+        if quota is None:
+            return self.rate_limited(self.server.reset_seconds())
+
+        self.send_json({'object': 'list', 'data': data, 'model': body.get('model', 'fake-embedding'),
+                        'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}}, headers = quota)
+
+    def chat_completions(self, body):
+        prompt = '\n'.join(str(message.get('content', '')) for message in body.get('messages', []))
+        answer = fake_answer(prompt)
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(answer) // 4 + 1
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens,
+                 'prompt_tokens_details': {'cached_tokens': self.server.cached_prefix(prompt)}}
+        base = {'id': f'chatcmpl-{hashlib.md5(prompt.encode("utf-8")).hexdigest()}', 'created': int(time.time()),
+                'model': body.get('model', 'fake-chat')}
+
+        if not body.get('stream'):
+            return self.send_json({**base, 'object': 'chat.completion', 'usage': usage,
+                                   'choices': [{'index': 0, 'finish_reason': 'stop',
+                                                'message': {'role': 'assistant', 'content': answer}}]})
+
+        #Server-sent events, one chunk per word
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        chunks = [{'role': 'assistant', 'content': ''}] + [{'content': word} for word in re.findall(r'\S+\s*', answer)]
+        for delta in chunks:
+            self.send_event({**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        self.send_event({**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self.send_event({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})
+        self.wfile.write(b'data: [DONE]\n\n')
+
+    def send_event(self, payload):
+        self.wfile.write(f'data: {json.dumps(payload)}\n\n'.encode('utf-8'))
+        self.wfile.flush()
+
+
+#Local stand-in for the OpenAI API, so the verifier can run offline (tests, build agents without API access)
+class FakeOpenAIServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, host = '127.0.0.1', port = 0, latency = 0.0, dimensions = DEFAULT_DIMENSIONS, verbose = False,
+                 tokens_per_minute = None, error_rate = 0.0, window = 60.0):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.dimensions = dimensions
+        self.verbose = verbose
+        self.tokens_per_minute = tokens_per_minute
+        self.error_rate = error_rate
+        self.window = window
+        self.requests = {'embeddings': 0, 'rate_limited': 0}
+        self._window = deque()
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    #Takes tokens of the quota of embeddings (tokens_per_minute over a window of seconds, one minute by default); returns the rate-limit headers, or None when over quota
+    def take_tokens(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] >= self.window:
+                self._window.popleft()
+
+            used = sum(count for _, count in self._window)
+
+            if self.tokens_per_minute is not None and used + tokens > self.tokens_per_minute:
+                self.requests['rate_limited'] += 1
+                return None
+
+            self._window.append((now, tokens))
+            self.requests['embeddings'] += 1
+
+            if self.tokens_per_minute is None:
+                return {}
+
+            return {'x-ratelimit-limit-tokens': str(self.tokens_per_minute),
+                    'x-ratelimit-remaining-tokens': str(self.tokens_per_minute - used - tokens),
+                    'x-ratelimit-reset-tokens': f'{self._reset(now):.3f}s'}
+
+    #Tokens of the prompt served from the prompt cache, as the OpenAI API does: the longest prefix already seen,
+    #in blocks of PREFIX_BLOCK characters (about 1024 tokens)
+    def cached_prefix(self, prompt):
+        cached = 0
+        digest = hashlib.sha256()
+
+        with self._lock:
+            for start in range(0, len(prompt) - PREFIX_BLOCK + 1, PREFIX_BLOCK):
+                digest.update(prompt[start:start + PREFIX_BLOCK].encode('utf-8'))
+                key = digest.hexdigest()
+                if key in self._prefixes:
+                    cached += 1
+                self._prefixes.add(key)
+
+        return cached * PREFIX_BLOCK // 4
+
+    #Seconds until the oldest tokens of the window leave it
+    def reset_seconds(self):
+        with self._lock:
+            return self._reset(time.monotonic())
+
+    def _reset(self, now):
+        return max(self.window - (now - self._window[0][0]), 0.001) if self._window else 0.001
+
+    #Base URL to give to the OpenAI clients
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/v1'
+
+    #Serves from a background thread; returns the server
+    def start(self):
+        threading.Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Local stand-in for the OpenAI API used by the verifier.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds added to every request')
+    parser.add_argument('--dimensions', type = int, default = DEFAULT_DIMENSIONS)
+    parser.add_argument('--tokens-per-minute', type = int, help = 'embedding token quota; requests over it get 429')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = 'share of requests answered with 429')
+    parser.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.dimensions, args.verbose, args.tokens_per_minute, args.error_rate)
+    print(f'Serving a fake OpenAI API at {server.base_url}', flush = True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import hashlib
+import re
+
+from plc_verifier.answer_cache import answer_scope
+from plc_verifier.checklist import requirement_query
+from plc_verifier.context import network_key, pack_context
+from plc_verifier.xref import network_label
+
+#Hops followed from a changed network to the networks reading its tags (1: direct readers only)
+DEFAULT_IMPACT_DEPTH = 1
+
+
+#Networks of an index as {key: {'hash', 'reads', 'writes', 'label', 'block'}}, block being (file, block, section)
+#The hash covers the canonical statements of the network with whitespace collapsed; UIds are not part of the canonical
+#text and the header line (number, title and comment) is left out, so renumbering and comment edits are not changes
+def network_table(docs):
+    statements = {}
+    networks = {}
+
+    for doc in docs:
+        key = network_key(doc.metadata)
+        body = doc.page_content.partition('\n')[2] if doc.metadata.get('block') else doc.page_content
+        statements.setdefault(key, []).append((doc.metadata.get('chunk', 1), re.sub(r'\s+', ' ', body).strip()))
+
+        if key not in networks:
+            networks[key] = {'reads': set(doc.metadata.get('reads', [])), 'writes': set(doc.metadata.get('writes', [])),
+                             'label': network_label(doc.metadata), 'block': (doc.metadata.get('source', ''), doc.metadata.get('block', ''), doc.metadata.get('section', ''))}
+
+    for key, chunks in statements.items():
+        text = '\n'.join(body for _, body in sorted(chunks))
+        networks[key]['hash'] = hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    return networks
+
+
+#Network-level diff of two versions: within each block of each file, networks with the same content are matched first (so inserted
+#networks do not make the following ones changed), then the remaining ones by number
+#Returns {'added', 'removed', 'changed', 'unchanged'} (revised keys, baseline keys, (baseline, revised) pairs, (baseline, revised) pairs)
+def diff_networks(baseline, revised):
+    diff = {'added': [], 'removed': [], 'changed': [], 'unchanged': []}
+    blocks = {}
+
+    for side, table in ((0, baseline), (1, revised)):
+        for key, network in table.items():
+            blocks.setdefault(network['block'], ([], []))[side].append(key)
+
+    for old_keys, new_keys in blocks.values():
+        by_hash = {}
+        for key in old_keys:
+            by_hash.setdefault(baseline[key]['hash'], []).append(key)
+
+        unmatched_new = []
+        for key in new_keys:
+            same = by_hash.get(revised[key]['hash'])
+            if same:
+                old_key = key if key in same else same[0]
+                same.remove(old_key)
+                diff['unchanged'].append((old_key, key))
+            else:
+                unmatched_new.append(key)
+
+        unmatched_old = {key for keys in by_hash.values() for key in keys}
+
+        for key in unmatched_new:
+            if key in unmatched_old:
+                unmatched_old.discard(key)
+                diff['changed'].append((key, key))
+            else:
+                diff['added'].append(key)
+
+        diff['removed'].extend(sorted(unmatched_old))
+
+    return diff
+
+
+#Networks whose verification may change: changed and added networks, and the networks of the revised program reading
+#tags written by changed, added or removed networks (followed depth hops)
+#Returns (baseline keys, revised keys) of the impacted networks
+def impacted_networks(baseline, revised, diff, depth = DEFAULT_IMPACT_DEPTH):
+    impacted_old = {old for old, _ in diff['changed']} | set(diff['removed'])
+    impacted_new = {new for _, new in diff['changed']} | set(diff['added'])
+    revised_to_baseline = {new: old for old, new in diff['changed'] + diff['unchanged']}
+
+    tags = set()
+    for key in impacted_old:
+        tags |= baseline[key]['writes']
+    for key in impacted_new:
+        tags |= revised[key]['writes']
+
+    for _ in range(depth):
+        readers = {key for key, network in revised.items() if network['reads'] & tags and key not in impacted_new}
+        if not readers:
+            break
+
+        impacted_new |= readers
+        impacted_old |= {revised_to_baseline[key] for key in readers if key in revised_to_baseline}
+        tags = {tag for key in readers for tag in revised[key]['writes']}
+
+    return impacted_old, impacted_new
+
+
+#Re-verification of a checklist after a change of the program: only the requirements whose stored answer (for the
+#baseline) or whose snippets (in the revised program) involve impacted networks are sent to the model; the stored
+#answers of the others are reused
+#baseline and revised are the (fingerprint, ProgramIndex) of pipeline.index; answers are read from answer_cache for the
+#baseline and stored for the revised version, which becomes the next baseline
+def verify_changes(pipeline, baseline, revised, requirements, language, subject, answer_cache, model = None,
+                   depth = DEFAULT_IMPACT_DEPTH, on_result = None, **options):
+    (baseline_fingerprint, baseline_index), (revised_fingerprint, revised_index) = baseline, revised
+
+    baseline = network_table(doc for _, doc in baseline_index.documents())
+    revised = network_table(doc for _, doc in revised_index.documents())
+    diff = diff_networks(baseline, revised)
+    impacted_old, impacted_new = impacted_networks(baseline, revised, diff, depth)
+
+    runner = pipeline.checklist_runner(revised_index, language, subject, model = model, **options)
+    baseline_scope = answer_scope(baseline_fingerprint, language, subject)
+    revised_scope = answer_scope(revised_fingerprint, language, subject)
+
+    to_verify, reasons, reused = [], {}, {}
+
+    for requirement in requirements:
+        query = requirement_query(requirement)
+        stored = answer_cache.get(baseline_scope, query)
+        details = stored['details'].get('checklist') if stored is not None else None
+
+        if details is None:
+            to_verify.append(requirement)
+            reasons[requirement['id']] = 'no stored answer'
+            continue
+
+        #A failed retrieval is left to the runner, which records it as an Error verdict
+        try:
+            docs, _ = runner.retriever.search(query)
+        except Exception as error:
+            to_verify.append(requirement)
+            reasons[requirement['id']] = f'retrieval failed ({type(error).__name__})'
+            continue
+
+        _, context_report = pack_context(docs, pipeline.snippet_budget)
+        touched = sorted((set(details['networks']) & impacted_old) | (set(context_report['networks']) & impacted_new))
+        #Networks of the stored answer that the baseline does not have (an answer stored with other network keys) cannot be checked
+        unknown = sorted(set(details['networks']) - set(baseline))
+
+        if touched:
+            to_verify.append(requirement)
+            reasons[requirement['id']] = 'impacted: ' + ', '.join(touched)
+        elif unknown:
+            to_verify.append(requirement)
+            reasons[requirement['id']] = 'unknown networks in stored answer: ' + ', '.join(unknown)
+        else:
+            reused[requirement['id']] = {'id': requirement['id'], 'requirement': requirement['text'], 'verdict': details['verdict'],
+                                         'answer': stored['answer'], 'tokens': details['tokens'], 'usage': details['usage'],
+                                         'attempts': 0, 'seconds': 0.0, 'error': None, 'retrieval': None,
+                                         'networks': context_report['networks'], 'reused': True}
+            if on_result is not None:
+                on_result(reused[requirement['id']])
+
+    verified = {result['id']: {**result, 'reused': False, 'reason': reasons[result['id']]}
+                for result in runner.run(to_verify, on_result = on_result)}
+    results = [reused.get(requirement['id']) or verified[requirement['id']] for requirement in requirements]
+
+    store_answers(answer_cache, revised_scope, requirements, results)
+
+    #Tokens a full re-run would have spent on the reused requirements, from the usage of their stored answers
+    saved = sum((result['usage']['input'] or result['tokens']) + result['usage']['output'] for result in reused.values())
+    spent = sum(result['usage']['input'] + result['usage']['output'] for result in verified.values())
+
+    return {
+        'baseline': baseline_fingerprint,
+        'revised': revised_fingerprint,
+        'changes': {'added': [revised[key]['label'] for key in diff['added']],
+                    'removed': [baseline[key]['label'] for key in diff['removed']],
+                    'changed': [revised[key]['label'] for _, key in diff['changed']],
+                    'unchanged': len(diff['unchanged'])},
+        'impacted': [revised[key]['label'] for key in sorted(impacted_new)],
+        'reverified': [{'id': result['id'], 'reason': result['reason']} for result in verified.values()],
+        'reused': list(reused),
+        'tokens': {'spent': spent, 'saved': saved},
+        'results': results,
+    }
+
+
+#Stores the answers of a checklist run, keyed by the query of each requirement, so a later change can reuse them
+def store_answers(answer_cache, scope, requirements, results):
+    for requirement, result in zip(requirements, results):
+        if result['error'] is None:
+            answer_cache.put(scope, requirement_query(requirement), result['answer'], details = {'checklist': {
+                'verdict': result['verdict'], 'tokens': result['tokens'], 'usage': result['usage'], 'networks': result['networks']}})
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from plc_verifier.embedding_cache import DEFAULT_CACHE_DIR
+from plc_verifier.instrumentation import Trace
+from plc_verifier.lexical import LexicalIndex
+from plc_verifier.tokens import EMBEDDING_ENCODING, count_tokens
+from plc_verifier.vector_index import DEFAULT_VECTOR_INDEX, build_vectorstore, index_bytes, resolve_kind
+from plc_verifier.xref import CrossReference
+
+#Location of the saved FAISS indexes
+DEFAULT_INDEX_DIR = os.path.join(DEFAULT_CACHE_DIR, 'indexes')
+
+
+#Fingerprint of the settings used to parse, split and embed the files
+def fingerprint_settings(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys = True).encode('utf-8')).hexdigest()
+
+
+#Fingerprint of an upload set: file names and contents plus the indexing settings
+def fingerprint_uploads(files, settings):
+    digest = hashlib.sha256()
+    digest.update(fingerprint_settings(settings).encode('utf-8'))
+
+    for name, data in sorted(files, key = lambda item: item[0]):
+        digest.update(name.encode('utf-8'))
+        digest.update(hashlib.sha256(data).digest())
+
+    return digest.hexdigest()
+
+
+#Content address of a chunk, unique inside its file
+def chunk_id(file_name, text, occurrence):
+    key = f'{file_name}\0{occurrence}\0{text}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+#Vectorstore built for one upload set, with the manifest {file name: {'hash', 'ids'}} used for incremental updates
+#the embedding backend that built it, {'backend', 'model', 'dimensions'}, and the FAISS index type (see vector_index)
+class ProgramIndex:
+
+    def __init__(self, fingerprint, settings_fingerprint, vectorstore, manifest, update_stats = None, embedding = None, vector_index = None):
+        self.fingerprint = fingerprint
+        self.settings_fingerprint = settings_fingerprint
+        self.vectorstore = vectorstore
+        self.manifest = manifest
+        self.update_stats = update_stats or {}
+        self.embedding = embedding or {}
+        self.vector_index = vector_index or {}
+        self._token_totals = None
+        self._lexical = None
+        self._xref = None
+
+    #Documents of the index in upload order, as (id, document)
+    def documents(self):
+        for entry in self.manifest.values():
+            for id_ in entry['ids']:
+                yield id_, self.vectorstore.docstore.search(id_)
+
+    #Lexical index over the tags, blocks and comments of the indexed chunks
+    def lexical_index(self):
+        if self._lexical is None:
+            ids, docs = zip(*self.documents()) if self.manifest else ((), ())
+            self._lexical = LexicalIndex(ids, docs)
+
+        return self._lexical
+
+    #Cross-reference of the tags read and written by each network
+    def cross_reference(self):
+        if self._xref is None:
+            ids, docs = zip(*self.documents()) if self.manifest else ((), ())
+            self._xref = CrossReference(ids, docs)
+
+        return self._xref
+
+    #Tokens of the indexed documents as raw xml and in the compact canonical form
+    def token_totals(self):
+        if self._token_totals is None:
+            raw = compact = 0
+
+            for _, doc in self.documents():
+                if doc.metadata.get('chunk', 1) == 1:
+                    raw += doc.metadata.get('raw_tokens', 0)
+                    compact += doc.metadata.get('tokens', 0)
+
+            self._token_totals = {'raw': raw, 'compact': compact}
+
+        return self._token_totals
+
+
+#Builds the index of an upload set, reusing the chunks of a base index when one is given
+#Only new or changed files are parsed and split (by split_fn, files to chunks) and only chunks absent from the base are embedded
+#The parse, embed and faiss stages are recorded in trace when one is given; embedding describes the backend of the embeddings
+#and vector_index the FAISS index options (DEFAULT_VECTOR_INDEX)
+def build_program_index(fingerprint, settings_fingerprint, uploaded_files, split_fn, embeddings, base = None, trace = None, embedding = None,
+                        vector_index = None):
+    trace = trace or Trace('index')
+    files = sorted(uploaded_files, key = lambda uploaded_file: uploaded_file.name)
+    file_hashes = {f.name: hashlib.sha256(f.getbuffer()).hexdigest() for f in files}
+
+    if base is not None and base.settings_fingerprint != settings_fingerprint:
+        base = None
+
+    base_manifest = base.manifest if base is not None else {}
+    unchanged = {name for name, hash_ in file_hashes.items() if base_manifest.get(name, {}).get('hash') == hash_}
+    to_parse = [f for f in files if f.name not in unchanged]
+
+    #Parsing and splitting of the new and changed files only
+    with trace.stage('parse', files = len(to_parse), bytes = sum(len(f.getbuffer()) for f in to_parse)) as stage:
+        splits = split_fn(to_parse) if to_parse else []
+        stage['chunks'] = len(splits)
+
+    new_chunks = {}
+    occurrences = {}
+
+    for split in splits:
+        name = split.metadata['source']
+        occurrence = occurrences.get((name, split.page_content), 0)
+        occurrences[(name, split.page_content)] = occurrence + 1
+        new_chunks.setdefault(name, {})[chunk_id(name, split.page_content, occurrence)] = split
+
+    manifest = OrderedDict()
+    base_ids = set()
+    keep_ids = set()
+
+    for name, entry in base_manifest.items():
+        base_ids.update(entry['ids'])
+
+    for f in files:
+        if f.name in unchanged:
+            ids = base_manifest[f.name]['ids']
+        else:
+            ids = list(new_chunks.get(f.name, {}))
+
+        manifest[f.name] = {'hash': file_hashes[f.name], 'ids': ids}
+        keep_ids.update(ids)
+
+    if not keep_ids:
+        raise ValueError('No PLC code found in the uploaded files (empty or unreadable exports)')
+
+    to_delete = sorted(base_ids - keep_ids)
+    to_add = [(id_, doc) for chunks in new_chunks.values() for id_, doc in chunks.items() if id_ not in base_ids]
+
+    options = {**DEFAULT_VECTOR_INDEX, **(vector_index or {})}
+    kind = resolve_kind(options['kind'], len(keep_ids))
+
+    #An exact flat index is updated in place; the other types are rebuilt from all the chunks, as HNSW cannot remove
+    #vectors and the IVF centroids and PQ codebooks are trained on the corpus (kept chunks come from the embedding cache)
+    incremental = kind == 'flat' and options['compression'] == 'none' and (base is None or base.vector_index.get('factory', 'Flat') == 'Flat')
+
+    if not incremental:
+        new_docs = dict(to_add)
+        to_add = []
+
+        for entry in manifest.values():
+            for id_ in entry['ids']:
+                doc = new_docs.get(id_)
+
+                if doc is None:
+                    #Copy of the kept chunk, as the base index may be shared with other sessions
+                    kept = base.vectorstore.docstore.search(id_)
+                    doc = Document(page_content = kept.page_content, metadata = dict(kept.metadata))
+
+                to_add.append((id_, doc))
+
+    texts = [doc.page_content for _, doc in to_add]
+
+    with trace.stage('embed', chunks = len(texts), tokens = sum(count_tokens(text, EMBEDDING_ENCODING) for text in texts)) as stage:
+        misses = getattr(embeddings, 'misses', 0)
+        vectors = embeddings.embed_documents(texts) if texts else []
+        #Chunks actually sent to the embedding API, the others came from the embedding cache
+        stage['embedded'] = getattr(embeddings, 'misses', len(texts)) - misses
+
+    with trace.stage('faiss', added = len(to_add), removed = len(to_delete)) as stage:
+        text_embeddings = list(zip(texts, vectors))
+        metadatas = [doc.metadata for _, doc in to_add]
+        ids = [id_ for id_, _ in to_add]
+
+        if not incremental:
+            vectorstore, index_spec = build_vectorstore(texts, vectors, metadatas, ids, embeddings, options)
+        else:
+            index_spec = {'kind': 'flat', 'compression': 'none', 'factory': 'Flat', 'nprobe': options['nprobe'], 'ef_search': options['ef_search']}
+
+            if base is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas = metadatas, ids = ids)
+            else:
+                #Copy of the base so indexes shared with other sessions are never modified
+                vectorstore = FAISS.deserialize_from_bytes(base.vectorstore.serialize_to_bytes(), embeddings, allow_dangerous_deserialization = True)
+
+                if to_delete:
+                    vectorstore.delete(to_delete)
+                if to_add:
+                    vectorstore.add_embeddings(text_embeddings, metadatas = metadatas, ids = ids)
+
+        stage.update(factory = index_spec['factory'], bytes = index_bytes(vectorstore.index))
+
+    #Page numbering follows the file order of the current upload set
+    for idx, (name, entry) in enumerate(manifest.items(), start = 1):
+        for id_ in entry['ids']:
+            doc = vectorstore.docstore.search(id_)
+            doc.metadata['page'] = idx
+            doc.metadata['page_label'] = str(idx)
+
+    added = len(keep_ids - base_ids)
+
+    update_stats = {
+        'files_parsed': len(to_parse),
+        'chunks_added': added,
+        'chunks_removed': len(to_delete),
+        'chunks_kept': len(keep_ids) - added,
+    }
+
+    entry = ProgramIndex(fingerprint, settings_fingerprint, vectorstore, manifest, update_stats,
+                         {**(embedding or {}), 'dimensions': vectorstore.index.d}, index_spec)
+
+    with trace.stage('lexical', chunks = len(keep_ids)):
+        entry.lexical_index()
+        entry.cross_reference()
+
+    return entry
+
+
+#Process-wide registry of indexes, kept in memory (LRU) and saved to disk with save_local
+class IndexRegistry:
+
+    def __init__(self, index_dir = DEFAULT_INDEX_DIR, max_in_memory = 8):
+        self.index_dir = index_dir
+        self.max_in_memory = max_in_memory
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint):
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+            return entry
+
+    #Returns the index in memory or on disk, None when the fingerprint was never indexed
+    def find(self, fingerprint, embeddings):
+        entry = self.get(fingerprint)
+        if entry is not None or fingerprint is None:
+            return entry
+
+        path = os.path.join(self.index_dir, fingerprint)
+        if not os.path.isfile(os.path.join(path, 'manifest.json')):
+            return None
+
+        vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization = True)
+
+        with open(os.path.join(path, 'manifest.json'), encoding = 'utf-8') as f:
+            info = json.load(f)
+
+        entry = ProgramIndex(fingerprint, info['settings_fingerprint'], vectorstore, OrderedDict(info['manifest']),
+                             embedding = info.get('embedding'), vector_index = info.get('vector_index'))
+        self._put(entry)
+
+        return entry
+
+    #Returns the index of the fingerprint, calling build_fn(base) only once
+    #base is the index of base_fingerprint (e.g. the previous upload set of the session) or None
+    def get_or_build(self, fingerprint, build_fn, embeddings, base_fingerprint = None):
+        entry = self.get(fingerprint)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            build_lock = self._building.setdefault(fingerprint, threading.Lock())
+
+        with build_lock:
+            entry = self.find(fingerprint, embeddings)
+
+            if entry is None:
+                entry = build_fn(self.find(base_fingerprint, embeddings))
+                self._save(entry)
+                self._put(entry)
+
+        with self._lock:
+            self._building.pop(fingerprint, None)
+
+        return entry
+
+    def _put(self, entry):
+        with self._lock:
+            self._entries[entry.fingerprint] = entry
+            self._entries.move_to_end(entry.fingerprint)
+
+            while len(self._entries) > self.max_in_memory:
+                self._entries.popitem(last = False)
+
+    #Saving through a temporary folder so other processes never load a partial index
+    def _save(self, entry):
+        os.makedirs(self.index_dir, exist_ok = True)
+        temp_path = tempfile.mkdtemp(dir = self.index_dir)
+        entry.vectorstore.save_local(temp_path)
+
+        with open(os.path.join(temp_path, 'manifest.json'), 'w', encoding = 'utf-8') as f:
+            json.dump({'settings_fingerprint': entry.settings_fingerprint, 'embedding': entry.embedding, 'vector_index': entry.vector_index,
+                       'manifest': entry.manifest}, f)
+
+        try:
+            os.replace(temp_path, os.path.join(self.index_dir, entry.fingerprint))
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors = True)
@@ -0,0 +1,118 @@
+from io import BytesIO
+
+from langchain_core.documents import Document
+from lxml import etree
+
+
+#Local name of an element, without the Openness namespace
+def local_name(elem):
+    return etree.QName(elem).localname
+
+
+#Releases a processed element and the siblings already handled before it
+def release(elem):
+    elem.clear(keep_tail = True)
+    parent = elem.getparent()
+
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+#Text of the Title of a CompileUnit (network), first culture found
+def network_title(compile_unit):
+    for text in compile_unit.xpath(".//*[local-name()='MultilingualText'][@CompositionName='Title']//*[local-name()='Text']"):
+        if text.text and text.text.strip():
+            return text.text.strip()
+    return ''
+
+
+#Streaming parser of a Siemens Openness export
+#Yields one document per block interface and one per network (CompileUnit) as the file is read,
+#clearing the processed elements so memory stays flat regardless of file size
+#Malformed files (mismatched tags, truncated exports) are parsed in recovery mode; files that cannot be parsed at all
+#are kept whole as text, so one bad upload does not stop the others
+def iter_documents(name, buffer, page):
+    base_metadata = {'source': name, 'page': page, 'page_label': str(page)}
+    emitted = 0
+    root = None
+
+    try:
+        for doc in _iter_block_documents(base_metadata, buffer):
+            if isinstance(doc, Document):
+                emitted += 1
+                yield doc
+            else:
+                root = doc
+    except etree.XMLSyntaxError:
+        pass
+
+    #Files that are not block exports (tag tables, plain snippets) are kept whole
+    if emitted:
+        return
+
+    if root is not None:
+        yield Document(metadata = {**base_metadata, 'section': 'file'}, page_content = etree.tostring(root, encoding = 'unicode'))
+    elif bytes(buffer).strip():
+        yield Document(metadata = {**base_metadata, 'section': 'file'}, page_content = bytes(buffer).decode('utf-8', errors = 'replace'))
+
+
+#Documents of the blocks of an export, preceded by the root element once it is known
+def _iter_block_documents(base_metadata, buffer):
+    context = etree.iterparse(BytesIO(buffer), events = ('start', 'end'), huge_tree = True, recover = True)
+    blocks = []
+    root = None
+
+    for event, elem in context:
+        if root is None:
+            root = elem
+            yield root
+
+        tag = local_name(elem) if isinstance(elem.tag, str) else ''
+
+        if event == 'start':
+            if tag.startswith('SW.Blocks.') and tag != 'SW.Blocks.CompileUnit':
+                blocks.append({'elem': elem, 'type': tag[len('SW.Blocks.'):], 'name': '', 'language': '',
+                               'networks': 0, 'pending': []})
+            continue
+
+        if not blocks:
+            continue
+
+        block = blocks[-1]
+        parent = elem.getparent()
+        in_block_attributes = parent is not None and local_name(parent) == 'AttributeList' and parent.getparent() is block['elem']
+
+        if in_block_attributes and tag == 'Name':
+            block['name'] = (elem.text or '').strip()
+
+        elif in_block_attributes and tag == 'ProgrammingLanguage':
+            block['language'] = (elem.text or '').strip()
+
+        elif in_block_attributes and tag == 'Interface':
+            #Block name comes after the interface, so the document is emitted at the end of the AttributeList
+            block['pending'].append(etree.tostring(elem, encoding = 'unicode', with_tail = False))
+            release(elem)
+
+        elif tag == 'AttributeList' and parent is block['elem']:
+            for content in block['pending']:
+                yield Document(
+                    metadata = {**base_metadata, 'block': block['name'], 'block_type': block['type'],
+                                'language': block['language'], 'section': 'interface'},
+                    page_content = content,
+                )
+            block['pending'] = []
+
+        elif tag == 'SW.Blocks.CompileUnit':
+            block['networks'] += 1
+            yield Document(
+                metadata = {**base_metadata, 'block': block['name'], 'block_type': block['type'],
+                            'language': block['language'], 'section': 'network', 'network': block['networks'],
+                            'compile_unit_id': elem.get('ID', ''), 'title': network_title(elem)},
+                page_content = etree.tostring(elem, encoding = 'unicode', with_tail = False),
+            )
+            release(elem)
+
+        elif elem is block['elem']:
+            blocks.pop()
+            release(elem)
@@ -0,0 +1,114 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+#Folder of the trace logs, one JSON-lines file per day
+DEFAULT_LOG_DIR = os.environ.get('PLC_VERIFIER_LOG_DIR', 'logs')
+
+
+#Durations and counters of the stages of one operation (indexing of an upload set, answer to a query)
+#Stages are recorded as {'stage', 'seconds', ...counters} in the order they end
+class Trace:
+
+    def __init__(self, kind, **fields):
+        self.kind = kind
+        self.fields = fields
+        self.stages = []
+        self.timestamp = datetime.now(timezone.utc).isoformat(timespec = 'milliseconds')
+        self._start = time.perf_counter()
+
+    #Times the block; counters can be added to the yielded entry inside it
+    @contextmanager
+    def stage(self, name, **counters):
+        entry = {'stage': name, **counters}
+        start = time.perf_counter()
+
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            self.stages.append(entry)
+
+    def add(self, name, seconds, **counters):
+        self.stages.append({'stage': name, **counters, 'seconds': seconds})
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+    def seconds(self):
+        return time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {'kind': self.kind, 'timestamp': self.timestamp, 'seconds': self.seconds(), **self.fields, 'stages': self.stages}
+
+
+#Append-only JSON-lines log of the traces of all sessions of the server
+class TraceLog:
+
+    def __init__(self, log_dir = DEFAULT_LOG_DIR):
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+
+    def path(self):
+        return os.path.join(self.log_dir, f"traces-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl")
+
+    #Writes the trace and returns its dictionary
+    def write(self, trace):
+        record = trace.to_dict()
+        line = json.dumps(record, ensure_ascii = False, default = str)
+
+        with self._lock:
+            os.makedirs(self.log_dir, exist_ok = True)
+            with open(self.path(), 'a', encoding = 'utf-8') as f:
+                f.write(line + '\n')
+
+        return record
+
+
+def read_traces(paths):
+    for path in paths:
+        with open(path, encoding = 'utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+#Count, mean, p50 and p95 seconds of each (kind, stage) of the traces
+def summarize_traces(traces):
+    durations = {}
+
+    for trace in traces:
+        durations.setdefault((trace['kind'], 'total'), []).append(trace['seconds'])
+        for stage in trace['stages']:
+            durations.setdefault((trace['kind'], stage['stage']), []).append(stage['seconds'])
+
+    summary = {}
+    for key, values in sorted(durations.items()):
+        values = np.asarray(values)
+        summary[key] = {'count': len(values), 'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+                        'p95': float(np.percentile(values, 95))}
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Aggregate the stage durations of the verifier trace logs.')
+    parser.add_argument('paths', nargs = '*', help = f'trace logs (default: {DEFAULT_LOG_DIR}/traces-*.jsonl)')
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(DEFAULT_LOG_DIR, 'traces-*.jsonl')))
+
+    for (kind, stage), values in summarize_traces(read_traces(paths)).items():
+        print(f"{kind:>8} {stage:>14}: {values['count']:6d} x, mean {values['mean']:8.3f} s, "
+              f"p50 {values['p50']:8.3f} s, p95 {values['p95']:8.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import math
+import re
+
+import numpy as np
+
+from plc_verifier.mmr import DEFAULT_MIN_K, DEFAULT_MMR_THRESHOLD, mmr_select, normalize_rows
+
+#Identifiers of tags, blocks and instances (Safety_OK, DB_Valve.Cmd, FC_Control_0001)
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*')
+
+#Words that never make a query about a specific tag
+STOPWORDS = {'the', 'and', 'for', 'are', 'any', 'all', 'how', 'what', 'where', 'when', 'which', 'who', 'why', 'does', 'with',
+             'without', 'that', 'this', 'from', 'into', 'ever', 'set', 'not', 'its', 'has', 'have', 'can', 'there', 'check',
+             'verify', 'program', 'code', 'block', 'network', 'is', 'it', 'of', 'in', 'on', 'to', 'or', 'be', 'if', 'a'}
+
+
+#Terms of a text: each identifier lowercased, plus the words it is made of
+def terms(text):
+    result = []
+
+    for identifier in IDENTIFIER.findall(text):
+        identifier = identifier.lower()
+        result.append(identifier)
+        words = [word for word in re.split(r'[_.]', identifier) if word]
+        if len(words) > 1:
+            result.extend(words)
+
+    return result
+
+
+#Identifier-like words of a query: with underscore, dot or digit, in backticks or in mixed case
+def query_identifiers(query):
+    quoted = {word.lower() for word in re.findall(r'`([^`]+)`', query)}
+    found = []
+
+    for identifier in IDENTIFIER.findall(query):
+        lower = identifier.lower()
+        if lower in quoted or re.search(r'[_.\d]', identifier) or (identifier != lower and identifier != identifier.upper() and not identifier[1:].islower()):
+            found.append(lower)
+
+    return list(dict.fromkeys(found))
+
+
+#BM25 index over the identifiers of the indexed chunks (tag names, block names, comments)
+class LexicalIndex:
+
+    def __init__(self, ids, docs, k1 = 1.2, b = 0.75):
+        self.ids = list(ids)
+        self.docs = list(docs)
+        self.k1 = k1
+        self.b = b
+        self.tags = set()
+
+        postings = {}
+        lengths = np.zeros(len(self.docs), dtype = np.float32)
+
+        for position, doc in enumerate(self.docs):
+            metadata = doc.metadata
+            text = ' '.join([doc.page_content, metadata.get('block', ''), metadata.get('title', '')])
+            doc_terms = terms(text)
+            lengths[position] = len(doc_terms)
+
+            counts = {}
+            for term in doc_terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((position, count))
+
+            for tag in list(metadata.get('reads', [])) + list(metadata.get('writes', [])) + [metadata.get('block', '')]:
+                if tag:
+                    self.tags.add(tag.lower())
+
+        #Postings as arrays so a query term is scored over all its documents at once
+        self.postings = {term: (np.array([position for position, _ in items], dtype = np.int64),
+                                np.array([count for _, count in items], dtype = np.float32))
+                         for term, items in postings.items()}
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+        count = len(self.docs)
+        self.idf = {term: math.log(1 + (count - len(positions) + 0.5) / (len(positions) + 0.5))
+                    for term, (positions, _) in self.postings.items()}
+
+    #Returns [(doc id, document, score)] of the best k matches
+    def search(self, query, k = 50):
+        if not self.docs:
+            return []
+
+        scores = np.zeros(len(self.docs), dtype = np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-6))
+
+        for term in set(terms(query)):
+            if term in STOPWORDS or term not in self.postings:
+                continue
+            positions, counts = self.postings[term]
+            scores[positions] += self.idf[term] * counts * (self.k1 + 1) / (counts + norm[positions])
+
+        matched = np.flatnonzero(scores)
+        best = matched[np.argsort(-scores[matched], kind = 'stable')][:k]
+
+        return [(self.ids[position], self.docs[position], float(scores[position])) for position in best]
+
+    #Identifiers of the query that are known tags or blocks of the program
+    def exact_tags(self, query):
+        return [identifier for identifier in query_identifiers(query) if identifier in self.tags]
+
+
+#Key identifying the same chunk in the dense and lexical results
+def doc_key(doc):
+    return (doc.metadata.get('source', ''), doc.page_content)
+
+
+#Retriever fusing FAISS MMR results with the lexical index through reciprocal-rank fusion
+#The networks reading or writing the tags named in the query (cross-reference) are fused as a third ranking
+#When every identifier of the query is a known tag, the lexical hits are enough and no query embedding is computed
+#Vectorized, MMR runs on the fetched vectors reconstructed from the FAISS index and k is adaptive: at least min_k snippets,
+#or as many as the candidates within threshold of the best relevance (None: always k); search_params are the FAISS
+#query-time knobs of each search (vector_index.search_parameters)
+class HybridRetriever:
+
+    def __init__(self, vectorstore, lexical, k = 50, fetch_k = 100, lambda_mult = 0.25, rrf_k = 60, xref = None, vectorized = False,
+                 min_k = DEFAULT_MIN_K, threshold = DEFAULT_MMR_THRESHOLD, search_params = None):
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.xref = xref
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.rrf_k = rrf_k
+        self.vectorized = vectorized
+        self.min_k = min_k
+        self.threshold = threshold
+        self.search_params = search_params
+        self.last_report = {}
+
+    def invoke(self, query):
+        docs, self.last_report = self.search(query)
+        return docs
+
+    #Returns (fused documents, report of the hits of each ranking), without shared state for concurrent callers
+    def search(self, query):
+        lexical_docs = [doc for _, doc, _ in self.lexical.search(query, self.fetch_k)]
+        identifiers = query_identifiers(query)
+        tags = self.lexical.exact_tags(query)
+        skip_dense = bool(tags) and len(tags) == len(identifiers)
+
+        if skip_dense:
+            dense_docs = []
+        else:
+            dense_docs = self.dense_search(query)
+
+        xref_docs = self.xref.documents_for(tags)[:self.fetch_k] if self.xref is not None else []
+
+        #Snippets returned: the adaptive MMR selection, or the networks using the tags when the query only names tags
+        if not self.vectorized or self.threshold is None:
+            k = self.k
+        else:
+            k = min(self.k, max(self.min_k, len(xref_docs) if skip_dense else len(dense_docs)))
+
+        scores = {}
+        docs = {}
+
+        for ranking in (dense_docs, lexical_docs, xref_docs):
+            for rank, doc in enumerate(ranking, start = 1):
+                key = doc_key(doc)
+                docs[key] = doc
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank)
+
+        fused = sorted(scores, key = lambda key: -scores[key])[:k]
+        report = {'dense': len(dense_docs), 'lexical': len(lexical_docs), 'xref': len(xref_docs), 'tags': tags,
+                  'dense_skipped': skip_dense, 'k': k}
+
+        return [docs[key] for key in fused], report
+
+    #MMR over the fetch_k nearest chunks; vectorized, only these fetch_k vectors are decoded from the index (no dense copy
+    #of the corpus is kept, so compressed indexes stay compressed)
+    def dense_search(self, query):
+        if not self.vectorized:
+            return self.vectorstore.max_marginal_relevance_search(query, k = self.k, fetch_k = self.fetch_k, lambda_mult = self.lambda_mult)
+
+        query_vector = normalize_rows(self.vectorstore.embeddings.embed_query(query))
+        _, positions = self.vectorstore.index.search(query_vector[None, :], self.fetch_k, params = self.search_params)
+        positions = positions[0][positions[0] >= 0]
+
+        candidates = normalize_rows(self.vectorstore.index.reconstruct_batch(positions))
+        picked, _ = mmr_select(query_vector, candidates, self.k, self.lambda_mult, self.min_k, self.threshold)
+
+        return [self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(positions[i])]) for i in picked]
@@ -0,0 +1,81 @@
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+#Size of the hashed vectors and lengths of the character n-grams of the identifiers
+DEFAULT_DIMENSIONS = 1024
+NGRAM_SIZES = (3, 4)
+
+#Identifiers (tags, blocks, instructions, dotted members) and numbers of the canonical code and of the queries
+TOKEN = re.compile(r'[A-Za-z_][A-Za-z0-9_.]*|\d+')
+
+#Sub-words of an identifier: parts between underscores and dots, camelCase humps and digit runs
+SUBWORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+#Weights of the features of one occurrence of an identifier: whole identifier, its sub-words, its character n-grams
+TOKEN_WEIGHT = 1.0
+SUBWORD_WEIGHT = 0.5
+NGRAM_WEIGHT = 0.5
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode('utf-8'))
+
+
+#Hashed (indices, signed weights) of the features of an identifier, cached as the tag vocabulary of a program repeats
+@lru_cache(maxsize = 200000)
+def token_features(token, dimensions = DEFAULT_DIMENSIONS):
+    lowered = token.lower()
+    features = [('t:' + lowered, TOKEN_WEIGHT)]
+
+    subwords = [part.lower() for part in SUBWORD.findall(token)]
+    if len(subwords) > 1:
+        features += [('s:' + part, SUBWORD_WEIGHT / len(subwords)) for part in subwords]
+
+    padded = f'<{lowered}>'
+    ngrams = [padded[start:start + size] for size in NGRAM_SIZES for start in range(len(padded) - size + 1)]
+    features += [('n:' + ngram, NGRAM_WEIGHT / len(ngrams)) for ngram in ngrams]
+
+    hashes = np.fromiter((_hash(feature) for feature, _ in features), dtype = np.uint32, count = len(features))
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+    weights = np.fromiter((weight for _, weight in features), dtype = np.float32, count = len(features))
+
+    return (hashes % dimensions).astype(np.int64), signs * weights
+
+
+#Local embeddings for air-gapped machines: signed feature hashing of the identifiers of a text, their sub-words and
+#character n-grams, with sublinear term frequency and L2 normalization
+#Runs on the CPU with NumPy only; vectors of texts sharing tags, blocks or instructions are close, which is what the
+#verifier's queries look for, but there is no semantic similarity between different words
+class HashingEmbeddings(Embeddings):
+
+    def __init__(self, dimensions = DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+        #Name recorded with the index and in its fingerprint; the version changes with the features
+        self.model = f'hashing-ngram-v1-{dimensions}'
+
+    def _vector(self, text):
+        counts = Counter(TOKEN.findall(text))
+        if not counts:
+            return np.zeros(self.dimensions, dtype = np.float32)
+
+        indices, values = [], []
+        for token, count in counts.items():
+            token_indices, token_values = token_features(token, self.dimensions)
+            indices.append(token_indices)
+            values.append(token_values * (1.0 + np.log(count)))
+
+        vector = np.bincount(np.concatenate(indices), weights = np.concatenate(values), minlength = self.dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
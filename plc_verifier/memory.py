@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from plc_verifier.tokens import count_tokens
+
+#Default token budget of the memory of a conversation, and lifetime and number of the conversations kept
+DEFAULT_MEMORY_BUDGET = 2000
+DEFAULT_SESSION_TTL = 4 * 3600
+DEFAULT_MAX_SESSIONS = 1000
+
+SUMMARY_PROMPT = """
+Summarize the conversation below between an engineer and a PLC program verifier, in at most {words} words.
+Keep the requirements checked, the verdicts given, the tags, blocks and networks discussed and any open question.
+
+Summary so far: {summary}
+
+New messages:
+{messages}
+"""
+
+
+def message_tokens(messages):
+    return sum(count_tokens(str(message.content)) for message in messages)
+
+
+#Summarizer of a conversation with an LLM: (summary so far, messages to add) -> new summary
+def llm_summarizer(model, words = 150):
+    chain = ChatPromptTemplate.from_template(SUMMARY_PROMPT) | model | StrOutputParser()
+
+    def summarize(summary, messages):
+        text = '\n'.join(f'{message.type}: {message.content}' for message in messages)
+        return chain.invoke({'words': words, 'summary': summary or 'none', 'messages': text}).strip()
+
+    return summarize
+
+
+#Summary without an LLM: the previous summary and the messages, cut from the front to the given tokens
+def truncated_summary(summary, messages, tokens):
+    text = ' '.join([summary] + [f'{message.type}: {message.content}' for message in messages]).strip()
+    return text[-tokens * 4:]
+
+
+#Chat history bounded by a token budget
+#When the messages exceed the budget, the oldest turns are rolled into a running summary until the recent turns
+#fit in half of it; the last turn is always kept verbatim
+class SummarizingChatHistory(BaseChatMessageHistory):
+
+    def __init__(self, budget = DEFAULT_MEMORY_BUDGET, summarize = None):
+        self.budget = budget
+        self.summarize = summarize
+        self.summary = ''
+        self.recent = []
+        self.last_access = time.time()
+        self._lock = threading.RLock()
+
+    @property
+    def messages(self):
+        with self._lock:
+            summary = [SystemMessage(content = f'Summary of the earlier conversation: {self.summary}')] if self.summary else []
+            return summary + list(self.recent)
+
+    def add_messages(self, messages):
+        with self._lock:
+            self.recent.extend(messages)
+            self.last_access = time.time()
+
+            if message_tokens(self.messages) > self.budget:
+                self._compact()
+
+    def _compact(self):
+        old = []
+
+        while len(self.recent) > 2 and message_tokens(self.recent) > self.budget // 2:
+            old.extend(self.recent[:2])
+            self.recent = self.recent[2:]
+
+        if not old:
+            return
+
+        summary_tokens = self.budget // 4
+
+        try:
+            summary = self.summarize(self.summary, old) if self.summarize is not None else None
+        except Exception:
+            summary = None
+
+        if not summary or count_tokens(summary) > summary_tokens:
+            summary = truncated_summary(summary or self.summary, [] if summary else old, summary_tokens)
+
+        self.summary = summary
+
+    def tokens(self):
+        return message_tokens(self.messages)
+
+    def clear(self):
+        with self._lock:
+            self.summary = ''
+            self.recent = []
+
+
+#Conversation memories of the server, one per session id, dropped when idle for ttl seconds or least recently used
+class SessionMemoryStore:
+
+    def __init__(self, budget = DEFAULT_MEMORY_BUDGET, summarize = None, ttl = DEFAULT_SESSION_TTL, max_sessions = DEFAULT_MAX_SESSIONS):
+        self.budget = budget
+        self.summarize = summarize
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            now = time.time()
+
+            for expired in [key for key, history in self._histories.items() if now - history.last_access > self.ttl]:
+                del self._histories[expired]
+
+            if session_id not in self._histories:
+                self._histories[session_id] = SummarizingChatHistory(self.budget, self.summarize)
+
+            self._histories.move_to_end(session_id)
+            history = self._histories[session_id]
+            history.last_access = now
+
+            while len(self._histories) > self.max_sessions:
+                self._histories.popitem(last = False)
+
+            return history
+
+    def clear(self, session_id):
+        with self._lock:
+            self._histories.pop(session_id, None)
@@ -0,0 +1,50 @@
+import numpy as np
+
+#Snippets always returned by the adaptive MMR, and the fraction of the best relevance a candidate needs to count for k
+#(0.7 keeps min_k snippets for questions on a few tags and 20 to 50 for questions spanning the program)
+DEFAULT_MIN_K = 8
+DEFAULT_MMR_THRESHOLD = 0.7
+
+
+#Rows scaled to unit length, so dot products are cosine similarities
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype = np.float32)
+    norms = np.linalg.norm(vectors, axis = -1, keepdims = True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+#Maximal marginal relevance over candidate vectors (unit rows) for a unit query vector
+#Each step picks the candidate maximizing lambda * relevance - (1 - lambda) * (max similarity to the picked ones); the max
+#similarities are updated with one matrix-vector product per pick, so a selection costs O(k * fetch_k) similarities
+#With a threshold, k is adapted to the question from relevance alone, independent of lambda: the number of candidates
+#within threshold of the best relevance, between min_k and k (threshold None: fixed k)
+#Returns the positions of the picked candidates and their marginal relevance
+def mmr_select(query_vector, candidates, k, lambda_mult = 0.5, min_k = DEFAULT_MIN_K, threshold = None):
+    count = len(candidates)
+    if count == 0 or k <= 0:
+        return [], []
+
+    relevance = candidates @ query_vector
+
+    if threshold is not None:
+        relevant = int(np.count_nonzero(relevance >= threshold * max(float(relevance.max()), 0.0)))
+        k = min(k, max(min_k, relevant))
+
+    #The most relevant candidate comes first; the redundancy of the others is then their (possibly negative) max similarity
+    best = int(np.argmax(relevance))
+    max_similarity = candidates @ candidates[best]
+    available = np.ones(count, dtype = bool)
+    available[best] = False
+    picked, scores = [best], [float(lambda_mult * relevance[best])]
+
+    for _ in range(min(k, count) - 1):
+        marginal = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+
+        picked.append(best)
+        scores.append(float(marginal[best]))
+        available[best] = False
+        np.maximum(max_similarity, candidates @ candidates[best], out = max_similarity)
+
+    return picked, scores
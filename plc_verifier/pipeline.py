@@ -0,0 +1,178 @@
+import glob
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from plc_verifier.canonical import canonicalize_documents
+from plc_verifier.checklist import ChecklistRunner
+from plc_verifier.chunking import PLCStructureSplitter
+from plc_verifier.context import DEFAULT_SNIPPET_BUDGET
+from plc_verifier.indexing import IndexRegistry, build_program_index, fingerprint_settings, fingerprint_uploads
+from plc_verifier.ingestion import iter_documents
+from plc_verifier.instrumentation import Trace
+from plc_verifier.lexical import HybridRetriever
+from plc_verifier.mmr import DEFAULT_MIN_K, DEFAULT_MMR_THRESHOLD
+from plc_verifier.prompts import static_prefix_tokens, verification_prompt
+from plc_verifier.vector_index import DEFAULT_VECTOR_INDEX, search_parameters
+
+#Parser recorded in the index settings: streaming iterparse with canonical notation (v2: unknown content kept as xml)
+INDEX_PARSER = 'iterparse-canonical-v2'
+
+#Embedding backends: the OpenAI API, or hashed identifier n-grams computed locally for machines without API access
+EMBEDDING_BACKENDS = ['openai', 'local']
+
+#Uploads smaller than this are parsed on the calling thread, where starting worker processes would cost more than it saves
+MIN_PARALLEL_BYTES = 1024 * 1024
+
+
+#Export file read from disk, with the interface of the Streamlit uploaded files used by ingestion and indexing
+class ExportFile:
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def getbuffer(self):
+        return memoryview(self.data)
+
+    def getvalue(self):
+        return self.data
+
+
+#XML files of directories and glob patterns, in sorted order without duplicates
+def find_exports(patterns):
+    paths = []
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*.xml')
+        paths.extend(path for path in glob.glob(pattern, recursive = True) if os.path.isfile(path))
+
+    return sorted(dict.fromkeys(paths))
+
+
+#Export files of the paths, read by a worker pool; names are relative to the common directory so they stay stable across runs
+def read_exports(paths, workers = 4):
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ''
+
+    def read(path):
+        with open(path, 'rb') as f:
+            return ExportFile(os.path.relpath(os.path.abspath(path), root), f.read())
+
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        return list(pool.map(read, paths))
+
+
+#Process pools of the parsing workers by size, shared by all builds of the process
+_parse_pools = {}
+_parse_pools_lock = threading.Lock()
+
+
+#Workers are spawned, not forked, so they never inherit the threads and sockets of the server
+def get_parse_pool(workers):
+    with _parse_pools_lock:
+        if workers not in _parse_pools:
+            _parse_pools[workers] = ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context('spawn'))
+
+        return _parse_pools[workers]
+
+
+#Parsing, canonical notation and chunking of one file; runs in a worker process
+def parse_file(name, data, page, text_splitter):
+    return text_splitter.split_documents(canonicalize_documents(iter_documents(name, data, page)))
+
+
+#Chunks of the files in file order, with page numbering following that order
+#Large uploads are parsed by a pool of worker processes (default: one per core); progress(done, total) is called as each file completes, in order
+def parse_files(files, text_splitter, workers = None, progress = None):
+    workers = workers or os.cpu_count() or 1
+    total_bytes = sum(len(f.getbuffer()) for f in files)
+    chunks = []
+
+    if workers <= 1 or len(files) <= 1 or total_bytes < MIN_PARALLEL_BYTES:
+        results = (parse_file(f.name, f.getbuffer(), page, text_splitter) for page, f in enumerate(files, start = 1))
+    else:
+        pool = get_parse_pool(workers)
+        futures = [pool.submit(parse_file, f.name, bytes(f.getbuffer()), page, text_splitter) for page, f in enumerate(files, start = 1)]
+        results = (future.result() for future in futures)
+
+    for done, file_chunks in enumerate(results, start = 1):
+        chunks.extend(file_chunks)
+        if progress is not None:
+            progress(done, len(files))
+
+    return chunks
+
+
+#Ingestion, indexing, retrieval and verification of a program, without any user interface
+#The Streamlit app and the command-line entry point are both built on it
+class VerifierPipeline:
+
+    def __init__(self, embeddings, model, embedding_model, text_splitter = None, registry = None,
+                 snippet_budget = DEFAULT_SNIPPET_BUDGET, workers = None, embedding_backend = 'openai', vector_index = None,
+                 min_k = DEFAULT_MIN_K, mmr_threshold = DEFAULT_MMR_THRESHOLD):
+        self.embeddings = embeddings
+        self.model = model
+        self.embedding_model = embedding_model
+        self.embedding_backend = embedding_backend
+        self.vector_index = {**DEFAULT_VECTOR_INDEX, **(vector_index or {})}
+        self.min_k = min_k
+        self.mmr_threshold = mmr_threshold
+        self.text_splitter = text_splitter or PLCStructureSplitter(chunk_size = 4000)
+        self.registry = registry if registry is not None else IndexRegistry()
+        self.snippet_budget = snippet_budget
+        self.workers = workers
+
+    #Settings an index depends on; an index is reused only for the same settings
+    #The query-time knobs of the vector index (nprobe, ef_search) are not part of them
+    def settings(self):
+        return {'parser': INDEX_PARSER, 'splitter': self.text_splitter.settings(), 'embedding_model': self.embedding_model,
+                'vector_index': {key: self.vector_index[key] for key in ('kind', 'compression')}}
+
+    def fingerprint(self, files):
+        return fingerprint_uploads([(f.name, f.getbuffer()) for f in files], self.settings())
+
+    #Returns (fingerprint, ProgramIndex) of the files; only new or changed files are embedded when a base index is given
+    #progress(done, total) is called as the files to parse complete; the stages of a build are recorded in trace
+    def index(self, files, base_fingerprint = None, progress = None, trace = None):
+        trace = trace or Trace('index')
+
+        with trace.stage('fingerprint', files = len(files)):
+            fingerprint = self.fingerprint(files)
+
+        built = []
+
+        def build(base):
+            built.append(True)
+            return build_program_index(fingerprint, fingerprint_settings(self.settings()), files,
+                                       lambda to_parse: parse_files(to_parse, self.text_splitter, self.workers, progress),
+                                       self.embeddings, base = base, trace = trace,
+                                       embedding = {'backend': self.embedding_backend, 'model': self.embedding_model},
+                                       vector_index = self.vector_index)
+
+        program_index = self.registry.get_or_build(fingerprint, build, self.embeddings, base_fingerprint = base_fingerprint)
+        trace.update(fingerprint = fingerprint, built = bool(built), chunks = sum(len(entry['ids']) for entry in program_index.manifest.values()))
+
+        return fingerprint, program_index
+
+    #FAISS MMR fused with the lexical index of tags, blocks and comments and with the tag cross-reference
+    #The index is shared by every session, so nprobe and ef_search are given to each search rather than set on it
+    def retriever(self, program_index):
+        search_params = search_parameters(program_index.vectorstore.index, self.vector_index['nprobe'], self.vector_index['ef_search'])
+
+        return HybridRetriever(program_index.vectorstore, program_index.lexical_index(), k = 50, fetch_k = 100, lambda_mult = 0.25,
+                               xref = program_index.cross_reference(), vectorized = True,
+                               min_k = self.min_k, threshold = self.mmr_threshold, search_params = search_params)
+
+    def prompt(self, language, subject):
+        return verification_prompt(language, subject)
+
+    #Chain returning the answer message, whose usage metadata reports the input tokens served from the provider cache
+    def chain(self, language, subject, model = None):
+        return self.prompt(language, subject) | (model or self.model)
+
+    #Runner verifying questions or checklist requirements concurrently against the program index
+    def checklist_runner(self, program_index, language, subject, model = None, **options):
+        return ChecklistRunner(self.chain(language, subject, model), self.retriever(program_index), self.snippet_budget,
+                               instruction_tokens = static_prefix_tokens(language), **options)
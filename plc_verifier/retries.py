@@ -0,0 +1,7 @@
+import openai
+
+#Retries of a request to the OpenAI API, after the first attempt
+DEFAULT_RETRIES = 5
+
+#Errors worth retrying: rate limits, timeouts, dropped connections and server errors
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
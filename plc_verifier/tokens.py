@@ -0,0 +1,35 @@
+from functools import lru_cache
+
+import tiktoken
+
+#Tokenizer of gpt-4o, and of the text-embedding-3 models
+DEFAULT_ENCODING = 'o200k_base'
+EMBEDDING_ENCODING = 'cl100k_base'
+
+
+#Tokenizer loaded once per process, None when its files cannot be fetched (air-gapped machines)
+@lru_cache(maxsize = None)
+def get_encoding(name = DEFAULT_ENCODING):
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+#Number of tokens of a text, estimated as 4 characters per token when the tokenizer is not available
+def count_tokens(text, encoding_name = DEFAULT_ENCODING):
+    encoding = get_encoding(encoding_name)
+
+    if encoding is None:
+        return (len(text) + 3) // 4
+
+    return len(encoding.encode(text, disallowed_special = ()))
+
+
+#Input, output and provider-cached input tokens of a model call, from the usage metadata of its message
+def usage_tokens(usage_metadata):
+    usage_metadata = usage_metadata or {}
+    details = usage_metadata.get('input_token_details') or {}
+
+    return {'input': usage_metadata.get('input_tokens', 0), 'output': usage_metadata.get('output_tokens', 0),
+            'cached': details.get('cache_read', 0) or 0}
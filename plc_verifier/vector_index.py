@@ -0,0 +1,141 @@
+import math
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+#Index types and vector compressions of the FAISS factory; auto picks the type from the number of chunks
+INDEX_KINDS = ['auto', 'flat', 'hnsw', 'ivf']
+COMPRESSIONS = ['none', 'fp16', 'pq']
+
+#Largest corpora searched exhaustively, and with an HNSW graph; larger ones use an inverted file
+FLAT_MAX_VECTORS = 20000
+HNSW_MAX_VECTORS = 200000
+
+#Graph degree and construction beam of HNSW; the search beam has to stay above the fetch_k of the MMR search
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_EF_SEARCH = 128
+
+#Lists probed per IVF query, and training points per list (FAISS warns below 39)
+DEFAULT_NPROBE = 16
+TRAINING_POINTS_PER_LIST = 64
+MAX_TRAINING_POINTS = 100000
+
+#Dimensions per product-quantizer code byte, and vectors needed to train a PQ with 256 centroids per sub-space
+PQ_DIMENSIONS_PER_BYTE = 16
+PQ_MIN_VECTORS = 256 * 39
+
+DEFAULT_VECTOR_INDEX = {'kind': 'auto', 'compression': 'none', 'nprobe': DEFAULT_NPROBE, 'ef_search': DEFAULT_EF_SEARCH}
+
+
+def resolve_kind(kind, count):
+    if kind != 'auto':
+        return kind
+    if count <= FLAT_MAX_VECTORS:
+        return 'flat'
+    if count <= HNSW_MAX_VECTORS:
+        return 'hnsw'
+    return 'ivf'
+
+
+#Number of IVF lists: about 4 sqrt(n), with enough vectors per list to train the centroids
+def ivf_lists(count):
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+#Sub-quantizers of a PQ: one byte per PQ_DIMENSIONS_PER_BYTE dimensions, dividing the dimensions
+def pq_subquantizers(dimensions):
+    m = max(1, dimensions // PQ_DIMENSIONS_PER_BYTE)
+    while dimensions % m:
+        m -= 1
+    return m
+
+
+#FAISS factory string and the compression actually used: PQ needs enough vectors to train, fp16 is used below that
+def factory_string(kind, compression, count, dimensions):
+    if compression == 'pq' and count < PQ_MIN_VECTORS:
+        compression = 'fp16'
+
+    codes = {'none': 'Flat', 'fp16': 'SQfp16', 'pq': f'PQ{pq_subquantizers(dimensions)}'}[compression]
+
+    if kind == 'flat':
+        return codes, compression
+    if kind == 'hnsw':
+        return (f'HNSW{HNSW_M}' if compression == 'none' else f'HNSW{HNSW_M},{codes}'), compression
+
+    return f'IVF{ivf_lists(count)},{codes}', compression
+
+
+#Sets the default query-time knobs of recall against latency (lists probed by IVF, search beam of HNSW) of an index
+#that is not shared yet; shared indexes are searched with search_parameters instead
+def tune_index(index, nprobe = None, ef_search = None):
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass
+
+    if ef_search is not None and hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = ef_search
+
+
+#Query-time knobs of one search, passed to index.search without changing the index shared by the sessions
+#Returns None for indexes without knobs (flat)
+def search_parameters(index, nprobe = None, ef_search = None):
+    if hasattr(index, 'hnsw'):
+        return faiss.SearchParametersHNSW(efSearch = ef_search) if ef_search is not None else None
+
+    try:
+        faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+    return faiss.SearchParametersIVF(nprobe = nprobe) if nprobe is not None else None
+
+
+#Trained and filled FAISS index of the vectors (float32, one per row) with its description
+#{'kind', 'compression', 'factory', 'nprobe', 'ef_search'}; options are those of DEFAULT_VECTOR_INDEX
+def build_faiss_index(vectors, options = None, seed = 0):
+    options = {**DEFAULT_VECTOR_INDEX, **(options or {})}
+    count, dimensions = vectors.shape
+    kind = resolve_kind(options['kind'], count)
+    factory, compression = factory_string(kind, options['compression'], count, dimensions)
+
+    index = faiss.index_factory(dimensions, factory, faiss.METRIC_L2)
+
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    #Training on a random sample, enough for the IVF centroids and PQ codebooks
+    if not index.is_trained:
+        lists = ivf_lists(count) if kind == 'ivf' else 1
+        sample_size = min(count, max(TRAINING_POINTS_PER_LIST * lists, PQ_MIN_VECTORS), MAX_TRAINING_POINTS)
+        sample = np.random.default_rng(seed).choice(count, sample_size, replace = False)
+        index.train(vectors[np.sort(sample)])
+
+    index.add(vectors)
+
+    #MMR reconstructs the fetched vectors by id, which IVF only supports with a direct map
+    if kind == 'ivf':
+        faiss.extract_index_ivf(index).make_direct_map()
+
+    tune_index(index, options['nprobe'], options['ef_search'])
+
+    return index, {'kind': kind, 'compression': compression, 'factory': factory, 'nprobe': options['nprobe'],
+                   'ef_search': options['ef_search']}
+
+
+#Bytes of the serialized index, close to its size in memory
+def index_bytes(index):
+    return int(faiss.serialize_index(index).size)
+
+
+#LangChain FAISS vectorstore over an index built by build_faiss_index, with the chunks in the order of the vectors
+def build_vectorstore(texts, vectors, metadatas, ids, embeddings, options = None):
+    index, spec = build_faiss_index(np.asarray(vectors, dtype = np.float32), options)
+    docstore = InMemoryDocstore({id_: Document(page_content = text, metadata = metadata) for id_, text, metadata in zip(ids, texts, metadatas)})
+
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids))), spec
@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+
+from plc_verifier.context import snippet_group
+
+
+#Label of a network for listings: file, block and network number
+def network_label(metadata):
+    label = [metadata.get('source', ''), metadata.get('block', '')]
+    if 'network' in metadata:
+        label.append(f"NW{metadata['network']}")
+        if metadata.get('title'):
+            label.append(f"\"{metadata['title']}\"")
+    return ' '.join(value for value in label if value)
+
+
+#Offsets/values arrays (CSR layout) of the networks of each tag
+def compressed(rows, count):
+    offsets = np.zeros(count + 1, dtype = np.int64)
+    for tag_id, _ in rows:
+        offsets[tag_id + 1] += 1
+    offsets = np.cumsum(offsets)
+
+    values = np.zeros(len(rows), dtype = np.int32)
+    cursor = offsets[:-1].copy()
+    for tag_id, network in rows:
+        values[cursor[tag_id]] = network
+        cursor[tag_id] += 1
+
+    return offsets, values
+
+
+#Cross-reference of the uploaded program: for each tag, the networks where it is read and written
+#Tags are mapped to integer ids once and the networks are held in CSR arrays, so a lookup is a dict access and two slices
+class CrossReference:
+
+    def __init__(self, ids, docs):
+        self.tag_ids = {}
+        self.tags = []
+        self.networks = []
+        self.network_chunks = []
+        network_ids = {}
+        read_rows = []
+        write_rows = []
+
+        for id_, doc in zip(ids, docs):
+            key = snippet_group(doc.metadata)
+
+            if key not in network_ids:
+                network_ids[key] = len(self.networks)
+                self.networks.append(doc.metadata)
+                self.network_chunks.append([])
+
+                for rows, names in ((read_rows, doc.metadata.get('reads', [])), (write_rows, doc.metadata.get('writes', []))):
+                    for name in names:
+                        rows.append((self._tag_id(name), network_ids[key]))
+
+            self.network_chunks[network_ids[key]].append((id_, doc))
+
+        self.read_offsets, self.read_networks = compressed(read_rows, len(self.tags))
+        self.write_offsets, self.write_networks = compressed(write_rows, len(self.tags))
+
+    def _tag_id(self, name):
+        lower = name.lower()
+        if lower not in self.tag_ids:
+            self.tag_ids[lower] = len(self.tags)
+            self.tags.append(name)
+        return self.tag_ids[lower]
+
+    #Network indexes reading and writing a tag
+    def lookup(self, tag):
+        tag_id = self.tag_ids.get(tag.lower())
+
+        if tag_id is None:
+            return [], []
+
+        reads = self.read_networks[self.read_offsets[tag_id]:self.read_offsets[tag_id + 1]]
+        writes = self.write_networks[self.write_offsets[tag_id]:self.write_offsets[tag_id + 1]]
+
+        return reads.tolist(), writes.tolist()
+
+    #Chunks of the networks touching the tags, writers first
+    def documents_for(self, tags):
+        networks = {}
+
+        for tag in tags:
+            reads, writes = self.lookup(tag)
+            networks.update(dict.fromkeys(writes + reads))
+
+        return [doc for network in networks for _, doc in self.network_chunks[network]]
+
+    #Statements of the networks reading and writing a tag, for display without any LLM call
+    def describe(self, tag):
+        reads, writes = self.lookup(tag)
+        pattern = re.compile(rf'(?<![\w.]){re.escape(tag)}(?!\w)', re.IGNORECASE)
+        result = {'written': [], 'read': []}
+
+        for kind, networks in (('written', writes), ('read', reads)):
+            for network in networks:
+                lines = [line for _, doc in self.network_chunks[network]
+                         for line in doc.page_content.splitlines()[1:] if pattern.search(line)]
+                result[kind].append({'network': network_label(self.networks[network]), 'statements': lines})
+
+        return result
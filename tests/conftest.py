@@ -0,0 +1,24 @@
+import pytest
+from langchain_openai import ChatOpenAI
+
+from plc_verifier.batch_embeddings import BatchedOpenAIEmbeddings
+from plc_verifier.fake_openai import FakeOpenAIServer
+from plc_verifier.indexing import IndexRegistry
+from plc_verifier.pipeline import VerifierPipeline
+
+
+#Stand-in for the OpenAI API, shared by the tests of the session
+@pytest.fixture(scope = 'session')
+def fake_server():
+    server = FakeOpenAIServer(port = 0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pipeline(fake_server, tmp_path):
+    embeddings = BatchedOpenAIEmbeddings('text-embedding-3-small', 'test', base_url = fake_server.base_url)
+    model = ChatOpenAI(model = 'gpt-4o', api_key = 'test', base_url = fake_server.base_url, temperature = 0, max_retries = 0)
+
+    return VerifierPipeline(embeddings, model, 'text-embedding-3-small', registry = IndexRegistry(str(tmp_path / 'indexes')), workers = 1)
@@ -0,0 +1,27 @@
+from benchmarks.synthetic_export import FLGNET_NS, SCL_NS, STL_NS
+
+#Namespaces of the network sources, by programming language of the block
+SOURCE_NAMESPACES = {'LAD': FLGNET_NS, 'FBD': FLGNET_NS, 'STL': STL_NS, 'SCL': SCL_NS}
+
+
+#Openness export of one FC whose networks are given as the inner xml of their network source
+def export(language, *networks, block = 'FC_Test'):
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<Document>', '<SW.Blocks.FC ID="0">', '<AttributeList>',
+             f'<Name>{block}</Name>', f'<ProgrammingLanguage>{language}</ProgrammingLanguage>', '</AttributeList>', '<ObjectList>']
+    root = {'LAD': 'FlgNet', 'FBD': 'FlgNet', 'STL': 'StatementList', 'SCL': 'StructuredText'}[language]
+
+    for number, source in enumerate(networks, start = 1):
+        lines += [f'<SW.Blocks.CompileUnit ID="{number:X}" CompositionName="CompileUnits">', '<AttributeList>', '<NetworkSource>',
+                  f'<{root} xmlns="{SOURCE_NAMESPACES[language]}">', source, f'</{root}>', '</NetworkSource>',
+                  f'<ProgrammingLanguage>{language}</ProgrammingLanguage>', '</AttributeList>', '</SW.Blocks.CompileUnit>']
+
+    lines += ['</ObjectList>', '</SW.Blocks.FC>', '</Document>']
+
+    return '\n'.join(lines).encode('utf-8')
+
+
+#STL network assigning output from the AND of two inputs
+def stl(first, second, output):
+    return ''.join(f'<StlStatement UId="{21 + offset}"><StlToken Text="{instruction}" UId="{31 + offset}" />'
+                   f'<Access Scope="GlobalVariable" UId="{41 + offset}"><Symbol><Component Name="{tag}" /></Symbol></Access></StlStatement>'
+                   for offset, (instruction, tag) in enumerate([('A', first), ('A', second), ('=', output)]))
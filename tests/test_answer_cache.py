@@ -0,0 +1,24 @@
+from plc_verifier.answer_cache import AnswerCache, answer_scope
+
+VECTOR = [0.6, 0.8, 0.0]
+
+
+def test_exact_match_ignores_case_and_punctuation(tmp_path):
+    cache = AnswerCache(str(tmp_path / 'answers.sqlite'))
+    scope = answer_scope('corpus', 'LAD', 'tank')
+    cache.put(scope, 'Does Pump_1 run?', 'Yes')
+
+    assert cache.get(scope, '  does pump_1 RUN ')['match'] == 'exact'
+    assert cache.get(answer_scope('other corpus', 'LAD', 'tank'), 'Does Pump_1 run?') is None
+
+
+#A similar query is only served the answer of a query naming the same tags
+def test_similar_match_requires_the_same_identifiers(tmp_path):
+    cache = AnswerCache(str(tmp_path / 'answers.sqlite'))
+    scope = answer_scope('corpus', 'LAD', 'tank')
+    cache.put(scope, 'Does Pump_1 run only above Level_1?', 'Yes', embedding = VECTOR)
+
+    assert cache.get(scope, 'Does Pump_2 run only above Level_1?', embedding = VECTOR) is None
+
+    found = cache.get(scope, 'Is Pump_1 running only when above Level_1?', embedding = VECTOR)
+    assert (found['match'], found['answer']) == ('similar', 'Yes')
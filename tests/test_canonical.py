@@ -0,0 +1,101 @@
+import pytest
+
+from plc_verifier.canonical import canonicalize_documents
+from plc_verifier.chunking import PLCStructureSplitter
+from plc_verifier.ingestion import iter_documents
+from tests.exports import export
+
+#Start AND NOT Stop driving Motor, in each language
+LADDER = '''<Parts>
+<Access Scope="GlobalVariable" UId="21"><Symbol><Component Name="Start" /></Symbol></Access>
+<Access Scope="GlobalVariable" UId="22"><Symbol><Component Name="Stop" /></Symbol></Access>
+<Access Scope="GlobalVariable" UId="23"><Symbol><Component Name="Motor" /></Symbol></Access>
+<Part Name="Contact" UId="24" />
+<Part Name="Contact" UId="25"><Negated Name="operand" /></Part>
+<Part Name="Coil" UId="26" />
+</Parts>
+<Wires>
+<Wire UId="27"><Powerrail /><NameCon UId="24" Name="in" /></Wire>
+<Wire UId="28"><IdentCon UId="21" /><NameCon UId="24" Name="operand" /></Wire>
+<Wire UId="29"><IdentCon UId="22" /><NameCon UId="25" Name="operand" /></Wire>
+<Wire UId="30"><NameCon UId="24" Name="out" /><NameCon UId="25" Name="in" /></Wire>
+<Wire UId="31"><NameCon UId="25" Name="out" /><NameCon UId="26" Name="in" /></Wire>
+<Wire UId="32"><IdentCon UId="23" /><NameCon UId="26" Name="operand" /></Wire>
+</Wires>'''
+
+FBD = '''<Parts>
+<Access Scope="GlobalVariable" UId="21"><Symbol><Component Name="Start" /></Symbol></Access>
+<Access Scope="GlobalVariable" UId="22"><Symbol><Component Name="Stop" /></Symbol></Access>
+<Access Scope="GlobalVariable" UId="23"><Symbol><Component Name="Motor" /></Symbol></Access>
+<Access Scope="GlobalVariable" UId="24"><Symbol><Component Name="Lamp" /></Symbol></Access>
+<Access Scope="LiteralConstant" UId="25"><Constant><ConstantType>Time</ConstantType><ConstantValue>T#500MS</ConstantValue></Constant></Access>
+<Part Name="A" UId="26"><TemplateValue Name="Card" Type="Cardinality">2</TemplateValue><Negated Name="in2" /></Part>
+<Part Name="TON" Version="1.0" UId="27"><Instance Scope="LocalVariable" UId="28"><Component Name="Delay" /></Instance></Part>
+<Part Name="Coil" UId="29" />
+</Parts>
+<Wires>
+<Wire UId="30"><IdentCon UId="21" /><NameCon UId="26" Name="in1" /></Wire>
+<Wire UId="31"><IdentCon UId="22" /><NameCon UId="26" Name="in2" /></Wire>
+<Wire UId="32"><NameCon UId="26" Name="out" /><NameCon UId="27" Name="IN" /><NameCon UId="29" Name="in" /></Wire>
+<Wire UId="33"><IdentCon UId="25" /><NameCon UId="27" Name="PT" /></Wire>
+<Wire UId="34"><NameCon UId="27" Name="Q" /><IdentCon UId="24" /></Wire>
+<Wire UId="35"><IdentCon UId="23" /><NameCon UId="29" Name="operand" /></Wire>
+</Wires>'''
+
+STL = '''<StlStatement UId="21"><StlToken Text="A" UId="22" /><Access Scope="GlobalVariable" UId="23"><Symbol><Component Name="Start" /></Symbol></Access></StlStatement>
+<StlStatement UId="24"><StlToken Text="AN" UId="25" /><Access Scope="GlobalVariable" UId="26"><Symbol><Component Name="Stop" /></Symbol></Access></StlStatement>
+<StlStatement UId="27"><StlToken Text="=" UId="28" /><Access Scope="GlobalVariable" UId="29"><Symbol><Component Name="Motor" /></Symbol></Access></StlStatement>'''
+
+SCL = '''<Token Text="IF" UId="21" /><Blank UId="22" />
+<Access Scope="GlobalVariable" UId="23"><Symbol><Component Name="Start" /></Symbol></Access>
+<Blank UId="24" /><Token Text="AND" UId="25" /><Blank UId="26" /><Token Text="NOT" UId="27" /><Blank UId="28" />
+<Access Scope="GlobalVariable" UId="29"><Symbol><Component Name="Stop" /></Symbol></Access>
+<Blank UId="30" /><Token Text="THEN" UId="31" /><NewLine UId="32" />
+<Access Scope="GlobalVariable" UId="33"><Symbol><Component Name="Motor" /></Symbol></Access>
+<Blank UId="34" /><Token Text=":=" UId="35" /><Blank UId="36" /><Token Text="TRUE" UId="37" /><Token Text=";" UId="38" /><NewLine UId="39" />
+<Token Text="END_IF" UId="40" /><Token Text=";" UId="41" />'''
+
+
+def network(language, source):
+    docs = canonicalize_documents(iter_documents('test.xml', export(language, source), 1))
+    return next(doc for doc in docs if doc.metadata.get('section') == 'network')
+
+
+@pytest.mark.parametrize('language, source, statements, writes', [
+    ('LAD', LADDER, ['Coil(Motor) <- AND(Start, NOT(Stop))'], ['Motor']),
+    ('FBD', FBD, ['Delay: TON(IN=AND(Start, NOT(Stop)), PT=T#500MS) -> Q: Lamp', 'Coil(Motor) <- AND(Start, NOT(Stop))'], ['Lamp', 'Motor']),
+    ('STL', STL, ['A Start', 'AN Stop', '= Motor'], ['Motor']),
+    ('SCL', SCL, ['IF Start AND NOT Stop THEN', 'Motor := TRUE;', 'END_IF;'], ['Motor']),
+])
+def test_reads_and_writes_per_language(language, source, statements, writes):
+    doc = network(language, source)
+
+    assert doc.page_content.splitlines()[1:] == statements
+    assert doc.metadata['reads'] == ['Start', 'Stop']
+    assert doc.metadata['writes'] == writes
+
+
+#The canonical text does not depend on the UIds, which TIA Portal renumbers on export
+@pytest.mark.parametrize('language, source', [('LAD', LADDER), ('FBD', FBD), ('STL', STL), ('SCL', SCL)])
+def test_canonical_text_ignores_uids(language, source):
+    renumbered = source
+    for uid in range(41, 20, -1):
+        renumbered = renumbered.replace(f'UId="{uid}"', f'UId="{uid + 100}"')
+
+    assert network(language, renumbered).page_content == network(language, source).page_content
+
+
+#Exports without code (tag tables, data types) stay xml, so large ones are still split between elements
+def test_unknown_content_is_split_between_elements():
+    tags = ''.join(f'''
+    <SW.Tags.PlcTag ID="{number}" CompositionName="Tags">
+      <AttributeList><DataTypeName>Bool</DataTypeName><LogicalAddress>%I{number // 8}.{number % 8}</LogicalAddress><Name>Input_{number}</Name></AttributeList>
+    </SW.Tags.PlcTag>''' for number in range(200))
+    data = f'<Document><SW.Tags.PlcTagTable ID="0"><AttributeList><Name>Inputs</Name></AttributeList><ObjectList>{tags}</ObjectList></SW.Tags.PlcTagTable></Document>'
+
+    docs = canonicalize_documents(iter_documents('tags.xml', data.encode('utf-8'), 1))
+    chunks = PLCStructureSplitter(chunk_size = 4000).split_documents(docs)
+
+    assert len(chunks) > 1
+    assert all(chunk.page_content.count('<SW.Tags.PlcTag ') == chunk.page_content.count('</SW.Tags.PlcTag>') for chunk in chunks)
+    assert sum(chunk.page_content.count('<Name>Input_') for chunk in chunks) == 200
@@ -0,0 +1,37 @@
+from plc_verifier.pipeline import ExportFile
+from tests.exports import export, stl
+
+REQUIREMENTS = [{'id': 'R1', 'text': 'Does Pump run only above Level?'}, {'id': 'R2', 'text': 'Is Lamp on while Pump runs?'}]
+
+
+def runner(pipeline):
+    _, program_index = pipeline.index([ExportFile('a.xml', export('STL', stl('Motor', 'Level', 'Pump'), stl('Pump', 'Flow', 'Lamp'), block = 'FC_A'))])
+    return pipeline.checklist_runner(program_index, 'STL', 'tank')
+
+
+#The async client of the model is bound to the loop of its first run, so later runs must not start a new one
+def test_consecutive_runs_share_the_model(pipeline):
+    checklist = runner(pipeline)
+
+    for _ in range(2):
+        results = checklist.run(REQUIREMENTS)
+        assert [result['error'] for result in results] == [None, None]
+        assert [result['verdict'] for result in results] == ['Met', 'Met']
+
+
+class FailingRetriever:
+
+    def search(self, query):
+        raise ConnectionError('index unavailable')
+
+
+def test_failed_retrieval_is_an_error_verdict(pipeline):
+    checklist = runner(pipeline)
+    checklist.retriever = FailingRetriever()
+    reported = []
+
+    results = checklist.run(REQUIREMENTS, on_result = reported.append)
+
+    assert [result['verdict'] for result in results] == ['Error', 'Error']
+    assert all('index unavailable' in result['error'] for result in results)
+    assert sorted(result['id'] for result in reported) == ['R1', 'R2']
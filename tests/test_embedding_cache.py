@@ -0,0 +1,27 @@
+from plc_verifier.embedding_cache import CachedEmbeddings, EmbeddingCache
+from plc_verifier.pipeline import ExportFile
+from tests.exports import export, stl
+
+
+def test_only_missing_texts_are_embedded(pipeline, tmp_path):
+    embeddings = CachedEmbeddings(pipeline.embeddings, 'text-embedding-3-small', EmbeddingCache(str(tmp_path / 'embeddings.sqlite')))
+
+    first = embeddings.embed_documents(['A Start', 'A Stop', 'A Start'])
+    second = embeddings.embed_documents(['A Stop', 'A Level'])
+
+    assert second[0] == first[1]
+    assert (embeddings.hits, embeddings.misses) == (2, 3)
+    assert embeddings.stats()['entries'] == 3
+
+
+#Queries are embedded by the wrapper the index was built with, so its counters follow the chat queries of later reruns
+def test_queries_are_counted_on_the_wrapper_of_the_index(pipeline, tmp_path):
+    pipeline.embeddings = CachedEmbeddings(pipeline.embeddings, 'text-embedding-3-small', EmbeddingCache(str(tmp_path / 'embeddings.sqlite')))
+    _, program_index = pipeline.index([ExportFile('a.xml', export('STL', stl('Start', 'Door', 'Motor'), stl('Motor', 'Level', 'Pump')))])
+    retriever = pipeline.retriever(program_index)
+
+    for _ in range(2):
+        retriever.search('Is the pump started above the level?')
+
+    assert program_index.vectorstore.embeddings is pipeline.embeddings
+    assert (pipeline.embeddings.query_hits, pipeline.embeddings.query_misses) == (1, 1)
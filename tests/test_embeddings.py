@@ -0,0 +1,80 @@
+import numpy as np
+import openai
+import pytest
+
+from plc_verifier.batch_embeddings import BatchedOpenAIEmbeddings, parse_duration, token_batches
+from plc_verifier.embedding_cache import CachedEmbeddings, EmbeddingCache
+from plc_verifier.fake_openai import FakeOpenAIServer, fake_embedding
+
+TEXTS = [f'A Tag_{number} A Input_{number} = Output_{number} ' * 20 for number in range(60)]
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**options):
+        servers.append(FakeOpenAIServer(port = 0, **options).start())
+        return servers[-1]
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def embeddings(server, **options):
+    return BatchedOpenAIEmbeddings('text-embedding-3-small', 'test', base_url = server.base_url, batch_tokens = 800, **options)
+
+
+def test_token_batches():
+    assert token_batches([300, 300, 300, 900, 100], max_tokens = 800) == [[0, 1], [2], [3], [4]]
+    assert token_batches([1] * 5, max_items = 2) == [[0, 1], [2, 3], [4]]
+    assert token_batches([]) == []
+
+
+def test_parse_duration():
+    assert [parse_duration(value) for value in ['1.5', '20ms', '6m0s', '1h', None, 'soon']] == [1.5, 0.02, 360.0, 3600.0, None, None]
+
+
+#A single request at a time learns the quota from the headers and waits for its reset instead of being refused
+def test_quota_is_waited_for(start_server):
+    server = start_server(tokens_per_minute = 3000, window = 0.5)
+    batched = embeddings(server, parallelism = 1)
+
+    vectors = batched.embed_documents(TEXTS)
+
+    assert np.allclose(vectors, [fake_embedding(text) for text in TEXTS], atol = 1e-6)
+    assert batched.last_report['batches'] > 3 and batched.last_report['retries'] == 0
+    assert server.requests['rate_limited'] == 0
+
+
+#Parallel requests overrun the quota; the 429s are retried after their Retry-After and every vector arrives
+def test_rate_limits_are_retried(start_server):
+    server = start_server(tokens_per_minute = 3000, window = 0.5)
+    batched = embeddings(server, parallelism = 4)
+
+    vectors = batched.embed_documents(TEXTS)
+
+    assert np.allclose(vectors, [fake_embedding(text) for text in TEXTS], atol = 1e-6)
+    assert batched.last_report['retries'] == server.requests['rate_limited'] > 0
+    assert batched.last_report['chunks'] == len(TEXTS)
+
+
+#The batches completed before a failure are cached, so the next run only sends the others
+def test_failed_run_resumes_from_the_cache(start_server, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'))
+    exhausted = start_server(tokens_per_minute = 3000, window = 2.0)
+
+    with pytest.raises(openai.RateLimitError):
+        CachedEmbeddings(embeddings(exhausted, parallelism = 4, retries = 0), 'text-embedding-3-small', cache).embed_documents(TEXTS)
+
+    stored = cache.size()['entries']
+    assert 0 < stored < len(TEXTS)
+
+    resumed = CachedEmbeddings(embeddings(start_server()), 'text-embedding-3-small', cache)
+    vectors = resumed.embed_documents(TEXTS)
+
+    assert (resumed.hits, resumed.misses) == (stored, len(TEXTS) - stored)
+    assert np.allclose(vectors, [fake_embedding(text) for text in TEXTS], atol = 1e-6)
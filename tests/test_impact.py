@@ -0,0 +1,107 @@
+from plc_verifier.answer_cache import AnswerCache, answer_scope
+from plc_verifier.canonical import canonicalize_documents
+from plc_verifier.checklist import requirement_query
+from plc_verifier.impact import diff_networks, impacted_networks, network_table, store_answers, verify_changes
+from plc_verifier.ingestion import iter_documents
+from plc_verifier.pipeline import ExportFile
+from tests.exports import export, stl
+
+BASELINE = [stl('Start_1', 'Door_1', 'Motor_1'), stl('Motor_1', 'Level_1', 'Pump_1'), stl('Pump_1', 'Flow_1', 'Lamp_1')]
+
+
+def table(*networks, uid_offset = 0):
+    data = export('STL', *networks, block = 'FC_A').decode('utf-8')
+    for uid in range(43, 20, -1):
+        data = data.replace(f'UId="{uid}"', f'UId="{uid + uid_offset}"')
+
+    return network_table(canonicalize_documents(iter_documents('a.xml', data.encode('utf-8'), 1)))
+
+
+def test_renumbered_uids_and_whitespace_are_not_changes():
+    baseline = table(*BASELINE)
+    revised = table(*(network.replace('><', '>\n  <') for network in BASELINE), uid_offset = 500)
+
+    diff = diff_networks(baseline, revised)
+
+    assert diff['changed'] == diff['added'] == diff['removed'] == []
+    assert sorted(diff['unchanged']) == [(key, key) for key in sorted(baseline)]
+
+
+#A network inserted in front shifts the numbers of the following ones, which are still matched by content
+def test_inserted_network_does_not_change_the_following_ones():
+    baseline = table(*BASELINE)
+    revised = table(stl('Estop_1', 'Guard_1', 'Enable_1'), *BASELINE)
+
+    diff = diff_networks(baseline, revised)
+
+    assert diff['added'] == ['a.xml:FC_A/network/1']
+    assert diff['changed'] == diff['removed'] == []
+    assert sorted(diff['unchanged']) == [('a.xml:FC_A/network/1', 'a.xml:FC_A/network/2'), ('a.xml:FC_A/network/2', 'a.xml:FC_A/network/3'),
+                                         ('a.xml:FC_A/network/3', 'a.xml:FC_A/network/4')]
+
+
+#The readers of the tags written by a changed network are impacted, the other networks are not
+def test_readers_of_changed_writes_are_impacted():
+    baseline = table(*BASELINE)
+    revised = table(BASELINE[0], stl('Motor_1', 'Pressure_1', 'Pump_1'), BASELINE[2])
+
+    diff = diff_networks(baseline, revised)
+    impacted_old, impacted_new = impacted_networks(baseline, revised, diff)
+
+    assert diff['changed'] == [('a.xml:FC_A/network/2', 'a.xml:FC_A/network/2')]
+    assert impacted_new == impacted_old == {'a.xml:FC_A/network/2', 'a.xml:FC_A/network/3'}
+    assert impacted_networks(baseline, revised, diff, depth = 0)[1] == {'a.xml:FC_A/network/2'}
+
+
+#Block names repeat across files, as the Main OB of each CPU; a change in one file is not attributed to the other
+def test_same_block_in_several_files():
+    def cpu_table(*cpus):
+        docs = []
+        for page, (name, networks) in enumerate(cpus, start = 1):
+            docs.extend(canonicalize_documents(iter_documents(name, export('STL', *networks, block = 'Main'), page)))
+        return network_table(docs)
+
+    cpu1 = ('cpu1/Main.xml', [stl('A_1', 'B_1', 'C_1')])
+    baseline = cpu_table(cpu1, ('cpu2/Main.xml', [stl('A_2', 'B_2', 'C_2'), stl('C_2', 'D_2', 'E_2')]))
+    revised = cpu_table(cpu1, ('cpu2/Main.xml', [stl('A_2', 'X_2', 'C_2'), stl('C_2', 'D_2', 'E_2')]))
+
+    assert baseline['cpu1/Main.xml:Main/network/1']['reads'] == {'A_1', 'B_1'}
+    assert baseline['cpu2/Main.xml:Main/network/1']['reads'] == {'A_2', 'B_2'}
+
+    diff = diff_networks(baseline, revised)
+
+    assert diff['changed'] == [('cpu2/Main.xml:Main/network/1', 'cpu2/Main.xml:Main/network/1')]
+    assert revised['cpu2/Main.xml:Main/network/1']['label'] == 'cpu2/Main.xml Main NW1'
+    assert impacted_networks(baseline, revised, diff)[1] == {'cpu2/Main.xml:Main/network/1', 'cpu2/Main.xml:Main/network/2'}
+
+    #Identical files exporting the same block are all unchanged
+    copies = cpu_table(cpu1, ('cpu2/Main.xml', [stl('A_1', 'B_1', 'C_1')]), ('cpu3/Main.xml', [stl('A_1', 'B_1', 'C_1')]))
+    assert len(diff_networks(copies, copies)['unchanged']) == 3
+
+
+def test_only_impacted_requirements_are_verified_again(pipeline, tmp_path):
+    #Small corpus: one snippet per requirement is enough to tell the networks apart
+    pipeline.min_k = 1
+    block_b = ExportFile('b.xml', export('STL', stl('Fault_1', 'Reset_1', 'Alarm_1'), stl('Alarm_1', 'Ack_1', 'Horn_1'), block = 'FC_B'))
+    revised_a = ExportFile('a.xml', export('STL', BASELINE[0], stl('Motor_1', 'Pressure_1', 'Pump_1'), BASELINE[2], block = 'FC_A'))
+    requirements = [{'id': 'R1', 'text': 'Does Pump_1 run only above Level_1?'},
+                    {'id': 'R2', 'text': 'Is Horn_1 sounded when Alarm_1 is active?'}]
+    answer_cache = AnswerCache(str(tmp_path / 'answers.sqlite'))
+
+    baseline = pipeline.index([ExportFile('a.xml', export('STL', *BASELINE, block = 'FC_A')), block_b])
+    results = pipeline.checklist_runner(baseline[1], 'STL', 'tank').run(requirements)
+    store_answers(answer_cache, answer_scope(baseline[0], 'STL', 'tank'), requirements, results)
+
+    revised = pipeline.index([revised_a, block_b], base_fingerprint = baseline[0])
+    impact = verify_changes(pipeline, baseline, revised, requirements, 'STL', 'tank', answer_cache)
+
+    assert impact['changes'] == {'added': [], 'removed': [], 'changed': ['a.xml FC_A NW2'], 'unchanged': 4}
+    assert [entry['id'] for entry in impact['reverified']] == ['R1']
+    assert impact['reused'] == ['R2']
+    assert impact['tokens']['saved'] > 0
+    assert [result['verdict'] for result in impact['results']] == ['Met', 'Met']
+
+    #The revised answers are stored, so the revision is the baseline of the next change
+    stored = answer_cache.get(answer_scope(revised[0], 'STL', 'tank'), requirement_query(requirements[0]))
+    assert stored['details']['checklist']['verdict'] == 'Met'
+    assert verify_changes(pipeline, revised, revised, requirements, 'STL', 'tank', answer_cache)['reused'] == ['R1', 'R2']
@@ -0,0 +1,55 @@
+from plc_verifier.indexing import IndexRegistry
+from plc_verifier.pipeline import ExportFile
+from tests.exports import export, stl
+
+BASELINE = [
+    ExportFile('a.xml', export('STL', stl('Start', 'Door', 'Motor'), stl('Motor', 'Level', 'Pump'), stl('Pump', 'Flow', 'Lamp'), block = 'FC_A')),
+    ExportFile('b.xml', export('STL', stl('Fault', 'Reset', 'Alarm'), stl('Alarm', 'Ack', 'Horn'), block = 'FC_B')),
+]
+
+#a.xml with its second network changed, b.xml removed and c.xml added
+REVISED = [
+    ExportFile('a.xml', export('STL', stl('Start', 'Door', 'Motor'), stl('Motor', 'Pressure', 'Pump'), stl('Pump', 'Flow', 'Lamp'), block = 'FC_A')),
+    ExportFile('c.xml', export('STL', stl('Estop', 'Guard', 'Enable'), block = 'FC_C')),
+]
+
+
+def chunk_count(program_index):
+    return sum(len(entry['ids']) for entry in program_index.manifest.values())
+
+
+def test_incremental_update_counts(pipeline):
+    baseline_fingerprint, baseline = pipeline.index(BASELINE)
+    assert chunk_count(baseline) == 5
+
+    _, revised = pipeline.index(REVISED, base_fingerprint = baseline_fingerprint)
+
+    #Only the changed and new files are parsed; the unchanged networks of a.xml keep their vectors
+    assert revised.update_stats == {'files_parsed': 2, 'chunks_added': 2, 'chunks_removed': 3, 'chunks_kept': 2}
+    assert chunk_count(revised) == revised.vectorstore.index.ntotal == 4
+    assert list(revised.manifest) == ['a.xml', 'c.xml']
+
+    texts = [doc.page_content for _, doc in revised.documents()]
+    assert any('A Pressure' in text for text in texts)
+    assert not any('A Level' in text or 'Alarm' in text for text in texts)
+
+
+def test_same_upload_reuses_the_index(pipeline):
+    fingerprint, first = pipeline.index(BASELINE)
+    second_fingerprint, second = pipeline.index(list(reversed(BASELINE)))
+
+    assert second_fingerprint == fingerprint
+    assert second is first
+
+
+def test_saved_index_is_reloaded(pipeline, tmp_path):
+    fingerprint, program_index = pipeline.index(BASELINE)
+
+    #A new registry on the same directory, as after a restart
+    pipeline.registry = IndexRegistry(str(tmp_path / 'indexes'))
+    reloaded_fingerprint, reloaded = pipeline.index(BASELINE)
+
+    assert reloaded_fingerprint == fingerprint
+    assert reloaded is not program_index
+    assert reloaded.manifest == program_index.manifest
+    assert reloaded.vectorstore.index.ntotal == 5
@@ -0,0 +1,16 @@
+from plc_verifier.ingestion import iter_documents
+from tests.exports import export, stl
+
+
+def test_blocks_and_networks_are_streamed():
+    docs = list(iter_documents('a.xml', export('STL', stl('Start', 'Door', 'Motor'), stl('Motor', 'Level', 'Pump'), block = 'FC_A'), 3))
+
+    assert [(doc.metadata['section'], doc.metadata['network']) for doc in docs] == [('network', 1), ('network', 2)]
+    assert all(doc.metadata['source'] == 'a.xml' and doc.metadata['page'] == 3 and doc.metadata['block'] == 'FC_A' for doc in docs)
+
+
+def test_malformed_and_empty_files_do_not_raise():
+    assert list(iter_documents('empty.xml', b'', 1)) == []
+
+    docs = list(iter_documents('broken.xml', b'<a><b>x</a>', 1))
+    assert [doc.metadata['section'] for doc in docs] == ['file']
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from plc_verifier.mmr import mmr_select, normalize_rows
+
+
+def unit_vectors(count, dimension = 64, seed = 0):
+    return normalize_rows(np.random.default_rng(seed).normal(size = (count, dimension)))
+
+
+#With a fixed k the vectorized selection picks the same snippets, in the same order, as the MMR of LangChain
+@pytest.mark.parametrize('lambda_mult', [0.25, 0.5, 0.9])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_fixed_k_matches_langchain(lambda_mult, seed):
+    candidates = unit_vectors(100, seed = seed)
+    query_vector = unit_vectors(1, seed = seed + 100)[0]
+
+    picked, _ = mmr_select(query_vector, candidates, 20, lambda_mult = lambda_mult)
+
+    assert picked == maximal_marginal_relevance(query_vector, list(candidates), lambda_mult = lambda_mult, k = 20)
+
+
+def test_no_candidates():
+    assert mmr_select(unit_vectors(1)[0], np.zeros((0, 64), dtype = np.float32), 10) == ([], [])
+
+
+#Candidates whose relevance to the query falls off after the first count
+def graded_candidates(count, total = 100, dimension = 64):
+    query_vector = np.eye(dimension, dtype = np.float32)[0]
+    noise = unit_vectors(total, dimension)
+    weights = np.where(np.arange(total) < count, 0.95, 0.2)[:, None]
+
+    return query_vector, normalize_rows(weights * query_vector + (1 - weights) * noise)
+
+
+#k follows the number of candidates close to the best relevance, between min_k and k, whatever lambda
+@pytest.mark.parametrize('lambda_mult', [0.25, 0.5])
+def test_adaptive_k_follows_relevance(lambda_mult):
+    narrow = graded_candidates(3)
+    broad = graded_candidates(30)
+
+    assert len(mmr_select(*narrow, 50, lambda_mult = lambda_mult, min_k = 8, threshold = 0.7)[0]) == 8
+    assert len(mmr_select(*broad, 50, lambda_mult = lambda_mult, min_k = 8, threshold = 0.7)[0]) == 30
+    assert len(mmr_select(*broad, 20, lambda_mult = lambda_mult, min_k = 8, threshold = 0.7)[0]) == 20
+    assert len(mmr_select(*broad, 50, lambda_mult = lambda_mult, min_k = 8)[0]) == 50
@@ -0,0 +1,37 @@
+import faiss
+import numpy as np
+
+from plc_verifier.pipeline import ExportFile
+from plc_verifier.vector_index import DEFAULT_NPROBE, build_faiss_index, search_parameters
+from tests.exports import export, stl
+
+VECTORS = np.random.default_rng(0).normal(size = (2000, 32)).astype(np.float32)
+
+
+#Probing every list of an IVF index is exact; the knob only applies to the search it is given to
+def test_search_parameters_do_not_change_the_index():
+    index, spec = build_faiss_index(VECTORS, {'kind': 'ivf'})
+    lists = faiss.extract_index_ivf(index).nlist
+    exact = faiss.IndexFlatL2(32)
+    exact.add(VECTORS)
+
+    _, found = index.search(VECTORS[:20], 10, params = search_parameters(index, nprobe = lists))
+
+    assert (found == exact.search(VECTORS[:20], 10)[1]).all()
+    assert faiss.extract_index_ivf(index).nprobe == spec['nprobe'] == DEFAULT_NPROBE
+    assert search_parameters(build_faiss_index(VECTORS[:100], {'kind': 'flat'})[0], nprobe = 4, ef_search = 64) is None
+
+
+#Sessions with other settings get their own retrievers over the same shared index
+def test_retrievers_do_not_tune_the_shared_index(pipeline):
+    pipeline.vector_index.update(kind = 'hnsw', ef_search = 300)
+    _, program_index = pipeline.index([ExportFile('a.xml', export('STL', stl('Start', 'Door', 'Motor'), stl('Motor', 'Level', 'Pump')))])
+    retriever = pipeline.retriever(program_index)
+
+    pipeline.vector_index['ef_search'] = 40
+    other = pipeline.retriever(program_index)
+
+    assert (retriever.search_params.efSearch, other.search_params.efSearch) == (300, 40)
+    #The index keeps the beam it was built with
+    assert program_index.vectorstore.index.hnsw.efSearch == 300
+    assert retriever.search('Is Pump started above Level?')[0]